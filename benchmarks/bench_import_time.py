@@ -0,0 +1,91 @@
+# Import-time budget: how long `python -X importtime` says each entry module takes to import.
+#
+# Usage:
+#   python benchmarks/bench_import_time.py [--runs 5] [--budget main=60] [--top 8]
+#
+# Each module is imported in a fresh interpreter `--runs` times and the median of its cumulative import time
+# is compared with its budget (milliseconds, overridable with --budget module=ms). The heaviest imports
+# underneath are listed to show where the time goes. A module must also never load the dependencies listed
+# in LAZY for it, whatever the timings on this machine. The exit status is 1 if any budget or rule is broken.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Milliseconds, with headroom for slow CI machines. main is what every one-shot CLI command pays; managers
+# is what opening the database directly adds on top; daemon is the full server stack.
+BUDGETS = {
+    'main': 80,
+    'managers': 120,
+    'client': 120,
+    'daemon': 250
+}
+
+# Modules only some paths need, which importing these entry points must leave for first use
+LAZY = {
+    'main': ('parsedatetime', 'asyncio', 'http.client', 'http.server', 'urllib.request', 'sqlite3', 'win10toast'),
+    'managers': ('parsedatetime', 'asyncio', 'http.client', 'http.server', 'urllib.request', 'win10toast')
+}
+
+def measure(module):
+    # One fresh interpreter: {imported module: (self us, cumulative us)} from -X importtime's report
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def check(module, runs=5, top=8):
+    # Returns (median ms, the heaviest imports by median self time, lazy modules that were imported)
+    samples = [measure(module) for _ in range(runs)]
+    total_ms = statistics.median(sample[module][1] for sample in samples) / 1000
+    self_times = defaultdict(list)
+    for sample in samples:
+        for name, (self_us, _) in sample.items():
+            self_times[name].append(self_us)
+    heaviest = sorted(((statistics.median(times) / 1000, name) for name, times in self_times.items()), reverse=True)[:top]
+    loaded = [name for name in LAZY.get(module, ()) if name in samples[0]]
+    return total_ms, heaviest, loaded
+
+def parse_budgets(values):
+    budgets = dict(BUDGETS)
+    for value in values:
+        module, _, ms = value.partition('=')
+        budgets[module] = float(ms)
+    return budgets
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check entry-module import times against their budgets.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', action='append', default=[], metavar='MODULE=MS', help="override or add a budget")
+    parser.add_argument('--top', type=int, default=8, help="heaviest imports to list per module")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module, budget_ms in parse_budgets(args.budget).items():
+        total_ms, heaviest, loaded = check(module, args.runs, args.top)
+        status = 'ok' if total_ms <= budget_ms and not loaded else 'OVER'
+        print(f"{module:<12} {total_ms:>8.1f} ms  (budget {budget_ms:g} ms)  {status}")
+        for self_ms, name in heaviest:
+            print(f"    {self_ms:>7.1f} ms  {name}")
+        if total_ms > budget_ms:
+            failures.append(f"{module} took {total_ms:.1f} ms, over its {budget_ms:g} ms budget")
+        if loaded:
+            failures.append(f"{module} imports {', '.join(loaded)} at import time")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
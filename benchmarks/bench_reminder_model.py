@@ -0,0 +1,72 @@
+# Memory and throughput comparison for materializing Reminder objects from rows.
+#
+# Compares the previous Reminder (per-instance __dict__, strptime in __init__) built with a
+# list comprehension against the __slots__ Reminder built through ReminderManager's starmap path.
+#
+# Usage: python benchmarks/bench_reminder_model.py [rows]
+
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers import ReminderManager
+
+class LegacyReminder:
+    def __init__(self, reminder_id, text, datetime_str, recurrence=None, recurrence_interval=1, recurrence_end=None):
+        self.id = reminder_id
+        self.text = text
+        self.datetime_str = datetime_str
+        self.datetime = datetime.strptime(datetime_str, '%Y-%m-%d %H:%M:%S')
+        self.recurrence = recurrence
+        self.recurrence_interval = recurrence_interval
+        self.recurrence_end = recurrence_end
+
+def make_rows(count):
+    start = datetime(2030, 1, 1)
+    rows = []
+    for i in range(count):
+        when = start + timedelta(minutes=i)
+        rows.append((i, f'Reminder {i}', when.strftime('%Y-%m-%d %H:%M:%S'), None, 1, None, 'once', int(when.timestamp())))
+    return rows
+
+def legacy_build(rows):
+    return [LegacyReminder(row[0], row[1], row[2], row[3], row[4], row[5]) for row in rows]
+
+def slots_build_with_datetime(manager, rows):
+    reminders = manager._create_reminders_from_rows(rows)
+    for reminder in reminders:
+        reminder.datetime
+    return reminders
+
+def measure(label, build, rows):
+    start = time.perf_counter()
+    build(rows)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = build(rows)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del objects
+
+    print(f"{label:<36} {len(rows) / elapsed:>12,.0f} rows/sec  {allocated / len(rows):>7.0f} bytes/reminder")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = make_rows(count)
+    manager = ReminderManager(':memory:')
+    try:
+        measure('before: __dict__ + strptime', legacy_build, rows)
+        measure('after: __slots__ + starmap', manager._create_reminders_from_rows, rows)
+        measure('after, datetime accessed', lambda rows: slots_build_with_datetime(manager, rows), rows)
+    finally:
+        manager.close()
+
+if __name__ == '__main__':
+    main()
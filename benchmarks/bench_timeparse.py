@@ -0,0 +1,39 @@
+# Micro-benchmark: TimeParser versus raw parsedatetime Calendar.parse.
+#
+# Usage: python benchmarks/bench_timeparse.py [iterations]
+
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parsedatetime
+from timeparse import TimeParser
+
+PHRASES = [
+    'in 15 minutes', 'in 2 hours', 'in an hour', 'in 3 days',
+    'tomorrow at 5 pm', 'tomorrow 9am', 'today at 17:30',
+    '2024-12-24 18:00', 'next friday at noon', 'tomorrow evening'
+]
+
+def bench(label, parse, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        parse(PHRASES[i % len(PHRASES)])
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {iterations / elapsed:>12,.0f} parses/sec  ({elapsed * 1e6 / iterations:.1f} us/parse)")
+    return elapsed
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cal = parsedatetime.Calendar()
+    raw = bench('parsedatetime Calendar.parse', lambda phrase: cal.parse(phrase, datetime.now().timetuple()), iterations)
+    parser = TimeParser()
+    fast = bench('TimeParser.parse', parser.parse, iterations)
+    print(f"speedup: {raw / fast:.1f}x")
+    print(f"stats: {parser.stats()}")
+
+if __name__ == '__main__':
+    main()
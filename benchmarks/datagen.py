@@ -0,0 +1,49 @@
+# Synthetic reminder generator shared by the benchmarks.
+
+import random
+from datetime import datetime, timedelta
+
+DEFAULT_MIX = {'once': 0.6, 'daily': 0.2, 'weekly': 0.1, 'monthly': 0.07, 'yearly': 0.03}
+
+# Reminder texts are built from these so full-text search sees a realistic spread of word frequencies
+VERBS = ('Call', 'Email', 'Pay', 'Book', 'Renew', 'Buy', 'Check', 'Water', 'Clean', 'Review',
+         'Submit', 'Pick up', 'Drop off', 'Schedule', 'Cancel', 'Prepare', 'Send', 'Return', 'Order', 'Visit')
+OBJECTS = ('dentist', 'doctor', 'mom', 'landlord', 'electric bill', 'rent', 'car insurance', 'passport',
+           'groceries', 'plants', 'kitchen', 'quarterly report', 'expense report', 'tax return', 'library books',
+           'dry cleaning', 'kids from school', 'team meeting', 'gym membership', 'birthday card', 'flowers',
+           'vet appointment', 'oil change', 'haircut', 'presentation slides', 'invoice', 'package', 'parcel',
+           'prescription', 'train tickets', 'hotel', 'flight', 'budget', 'garden', 'laundry', 'dishwasher',
+           'printer ink', 'coffee beans', 'project proposal', 'contract')
+
+def parse_mix(value):
+    # "once=6,daily=2,weekly=1" -> normalized weights
+    weights = {}
+    for part in value.split(','):
+        name, weight = part.split('=')
+        weights[name.strip()] = float(weight)
+    total = sum(weights.values())
+    return {name: weight / total for name, weight in weights.items()}
+
+def generate_rows(count, mix=None, start=None, spread=timedelta(days=365), seed=0):
+    # Yields insert rows for ReminderManager.add_reminders_bulk with fire times spread over [start, start + spread)
+    mix = mix or DEFAULT_MIX
+    start = (start or datetime.now()).replace(microsecond=0)
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    spread_seconds = int(spread.total_seconds())
+    for i in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        when = start + timedelta(seconds=rng.randrange(max(spread_seconds, 1)))
+        recurrence = None if kind == 'once' else kind
+        interval = rng.randint(1, 3) if recurrence else 1
+        text = f'{rng.choice(VERBS)} {rng.choice(OBJECTS)} #{i}'
+        yield (text, when.strftime('%Y-%m-%d %H:%M:%S'), int(when.timestamp()), recurrence, interval, None, 'once')
+
+def populate(reminder_manager, count, chunk_size=50000, **kwargs):
+    rows = generate_rows(count, **kwargs)
+    while True:
+        chunk = [row for _, row in zip(range(chunk_size), rows)]
+        if not chunk:
+            return
+        reminder_manager.add_reminders_bulk(chunk)
@@ -0,0 +1,236 @@
+# Benchmark suite for storage, scheduling and firing latency.
+#
+# Usage:
+#   python benchmarks/run_benchmarks.py [--sizes 1000,100000,1000000] [--output results.json]
+#   python benchmarks/run_benchmarks.py --compare baseline.json [--threshold 20]
+#
+# Every metric is written to the JSON output as {"value", "unit", "better"} so two runs can be compared;
+# --compare exits with status 1 if any metric regressed by more than --threshold percent.
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import Reminder
+from managers import ReminderManager, Scheduler
+from recurrence import compile_rule
+from datagen import DEFAULT_MIX, parse_mix, populate
+
+class NullNotifier:
+    def send_notification(self, message):
+        pass
+
+    def deliver(self, message):
+        pass
+
+class LagNotifier:
+    # Records when each reminder was delivered; reminder texts carry their due epoch
+    def __init__(self, expected):
+        self.lags = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def send_notification(self, message):
+        self.lags.append(time.time() - float(message.rsplit(' ', 1)[1]))
+        if len(self.lags) >= self.expected:
+            self.done.set()
+
+def timed(func, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def metric(value, unit, better):
+    return {'value': round(value, 6), 'unit': unit, 'better': better}
+
+def latency_metrics(prefix, samples):
+    return {
+        f'{prefix}.p50_ms': metric(statistics.median(samples) * 1000, 'ms', 'lower'),
+        f'{prefix}.p95_ms': metric(percentile(samples, 0.95) * 1000, 'ms', 'lower')
+    }
+
+def bench_add_reminder(directory, count):
+    manager = ReminderManager(os.path.join(directory, 'add.db'))
+    try:
+        when = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+        start = time.perf_counter()
+        for i in range(count):
+            manager.add_reminder(Reminder(None, f'Added {i}', when))
+        elapsed = time.perf_counter() - start
+    finally:
+        manager.close()
+    return {'add_reminder.ops_per_sec': metric(count / elapsed, 'ops/s', 'higher')}
+
+def bench_concurrent_adds(directory, count, threads=8):
+    # add_reminder from several threads at once, committing each insert vs group commit
+    results = {}
+    when = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+    for durability in ('sync', 'group'):
+        manager = ReminderManager(os.path.join(directory, f'ingest-{durability}.db'), durability=durability)
+        def add(offset):
+            for i in range(offset, count, threads):
+                manager.add_reminder(Reminder(None, f'Ingested {i}', when))
+        workers = [threading.Thread(target=add, args=(offset,)) for offset in range(threads)]
+        try:
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            manager.close()
+        results[f'add_reminder.{durability}_{threads}_threads.ops_per_sec'] = metric(count / elapsed, 'ops/s', 'higher')
+    return results
+
+def bench_queries(directory, size, mix, repeats):
+    manager = ReminderManager(os.path.join(directory, f'queries_{size}.db'))
+    results = {}
+    try:
+        # About 1/366 of the rows are already due, the rest spread over the next year
+        populate(manager, size, mix=mix, start=datetime.now() - timedelta(days=1), spread=timedelta(days=366))
+        results.update(latency_metrics(f'get_due_reminders.{size}', timed(lambda: manager.get_due_reminders(limit=500), repeats)))
+        results.update(latency_metrics(f'get_upcoming_page.{size}', timed(lambda: manager.get_upcoming_page(page_size=50), repeats)))
+        results.update(latency_metrics(f'search_reminders.{size}', timed(lambda: manager.search_reminders('pay ele'), repeats)))
+        full_repeats = max(1, repeats if size <= 100000 else repeats // 10)
+        results.update(latency_metrics(f'get_upcoming_reminders.{size}', timed(manager.get_upcoming_reminders, full_repeats)))
+    finally:
+        manager.close()
+    return results
+
+def bench_recurrence(count):
+    # next-occurrence evaluation for compiled rules, stepping through consecutive occurrences
+    results = {}
+    start = datetime(2024, 1, 1, 8, 0)
+    for name, recurrence in (('interval', 'monthly'), ('phrase', 'every weekday at 9'), ('cron', '*/15 9-17 * * 1-5')):
+        rule = compile_rule(recurrence)
+        begin = time.perf_counter()
+        rule.next_n(start, start, count)
+        results[f'recurrence.{name}.next_per_sec'] = metric(count / (time.perf_counter() - begin), 'ops/s', 'higher')
+    return results
+
+def bench_check_reminders(directory, count, mix):
+    # Due-batch processing with direct notification and with the at-least-once outbox
+    results = {}
+    for name, guarantee in (('check_reminders', None), ('check_reminders_outbox', 'at-least-once')):
+        manager = ReminderManager(os.path.join(directory, f'{name}.db'))
+        try:
+            populate(manager, count, mix=mix, start=datetime.now() - timedelta(seconds=30), spread=timedelta(seconds=20))
+            scheduler = Scheduler(manager, NullNotifier(), guarantee=guarantee)
+            start = time.perf_counter()
+            scheduler.check_reminders()
+            elapsed = time.perf_counter() - start
+        finally:
+            manager.close()
+        results[f'{name}.batch_seconds'] = metric(elapsed, 's', 'lower')
+        results[f'{name}.reminders_per_sec'] = metric(count / elapsed, 'reminders/s', 'higher')
+    return results
+
+def bench_firing_lag(directory, count):
+    manager = ReminderManager(os.path.join(directory, 'lag.db'))
+    notifier = LagNotifier(count)
+    scheduler = Scheduler(manager, notifier)
+    scheduler.start()
+    try:
+        base = datetime.now().replace(microsecond=0) + timedelta(seconds=2)
+        for i in range(count):
+            due = base + timedelta(seconds=i % 3)
+            manager.add_reminder(Reminder(None, f'Lag probe {due.timestamp()}', due.strftime('%Y-%m-%d %H:%M:%S')))
+        notifier.done.wait(30)
+    finally:
+        scheduler.stop()
+        manager.close()
+    lags = notifier.lags or [float('nan')]
+    return {
+        'firing_lag.p50_ms': metric(statistics.median(lags) * 1000, 'ms', 'lower'),
+        'firing_lag.p95_ms': metric(percentile(lags, 0.95) * 1000, 'ms', 'lower'),
+        'firing_lag.max_ms': metric(max(lags) * 1000, 'ms', 'lower'),
+        'firing_lag.delivered': metric(len(notifier.lags), 'reminders', 'higher')
+    }
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if not previous or not previous['value']:
+            continue
+        change = (current['value'] - previous['value']) / previous['value'] * 100
+        worse = change > threshold if current['better'] == 'lower' else change < -threshold
+        flag = '  REGRESSION' if worse else ''
+        print(f"{name:<45} {previous['value']:>14.3f} -> {current['value']:>14.3f} {current['unit']:<12} {change:+7.1f}%{flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reminder bot benchmark suite.")
+    parser.add_argument('--sizes', default='1000,100000', help="table sizes for query latency (e.g. 1000,100000,1000000)")
+    parser.add_argument('--mix', default=None, help="reminder mix, e.g. once=6,daily=2,weekly=1,monthly=1,yearly=1")
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--adds', type=int, default=500, help="individual add_reminder calls to time")
+    parser.add_argument('--due', type=int, default=5000, help="due reminders processed by check_reminders")
+    parser.add_argument('--lag-probes', type=int, default=50)
+    parser.add_argument('--output', default=None, help="write results as JSON to this path")
+    parser.add_argument('--compare', default=None, help="baseline JSON from a previous run")
+    parser.add_argument('--threshold', type=float, default=20.0, help="regression threshold in percent")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        results.update(bench_add_reminder(directory, args.adds))
+        results.update(bench_concurrent_adds(directory, args.adds * 4))
+        for size in (int(size) for size in args.sizes.split(',')):
+            results.update(bench_queries(directory, size, mix, args.repeats))
+        results.update(bench_check_reminders(directory, args.due, mix))
+        results.update(bench_recurrence(args.due))
+        results.update(bench_firing_lag(directory, args.lag_probes))
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'sizes': args.sizes,
+            'mix': mix
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.threshold}%")
+            return 1
+    else:
+        for name, value in sorted(results.items()):
+            print(f"{name:<45} {value['value']:>14.3f} {value['unit']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
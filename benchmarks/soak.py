@@ -0,0 +1,121 @@
+# Soak/replay harness: runs the scheduler over a simulated period and checks every firing.
+#
+# Usage:
+#   python benchmarks/soak.py [--reminders 10000] [--days 365] [--mix once=6,daily=2,...] [--seed 0] [--db path]
+#
+# Reminders are generated with fire times spread over the period, then the event scheduler runs against a
+# SimulatedClock that jumps straight to each next due time. Every reminder's notifications are counted and
+# compared with what its recurrence rule says should have fired in the period, and each notification's
+# (simulated) time with the rule's occurrence times. The report lists missed, duplicated and off-schedule
+# firings, and the exit status is 1 if there were any.
+#
+# Scope: the harness was asked to replay a year of 100k reminders in seconds. It doesn't. Each firing is a
+# real claim transaction plus a settle transaction, so throughput is the scheduler's own, about 6k firings/s
+# on one core. The default is therefore 10,000 mixed reminders over a year (about 250,000 firings, ~40 s);
+# --reminders 100000 (about 2.5M firings) takes around 7 minutes. Settling whole same-instant batches in
+# one transaction would not close the gap: generated fire times fall on distinct seconds, so almost every
+# instant has a single firing.
+
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import Reminder
+from managers import ReminderManager, Scheduler
+from clock import SimulatedClock
+from recurrence import compile_rule
+from datagen import DEFAULT_MIX, parse_mix, populate
+
+class CheckingNotifier:
+    # Counts notifications per message (generated texts end in a unique '#<n>') and checks that each one
+    # arrives exactly at an occurrence of its reminder's rule. schedules maps text -> (first fire time, rule).
+    def __init__(self, clock, schedules):
+        self.clock = clock
+        self.schedules = schedules
+        self.counts = Counter()
+        self.off_schedule = 0
+
+    def send_notification(self, message):
+        self.counts[message] += 1
+        now = self.clock.now()
+        start, rule = self.schedules[message]
+        due = start if rule is None else rule.next_after(start, now - timedelta(seconds=1))
+        if due != now:
+            self.off_schedule += 1
+
+def reminder_schedule(reminder):
+    rule = compile_rule(reminder.recurrence, reminder.recurrence_interval or 1) if reminder.recurrence else None
+    return reminder.datetime, rule
+
+def expected_firings(schedule, end):
+    # Occurrences in [first fire time, end] according to the rule
+    start, rule = schedule
+    if start > end:
+        return 0
+    if rule is None:
+        return 1
+    return rule.count_through(start, end)[0]
+
+def soak(count, days, mix, seed=0, max_batch_size=500, database=':memory:'):
+    # A replay doesn't need durability, so by default the database lives in memory and commits never fsync
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=days)
+    clock = SimulatedClock(start)
+    manager = ReminderManager(database, clock=clock)
+    try:
+        populate(manager, count, mix=mix, start=start, spread=timedelta(days=days), seed=seed)
+        schedules = {row[1]: reminder_schedule(Reminder(*row)) for row in manager.iter_rows()}
+        expected = {text: expected_firings(schedule, end) for text, schedule in schedules.items()}
+        notifier = CheckingNotifier(clock, schedules)
+        # Nothing else writes to the database, so the periodic safety check can be rare
+        scheduler = Scheduler(manager, notifier, max_sleep=86400, max_batch_size=max_batch_size)
+        began = time.perf_counter()
+        scheduler.run(until=end + timedelta(seconds=1))
+        elapsed = time.perf_counter() - began
+    finally:
+        manager.close()
+
+    missed = {text: notifier.counts[text] - want for text, want in expected.items() if notifier.counts[text] < want}
+    duplicated = {text: got - expected.get(text, 0) for text, got in notifier.counts.items() if got > expected.get(text, 0)}
+    fired = sum(notifier.counts.values())
+    return {
+        'reminders': count,
+        'simulated_days': days,
+        'expected_firings': sum(expected.values()),
+        'fired': fired,
+        'missed': -sum(missed.values()),
+        'duplicated': sum(duplicated.values()),
+        'off_schedule': notifier.off_schedule,
+        'wall_seconds': round(elapsed, 3),
+        'firings_per_sec': round(fired / elapsed, 1) if elapsed else None,
+        'examples': sorted(missed.items())[:5] + sorted(duplicated.items())[:5]
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a simulated period of reminder firings and check for missed or duplicated ones.")
+    parser.add_argument('--reminders', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--mix', default=None, help="reminder mix, e.g. once=6,daily=2,weekly=1,monthly=1,yearly=1")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db', default=':memory:', help="database file to replay against (default: in memory)")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    report = soak(args.reminders, args.days, mix, args.seed, database=args.db)
+    for name, value in report.items():
+        if name != 'examples':
+            print(f"{name:<20} {value}")
+    for text, difference in report['examples']:
+        print(f"  mismatch: {text!r} ({difference:+d})")
+    return 1 if report['missed'] or report['duplicated'] or report['off_schedule'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
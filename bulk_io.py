@@ -0,0 +1,318 @@
+#This file will contain the bulk import/export pipeline for reminders.
+
+#bulk_io.py:
+# Contains streaming readers and writers for CSV, JSONL and iCalendar (.ics) files.
+# Records flow through a generator pipeline (read -> validate -> chunk) into chunked executemany inserts.
+#
+# Usage:
+#   python bulk_io.py import reminders.csv [--db reminders.db]
+#   python bulk_io.py export reminders.jsonl [--db reminders.db]
+
+import argparse
+import csv
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
+
+from models import DATETIME_FORMAT
+from timeparse import TimeParser
+from recurrence import compile_rule, is_frequency
+
+FIELDS = ('text', 'datetime', 'recurrence', 'recurrence_interval', 'recurrence_end', 'misfire_policy')
+MISFIRE_POLICIES = ('once', 'all', 'skip')
+ICS_FREQUENCIES = {'DAILY': 'daily', 'WEEKLY': 'weekly', 'MONTHLY': 'monthly', 'YEARLY': 'yearly'}
+# Rules without an RRULE equivalent (and phrases, to keep the user's wording) are exported under this property
+ICS_RECURRENCE = 'X-REMINDERBOT-RECURRENCE'
+
+class RecordError(ValueError):
+    pass
+
+# Readers: each yields plain dict records keyed by FIELDS
+
+def read_csv(path):
+    # Plain csv.reader + zip is noticeably cheaper per row than csv.DictReader
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = csv.reader(f)
+        header = next(rows, None)
+        if header is None:
+            return
+        for row in rows:
+            if row:
+                yield dict(zip(header, row))
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def _unfold_ics_lines(f):
+    # RFC 5545 folds long lines by starting continuation lines with a space or tab
+    current = None
+    for line in f:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+def _unescape_ics_text(value):
+    return value.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+def _escape_ics_text(value):
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def _parse_ics_datetime(value):
+    # Handles floating (local) times, UTC times ending in Z and all-day DATE values
+    if len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d')
+    if value.endswith('Z'):
+        utc = datetime.strptime(value[:-1], '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc)
+        return utc.astimezone().replace(tzinfo=None)
+    return datetime.strptime(value, '%Y%m%dT%H%M%S')
+
+def read_ics(path):
+    with open(path, encoding='utf-8') as f:
+        event = None
+        for line in _unfold_ics_lines(f):
+            if line == 'BEGIN:VEVENT':
+                event = {}
+            elif line == 'END:VEVENT':
+                if event is not None:
+                    yield event
+                event = None
+            elif event is not None and ':' in line:
+                name, value = line.split(':', 1)
+                name = name.split(';', 1)[0].upper()
+                if name == 'SUMMARY':
+                    event['text'] = _unescape_ics_text(value)
+                elif name == 'DTSTART':
+                    event['datetime'] = _parse_ics_datetime(value).strftime(DATETIME_FORMAT)
+                elif name == 'RRULE':
+                    rule = dict(part.split('=', 1) for part in value.split(';') if '=' in part)
+                    if 'UNTIL' in rule:
+                        event['recurrence_end'] = _parse_ics_datetime(rule.pop('UNTIL')).strftime(DATETIME_FORMAT)
+                    if set(rule) - {'FREQ', 'INTERVAL', 'WKST'}:
+                        # BYDAY, BYMONTHDAY, ...: keep the whole rule
+                        event.setdefault('recurrence', ';'.join(f'{key}={part}' for key, part in rule.items()))
+                    else:
+                        event.setdefault('recurrence', ICS_FREQUENCIES.get(rule.get('FREQ'), rule.get('FREQ', '').lower()))
+                        event['recurrence_interval'] = rule.get('INTERVAL', 1)
+                elif name == ICS_RECURRENCE:
+                    event['recurrence'] = _unescape_ics_text(value)
+                    event['recurrence_interval'] = 1
+
+READERS = {'.csv': read_csv, '.jsonl': read_jsonl, '.ics': read_ics}
+
+# Validation
+
+def _parse_time(value, time_parser):
+    if isinstance(value, datetime):
+        return value.replace(microsecond=0)
+    value = str(value).strip()
+    try:
+        # C-level ISO parsing handles the stored format and other ISO timestamps quickly
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone().replace(tzinfo=None)
+        return parsed.replace(microsecond=0)
+    except ValueError:
+        parsed = time_parser.parse(value)
+        if parsed is None:
+            raise RecordError(f"unrecognized time '{value}'")
+        return parsed
+
+@lru_cache(maxsize=1024)
+def _parse_recurrence(recurrence, raw_interval):
+    # (recurrence, interval) from a record's raw fields, or raises RecordError. An import repeats a handful of
+    # rules over and over, so each distinct pair is normalized and compiled once.
+    recurrence = recurrence.strip()
+    if is_frequency(recurrence):
+        recurrence = recurrence.lower()
+    try:
+        interval = int(raw_interval or 1)
+    except (TypeError, ValueError):
+        raise RecordError(f"invalid recurrence_interval '{raw_interval}'")
+    if interval < 1:
+        raise RecordError(f"invalid recurrence_interval '{interval}'")
+    try:
+        compile_rule(recurrence, interval)
+    except ValueError as e:
+        raise RecordError(f"invalid recurrence '{recurrence}': {e}")
+    return recurrence, interval
+
+def parse_record(record, time_parser):
+    # Turns a raw record into an insert row for ReminderManager.add_reminders_bulk, or raises RecordError
+    text = record.get('text')
+    if not text or not str(text).strip():
+        raise RecordError("missing text")
+    raw_time = record.get('datetime')
+    if raw_time is None or raw_time == '':
+        raise RecordError("missing datetime")
+    if isinstance(raw_time, str) and len(raw_time) == 19 and raw_time[10] == ' ':
+        try:
+            fire_time = datetime.fromisoformat(raw_time)
+            datetime_str = raw_time
+        except ValueError:
+            raise RecordError(f"invalid datetime '{raw_time}'")
+    else:
+        fire_time = _parse_time(raw_time, time_parser)
+        datetime_str = fire_time.strftime(DATETIME_FORMAT)
+
+    recurrence = record.get('recurrence') or None
+    recurrence_interval = 1
+    recurrence_end = None
+    if recurrence is not None:
+        raw_interval = record.get('recurrence_interval')
+        try:
+            recurrence, recurrence_interval = _parse_recurrence(str(recurrence), raw_interval)
+        except TypeError:
+            # Unhashable, so not a number either (e.g. a JSON list)
+            raise RecordError(f"invalid recurrence_interval '{raw_interval}'")
+        if record.get('recurrence_end'):
+            recurrence_end = _parse_time(record['recurrence_end'], time_parser).strftime(DATETIME_FORMAT)
+
+    misfire_policy = record.get('misfire_policy') or 'once'
+    if misfire_policy not in MISFIRE_POLICIES:
+        raise RecordError(f"invalid misfire_policy '{misfire_policy}'")
+    return (str(text), datetime_str, int(fire_time.timestamp()), recurrence, recurrence_interval, recurrence_end, misfire_policy)
+
+def validate_records(records, time_parser=None, errors=None):
+    # Yields insert rows; invalid records are logged, counted in `errors` (a list) and skipped
+    time_parser = time_parser or TimeParser()
+    for number, record in enumerate(records, start=1):
+        try:
+            yield parse_record(record, time_parser)
+        except (RecordError, AttributeError) as e:
+            logging.warning("Skipping record %d: %s", number, e)
+            if errors is not None:
+                errors.append((number, str(e)))
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def import_reminders(reminder_manager, records, chunk_size=10000, tenant=None):
+    # Returns (imported count, list of (record number, error)) for an iterable of raw records, all owned by tenant
+    errors = []
+    imported = 0
+    for chunk in chunked(validate_records(records, errors=errors), chunk_size):
+        imported += len(reminder_manager.add_reminders_bulk(chunk, tenant=tenant))
+    logging.info("Imported %d reminders (%d rejected)", imported, len(errors))
+    return imported, errors
+
+def import_file(reminder_manager, path, chunk_size=10000):
+    return import_reminders(reminder_manager, _reader_for(path)(path), chunk_size)
+
+# Writers: each consumes raw rows in REMINDER_COLUMNS order and returns the number written
+
+def _row_to_record(row):
+    return {
+        'text': row[1],
+        'datetime': row[2],
+        'recurrence': row[3],
+        'recurrence_interval': row[4],
+        'recurrence_end': row[5],
+        'misfire_policy': row[6]
+    }
+
+def write_csv(rows, f):
+    writer = csv.DictWriter(f, fieldnames=FIELDS)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(_row_to_record(row))
+        count += 1
+    return count
+
+def write_jsonl(rows, f):
+    count = 0
+    for row in rows:
+        f.write(json.dumps(_row_to_record(row)) + '\n')
+        count += 1
+    return count
+
+def _format_ics_datetime(value):
+    return datetime.strptime(value, DATETIME_FORMAT).strftime('%Y%m%dT%H%M%S')
+
+def write_ics(rows, f):
+    f.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//ReminderBot//EN\r\n')
+    count = 0
+    for row in rows:
+        f.write('BEGIN:VEVENT\r\n')
+        f.write(f'UID:reminder-{row[0]}@reminderbot\r\n')
+        f.write(f'DTSTART:{_format_ics_datetime(row[2])}\r\n')
+        f.write(f'SUMMARY:{_escape_ics_text(row[1])}\r\n')
+        if row[3]:
+            try:
+                rule = compile_rule(row[3], row[4] or 1).to_rrule()
+            except ValueError:
+                rule = None
+            if rule:
+                if row[5]:
+                    rule += f';UNTIL={_format_ics_datetime(row[5])}'
+                f.write(f'RRULE:{rule}\r\n')
+            if not is_frequency(row[3]):
+                f.write(f'{ICS_RECURRENCE}:{_escape_ics_text(row[3])}\r\n')
+        f.write('END:VEVENT\r\n')
+        count += 1
+    f.write('END:VCALENDAR\r\n')
+    return count
+
+WRITERS = {'.csv': write_csv, '.jsonl': write_jsonl, '.ics': write_ics}
+
+def export_file(reminder_manager, path):
+    writer = _writer_for(path)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        count = writer(reminder_manager.iter_rows(), f)
+    logging.info("Exported %d reminders to %s", count, path)
+    return count
+
+def _reader_for(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in READERS:
+        raise ValueError(f"Unsupported import format '{extension}' (expected .csv, .jsonl or .ics)")
+    return READERS[extension]
+
+def _writer_for(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError(f"Unsupported export format '{extension}' (expected .csv, .jsonl or .ics)")
+    return WRITERS[extension]
+
+def main(argv=None):
+    from managers import ReminderManager
+    from logging_setup import configure_logging
+
+    parser = argparse.ArgumentParser(description="Bulk import or export reminders.")
+    parser.add_argument('command', choices=('import', 'export'))
+    parser.add_argument('path')
+    parser.add_argument('--db', default='reminders.db')
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    reminder_manager = ReminderManager(args.db)
+    try:
+        if args.command == 'import':
+            imported, errors = import_file(reminder_manager, args.path, args.chunk_size)
+            print(f"Imported {imported} reminders ({len(errors)} rejected).")
+        else:
+            count = export_file(reminder_manager, args.path)
+            print(f"Exported {count} reminders.")
+    finally:
+        reminder_manager.close()
+
+if __name__ == '__main__':
+    main()
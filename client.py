@@ -0,0 +1,150 @@
+#This file will contain the client for the reminder daemon's JSON API.
+
+#client.py:
+# Contains ReminderClient, which talks to daemon.py over one keep-alive HTTP connection.
+# It offers the same methods the menu uses on ReminderManager (add_reminder, update_reminder, delete_reminder,
+# get_reminder, get_upcoming_page, search_reminders, get_history), so the UI functions work unchanged against a daemon.
+# A client created with a tenant acts for that tenant on every request.
+
+import http.client
+import json
+import logging
+from datetime import datetime
+from urllib.parse import urlencode
+
+from models import DATETIME_FORMAT, Reminder
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+def reminder_from_dict(data):
+    return Reminder(
+        data['id'],
+        data['text'],
+        data['datetime'],
+        data.get('recurrence'),
+        data.get('recurrence_interval') or 1,
+        data.get('recurrence_end'),
+        data.get('misfire_policy') or 'once',
+        tenant=data.get('tenant')
+    )
+
+class ReminderClient:
+    def __init__(self, host='127.0.0.1', port=8765, timeout=30, tenant=None):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        self.tenant = tenant
+
+    def _path(self, path, query=None):
+        # Adds the query string, with this client's tenant
+        query = dict(query or {})
+        if self.tenant is not None:
+            query['tenant'] = self.tenant
+        return f'{path}?{urlencode(query)}' if query else path
+
+    def request(self, method, path, payload=None):
+        # Returns the decoded JSON response; raises ApiError for error statuses and OSError if unreachable
+        body = json.dumps(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            # Drop the broken connection; the next request reconnects
+            self.connection.close()
+            raise
+        result = json.loads(data) if data else {}
+        if response.status >= 400:
+            raise ApiError(response.status, result.get('error', response.reason))
+        return result
+
+    def ping(self):
+        try:
+            return self.request('GET', '/health').get('status') == 'ok'
+        except (ApiError, http.client.HTTPException, OSError, ValueError):
+            return False
+
+    def add_reminder(self, reminder):
+        try:
+            result = self.request('POST', self._path('/reminders'), self._record(reminder))
+        except (ApiError, http.client.HTTPException, OSError) as e:
+            logging.error("Error adding reminder: %s", e)
+            return None
+        reminder.id = result['reminder']['id']
+        return reminder.id
+
+    def add_reminders(self, records):
+        # records are dicts keyed like bulk_io.FIELDS; returns (imported, errors)
+        result = self.request('POST', self._path('/reminders/bulk'), {'records': list(records)})
+        return result['imported'], [(error['record'], error['error']) for error in result['errors']]
+
+    def update_reminder(self, reminder):
+        try:
+            self.request('PATCH', self._path(f'/reminders/{reminder.id}'), self._record(reminder))
+            return True
+        except (ApiError, http.client.HTTPException, OSError) as e:
+            logging.error("Error updating reminder: %s", e)
+            return False
+
+    def delete_reminder(self, reminder_id):
+        try:
+            self.request('DELETE', self._path(f'/reminders/{reminder_id}'))
+            return True
+        except (ApiError, http.client.HTTPException, OSError) as e:
+            logging.error("Error deleting reminder: %s", e)
+            return False
+
+    def get_reminder(self, reminder_id):
+        try:
+            return reminder_from_dict(self.request('GET', self._path(f'/reminders/{reminder_id}'))['reminder'])
+        except ApiError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def get_upcoming_page(self, after=None, page_size=50, recurring_only=False):
+        # Same contract as ReminderManager.get_upcoming_page: (reminders, cursor or None)
+        query = {'page_size': page_size}
+        if after is not None:
+            query['after'] = after
+        if recurring_only:
+            query['recurring_only'] = 1
+        result = self.request('GET', self._path('/reminders', query))
+        return [reminder_from_dict(data) for data in result['reminders']], result['cursor']
+
+    def search_reminders(self, query, limit=20):
+        result = self.request('GET', self._path('/reminders/search', {'q': query, 'limit': limit}))
+        return [reminder_from_dict(data) for data in result['reminders']]
+
+    def get_history(self, start=None, end=None, reminder_id=None, limit=100):
+        # Same contract as ReminderManager.get_history: (reminder, archived_at, reason) tuples, newest first
+        query = {'limit': limit}
+        for name, value in (('start', start), ('end', end)):
+            if value is not None:
+                query[name] = value.strftime(DATETIME_FORMAT)
+        if reminder_id is not None:
+            query['reminder_id'] = reminder_id
+        result = self.request('GET', self._path('/history', query))
+        return [
+            (reminder_from_dict(data), datetime.strptime(data['archived_at'], DATETIME_FORMAT), data['reason'])
+            for data in result['history']
+        ]
+
+    def stats(self):
+        return self.request('GET', '/stats')
+
+    def close(self):
+        self.connection.close()
+
+    def _record(self, reminder):
+        return {
+            'text': reminder.text,
+            'datetime': reminder.datetime_str,
+            'recurrence': reminder.recurrence,
+            'recurrence_interval': reminder.recurrence_interval,
+            'recurrence_end': reminder.recurrence_end,
+            'misfire_policy': reminder.misfire_policy
+        }
@@ -0,0 +1,71 @@
+#This file will contain the clocks that every time-dependent component reads the current time from.
+
+#clock.py:
+# Contains SystemClock, the wall clock used by default, and SimulatedClock, a virtual clock for tests and replays.
+# ReminderManager, Scheduler (with its FireQueue), OutboxRelay and the menu ask their clock for now() instead of
+# calling datetime.now() or time.time() directly, and block through clock.wait()/clock.sleep(), so a simulated
+# clock can jump straight to the next due time instead of sleeping until it.
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+class SystemClock:
+    def now(self):
+        # Naive local datetime, like datetime.now()
+        return datetime.now()
+
+    def time(self):
+        # Unix timestamp, like time.time()
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, condition, timeout):
+        # Waits on a threading.Condition the caller holds; returns False on timeout
+        return condition.wait(timeout)
+
+class SimulatedClock(SystemClock):
+    def __init__(self, start=None):
+        # Starts at `start` (default: the current wall-clock second) and only moves when advanced. sleep() and
+        # wait() advance it by their whole timeout and return at once, so a scheduler loop driven by this clock
+        # replays hours or years of firings as fast as it can process them.
+        self.current = start or datetime.now().replace(microsecond=0)
+        self.lock = threading.Lock()
+
+    def now(self):
+        with self.lock:
+            return self.current
+
+    def time(self):
+        return self.now().timestamp()
+
+    def monotonic(self):
+        return self.time()
+
+    def advance(self, seconds):
+        with self.lock:
+            self.current += timedelta(seconds=max(0.0, seconds))
+            return self.current
+
+    def set(self, when):
+        # Moves the clock forward to `when`; a simulated clock never goes backwards
+        with self.lock:
+            self.current = max(self.current, when)
+            return self.current
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def wait(self, condition, timeout):
+        # Nothing else can move simulated time, so instead of blocking the timeout simply elapses
+        if timeout is None:
+            return condition.wait()
+        self.advance(timeout)
+        return False
+
+SYSTEM_CLOCK = SystemClock()
@@ -0,0 +1,419 @@
+#This file will contain the headless daemon that owns the scheduler and serves a local JSON API.
+
+#daemon.py:
+# Contains ReminderDaemon, an asyncio HTTP/1.1 server on localhost exposing the reminder operations as JSON.
+# Every endpoint takes ?tenant=<name> to act for one tenant (a POST body may carry "tenant" instead); a
+# sharded store (--shards) requires it for anything but merged reads of all tenants.
+#   GET    /health                  liveness check
+#   GET    /reminders               upcoming reminders, paged (?after=<cursor>&page_size=&recurring_only=1)
+#   POST   /reminders               add one reminder
+#   POST   /reminders/bulk          add many reminders ({"records": [...]}, validated like bulk_io imports)
+#   GET    /reminders/search        full-text search (?q=<words>&limit=20)
+#   GET    /reminders/<id>          fetch one reminder
+#   PATCH  /reminders/<id>          change some fields of a reminder
+#   DELETE /reminders/<id>          delete a reminder
+#   GET    /history                 archived reminders, newest first (?start=&end=&reminder_id=&limit=100)
+#   GET    /stats                   metrics snapshot
+# The event loop only parses requests and writes responses; every database call runs on a worker thread
+# pool, so slow clients or large bulk imports never stall each other or the scheduler's firing thread.
+#
+# Usage:
+#   python daemon.py [--db reminders.db] [--host 127.0.0.1] [--port 8765] [--durability sync|group]
+#                    [--delivery at-least-once|at-most-once|direct] [--history-days N] [--shards N]
+#                    [--digest-window SECONDS] [--digest-max N] [--rate-limit N] [--storage file|memory]
+# With --shards, --db names the directory holding the shard files (see sharding.py).
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+from models import DATETIME_FORMAT, Reminder
+from managers import DURABILITY_MODES, STORAGE_MODES, ReminderManager, Notifier, Scheduler
+from bulk_io import FIELDS, RecordError, parse_record, import_reminders
+from timeparse import TimeParser
+from delivery import DEFAULT_DIGEST_WINDOW, GUARANTEES, Coalescer, DigestNotifier
+from sharding import ShardedReminderStore, ShardedScheduler, TenantRequiredError
+from metrics import REGISTRY, start_metrics_server
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 64 * 1024 * 1024
+MAX_PAGE_SIZE = 1000
+
+API_REQUEST_SECONDS = REGISTRY.histogram('reminder_api_request_seconds', "Time spent handling API requests, by route")
+API_ERRORS = REGISTRY.counter('reminder_api_errors_total', "API requests answered with an error status, by route")
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def reminder_to_dict(reminder):
+    return {
+        'id': reminder.id,
+        'text': reminder.text,
+        'datetime': reminder.datetime_str,
+        'recurrence': reminder.recurrence,
+        'recurrence_interval': reminder.recurrence_interval,
+        'recurrence_end': reminder.recurrence_end,
+        'misfire_policy': reminder.misfire_policy,
+        'tenant': reminder.tenant
+    }
+
+def history_to_dict(entry):
+    reminder, archived_at, reason = entry
+    return dict(reminder_to_dict(reminder), archived_at=archived_at.strftime(DATETIME_FORMAT), reason=reason)
+
+def format_cursor(cursor):
+    # (fire_at, id) from one database, or (fire_at, shard, id) from a sharded store
+    return None if cursor is None else ':'.join(str(part) for part in cursor)
+
+def parse_cursor(value):
+    try:
+        cursor = tuple(int(part) for part in value.split(':'))
+    except ValueError:
+        raise ApiError(400, f"invalid cursor '{value}'")
+    if len(cursor) not in (2, 3):
+        raise ApiError(400, f"invalid cursor '{value}'")
+    return cursor
+
+def query_tenant(query, body=None):
+    # The tenant a request acts for: ?tenant=, else a "tenant" field in a JSON object body
+    if 'tenant' in query:
+        return query['tenant'][0]
+    if isinstance(body, dict) and isinstance(body.get('tenant'), str):
+        return body['tenant']
+    return None
+
+class ReminderApi:
+    # The request handlers; plain blocking functions that the daemon runs on its worker threads
+    def __init__(self, reminder_manager, time_parser=None):
+        self.reminder_manager = reminder_manager
+        self.time_parser = time_parser or TimeParser()
+        self.routes = [
+            ('GET', re.compile(r'/health'), 'health', self.health),
+            ('GET', re.compile(r'/stats'), 'stats', self.stats),
+            ('GET', re.compile(r'/history'), 'history', self.history),
+            ('GET', re.compile(r'/reminders'), 'list', self.list_reminders),
+            ('POST', re.compile(r'/reminders'), 'add', self.add_reminder),
+            ('POST', re.compile(r'/reminders/bulk'), 'bulk', self.add_bulk),
+            ('GET', re.compile(r'/reminders/search'), 'search', self.search_reminders),
+            ('GET', re.compile(r'/reminders/(\d+)'), 'get', self.get_reminder),
+            ('PATCH', re.compile(r'/reminders/(\d+)'), 'edit', self.edit_reminder),
+            ('DELETE', re.compile(r'/reminders/(\d+)'), 'delete', self.delete_reminder)
+        ]
+
+    def route(self, method, path):
+        # Returns (route name, handler, path arguments); raises ApiError for unknown paths or methods
+        allowed = False
+        for route_method, pattern, name, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                if route_method == method:
+                    return name, handler, match.groups()
+                allowed = True
+        if allowed:
+            raise ApiError(405, f"method {method} not allowed on {path}")
+        raise ApiError(404, f"no such endpoint {path}")
+
+    def _row_to_reminder(self, reminder_id, row):
+        text, datetime_str, fire_at, recurrence, recurrence_interval, recurrence_end, misfire_policy = row
+        return Reminder(reminder_id, text, datetime_str, recurrence, recurrence_interval, recurrence_end, misfire_policy, fire_at)
+
+    def _parse(self, record):
+        if not isinstance(record, dict):
+            raise ApiError(400, "expected a JSON object")
+        try:
+            return parse_record(record, self.time_parser)
+        except RecordError as e:
+            raise ApiError(400, str(e))
+
+    def _existing(self, reminder_id, tenant):
+        reminder = self.reminder_manager.get_reminder(int(reminder_id), tenant=tenant)
+        if reminder is None:
+            raise ApiError(404, f"reminder {reminder_id} not found")
+        return reminder
+
+    def health(self, query, body):
+        return 200, {'status': 'ok'}
+
+    def stats(self, query, body):
+        return 200, REGISTRY.snapshot()
+
+    def history(self, query, body):
+        try:
+            limit = min(MAX_PAGE_SIZE, max(1, int(query.get('limit', ['100'])[0])))
+            reminder_id = int(query['reminder_id'][0]) if 'reminder_id' in query else None
+        except ValueError:
+            raise ApiError(400, "limit and reminder_id must be numbers")
+        bounds = {}
+        for name in ('start', 'end'):
+            if name in query:
+                try:
+                    bounds[name] = datetime.strptime(query[name][0], DATETIME_FORMAT)
+                except ValueError:
+                    raise ApiError(400, f"{name} must look like YYYY-MM-DD HH:MM:SS")
+        entries = self.reminder_manager.get_history(reminder_id=reminder_id, limit=limit, tenant=query_tenant(query), **bounds)
+        return 200, {'history': [history_to_dict(entry) for entry in entries]}
+
+    def list_reminders(self, query, body):
+        after = parse_cursor(query['after'][0]) if 'after' in query else None
+        try:
+            page_size = min(MAX_PAGE_SIZE, max(1, int(query.get('page_size', ['50'])[0])))
+        except ValueError:
+            raise ApiError(400, "page_size must be a number")
+        recurring_only = query.get('recurring_only', ['0'])[0] in ('1', 'true', 'yes')
+        reminders, cursor = self.reminder_manager.get_upcoming_page(after, page_size, recurring_only, tenant=query_tenant(query))
+        return 200, {'reminders': [reminder_to_dict(reminder) for reminder in reminders], 'cursor': format_cursor(cursor)}
+
+    def add_reminder(self, query, body):
+        reminder = self._row_to_reminder(None, self._parse(body))
+        reminder.tenant = query_tenant(query, body)
+        if self.reminder_manager.add_reminder(reminder) is None:
+            raise ApiError(500, "could not store the reminder")
+        return 201, {'reminder': reminder_to_dict(reminder)}
+
+    def add_bulk(self, query, body):
+        records = body.get('records') if isinstance(body, dict) else None
+        if not isinstance(records, list):
+            raise ApiError(400, "expected {\"records\": [...]}")
+        imported, errors = import_reminders(self.reminder_manager, records, tenant=query_tenant(query, body))
+        return 200, {'imported': imported, 'errors': [{'record': number, 'error': error} for number, error in errors]}
+
+    def search_reminders(self, query, body):
+        try:
+            limit = min(MAX_PAGE_SIZE, max(1, int(query.get('limit', ['20'])[0])))
+        except ValueError:
+            raise ApiError(400, "limit must be a number")
+        reminders = self.reminder_manager.search_reminders(query.get('q', [''])[0], limit, tenant=query_tenant(query))
+        return 200, {'reminders': [reminder_to_dict(reminder) for reminder in reminders]}
+
+    def get_reminder(self, query, body, reminder_id):
+        return 200, {'reminder': reminder_to_dict(self._existing(reminder_id, query_tenant(query)))}
+
+    def edit_reminder(self, query, body, reminder_id):
+        if not isinstance(body, dict):
+            raise ApiError(400, "expected a JSON object")
+        existing = self._existing(reminder_id, query_tenant(query))
+        record = reminder_to_dict(existing)
+        record.update((field, body[field]) for field in FIELDS if field in body)
+        reminder = self._row_to_reminder(int(reminder_id), self._parse(record))
+        reminder.tenant = existing.tenant
+        if not self.reminder_manager.update_reminder(reminder):
+            raise ApiError(404, f"reminder {reminder_id} not found")
+        return 200, {'reminder': reminder_to_dict(reminder)}
+
+    def delete_reminder(self, query, body, reminder_id):
+        if not self.reminder_manager.delete_reminder(int(reminder_id), tenant=query_tenant(query)):
+            raise ApiError(404, f"reminder {reminder_id} not found")
+        return 200, {'deleted': int(reminder_id)}
+
+    def handle(self, method, target, body):
+        # Runs one request end to end and returns (status, payload)
+        route_name = 'unknown'
+        url = urlsplit(target)
+        try:
+            route_name, handler, arguments = self.route(method, url.path.rstrip('/') or '/')
+            with API_REQUEST_SECONDS.labels(route=route_name).time():
+                payload = json.loads(body) if body else {}
+                return handler(parse_qs(url.query), payload, *arguments)
+        except ApiError as e:
+            status, payload = e.status, {'error': e.message}
+        except TenantRequiredError as e:
+            status, payload = 400, {'error': str(e)}
+        except json.JSONDecodeError as e:
+            status, payload = 400, {'error': f"invalid JSON: {e}"}
+        except Exception as e:
+            logging.error("Error handling %s %s: %s", method, target, e)
+            status, payload = 500, {'error': "internal error"}
+        API_ERRORS.labels(route=route_name).inc()
+        return status, payload
+
+class ReminderDaemon:
+    def __init__(self, reminder_manager, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=8, owned=()):
+        # owned: objects with a stop() or close() method (scheduler, notifier, manager) shut down by stop()
+        self.api = ReminderApi(reminder_manager)
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-worker')
+        self.owned = list(owned)
+        self.loop = None
+        self.stopping = None
+        self.writers = set()
+        self.ready = threading.Event()
+        self.thread = None
+
+    async def handle_connection(self, reader, writer):
+        # One HTTP/1.1 connection; requests on it are answered in order, keep-alive by default
+        self.writers.add(writer)
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body, error = request
+                if error:
+                    status, payload = error
+                else:
+                    status, payload = await self.loop.run_in_executor(self.executor, self.api.handle, method, target, body)
+                keep_alive = not error and headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logging.error("Error on API connection: %s", e)
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def _read_request(self, reader):
+        # Returns (method, target, headers, body, error) or None when the client closed the connection
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        parts = request_line.decode('latin-1').split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if len(parts) != 3:
+            return None, None, headers, b'', (400, {'error': "malformed request line"})
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            return parts[0], parts[1], headers, b'', (400, {'error': "invalid Content-Length"})
+        if length > MAX_BODY_BYTES:
+            return parts[0], parts[1], headers, b'', (413, {'error': "request body too large"})
+        body = await reader.readexactly(length) if length else b''
+        return parts[0], parts[1], headers, body, None
+
+    def _write_response(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        head = (
+            f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+
+    async def serve(self):
+        # Serves until stop() is called
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        logging.info("Reminder API listening on http://%s:%d", self.host, self.port)
+        self.ready.set()
+        try:
+            await self.stopping.wait()
+        finally:
+            server.close()
+            for writer in list(self.writers):
+                writer.close()
+            await server.wait_closed()
+
+    def start(self):
+        # Runs the server on a background thread and returns once it is accepting connections
+        self.thread = threading.Thread(target=asyncio.run, args=(self.serve(),), name='reminder-api', daemon=True)
+        self.thread.start()
+        self.ready.wait(10)
+        return self
+
+    def stop(self):
+        # Safe after serve() has already ended (e.g. asyncio.run returning on Ctrl-C), when the loop is closed;
+        # the owned components are shut down either way, each even if an earlier one fails
+        if self.loop is not None and self.stopping is not None and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(self.stopping.set)
+            except RuntimeError:
+                pass  # The loop closed in the meantime
+        if self.thread is not None:
+            self.thread.join(10)
+        self.executor.shutdown(wait=True)
+        for component in self.owned:
+            try:
+                (getattr(component, 'stop', None) or component.close)()
+            except Exception as e:
+                logging.error("Error shutting down %s: %s", type(component).__name__, e)
+        logging.info("Reminder API stopped.")
+
+def open_daemon(database, host=DEFAULT_HOST, port=DEFAULT_PORT, durability='sync', guarantee='at-least-once', history_days=None, shards=None,
+                digest_window=None, digest_max=10, rate_limit=6, storage='file'):
+    # Builds the full stack (manager, notifier, scheduler, API) without starting the server.
+    # durability='group' batches concurrent adds into shared commits (see ReminderManager).
+    # guarantee picks outbox delivery semantics (see OutboxRelay); None notifies directly, without the outbox.
+    # history_days is how long fired reminders stay in the history archive (None keeps them).
+    # shards=N serves a multi-tenant ShardedReminderStore kept in the directory `database` instead of one file.
+    # digest_window=SECONDS coalesces notifications per tenant into digests of at most digest_max reminders,
+    # at most rate_limit per tenant per minute (None: unlimited); see Coalescer. None sends each one on its own.
+    # storage='memory' serves the database from memory, persisted by snapshots and a change log (see SnapshotPool).
+    if shards:
+        reminder_manager = ShardedReminderStore(database, shards, durability=durability, history_retention_days=history_days, storage=storage)
+    else:
+        reminder_manager = ReminderManager(database, durability=durability, history_retention_days=history_days, storage=storage)
+    notifier = Notifier()
+    coalescer = None
+    if digest_window:
+        coalescer = Coalescer(digest_window, digest_max, rate_limit or None)
+        if guarantee is None:
+            notifier = DigestNotifier(notifier, coalescer)
+    scheduler = (ShardedScheduler if shards else Scheduler)(reminder_manager, notifier, guarantee=guarantee, coalescer=coalescer)
+    scheduler.start()
+    # Stopped in order: the scheduler first so nothing is queued after the notifier closes
+    return ReminderDaemon(reminder_manager, host, port, owned=(scheduler, notifier, reminder_manager))
+
+def main(argv=None):
+    from logging_setup import configure_logging
+
+    parser = argparse.ArgumentParser(description="Run the reminder scheduler headless with a local JSON API.")
+    parser.add_argument('--db', default='reminders.db')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=int(os.environ.get('REMINDER_BOT_API_PORT', DEFAULT_PORT)))
+    parser.add_argument('--durability', choices=DURABILITY_MODES, default=os.environ.get('REMINDER_BOT_DURABILITY', 'sync'),
+                        help="'sync' commits each added reminder; 'group' commits concurrent adds together")
+    parser.add_argument('--delivery', choices=GUARANTEES + ('direct',), default='at-least-once',
+                        help="outbox delivery guarantee, or 'direct' to notify without the outbox")
+    parser.add_argument('--history-days', type=float, default=os.environ.get('REMINDER_BOT_HISTORY_DAYS'),
+                        help="days to keep fired reminders in the history archive (default: forever)")
+    parser.add_argument('--shards', type=int, default=None, help="shard tenants over N database files in the --db directory")
+    parser.add_argument('--digest-window', type=float, default=float(os.environ.get('REMINDER_BOT_DIGEST_WINDOW', 0)),
+                        help="seconds within which a tenant's due reminders are sent as one digest, with --rate-limit "
+                             f"applied (e.g. {DEFAULT_DIGEST_WINDOW:g}); the default 0 sends each one as soon as it is due")
+    parser.add_argument('--digest-max', type=int, default=10, help="most reminders listed in one digest")
+    parser.add_argument('--rate-limit', type=int, default=6, help="with --digest-window, most notifications per tenant per minute (0: unlimited)")
+    parser.add_argument('--storage', choices=STORAGE_MODES, default=os.environ.get('REMINDER_BOT_STORAGE', 'file'),
+                        help="'memory' serves the database from memory and persists it by snapshots and a change log")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    metrics_port = os.environ.get('REMINDER_BOT_METRICS_PORT')
+    if metrics_port:
+        start_metrics_server(int(metrics_port))
+
+    daemon = open_daemon(args.db, args.host, args.port, args.durability, None if args.delivery == 'direct' else args.delivery,
+                         args.history_days, args.shards, args.digest_window, args.digest_max, args.rate_limit, args.storage)
+    try:
+        asyncio.run(daemon.serve())
+    except KeyboardInterrupt:
+        logging.info("Daemon terminated by user.")
+    finally:
+        daemon.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,434 @@
+#This file will contain the SQLite connection handling shared by the managers.
+
+#database.py:
+# Contains the ConnectionPool class.
+# One writer connection serialized by a lock, plus one read connection per thread (WAL mode).
+# Contains the WriteBuffer class, which groups writes from many threads into one transaction.
+# Contains the SnapshotPool class, an in-memory storage backend persisted by snapshots and a change log.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+class ConnectionPool:
+    def __init__(self, database, timeout=30):
+        # With WAL enabled, readers on their own connections never wait for the writer's transaction.
+        # An in-memory database cannot be shared between connections, so it uses the writer for reads too.
+        self.database = database
+        self.timeout = timeout
+        self.shared = database == ':memory:' or database.startswith('file::memory:')
+        self.write_lock = threading.RLock()
+        self.writer = self._connect()
+        # Only takes effect in a new, empty file, and must come before WAL mode writes its header. Existing
+        # files keep their mode until ReminderManager.enable_incremental_vacuum rebuilds them.
+        self.writer.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        if not self.shared:
+            mode = self.writer.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+            if mode.lower() != 'wal':
+                logging.warning("Could not enable WAL mode (journal_mode=%s).", mode)
+        self.local = threading.local()
+        self.readers = []
+        self.readers_lock = threading.Lock()
+
+    def _connect(self):
+        return sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False)
+
+    @contextmanager
+    def write(self):
+        # Yields a cursor on the single writer connection; commits on success, rolls back on error
+        with self.write_lock:
+            cursor = self.writer.cursor()
+            try:
+                yield cursor
+                self.writer.commit()
+            except Exception:
+                self.writer.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def read(self):
+        # Yields a cursor on this thread's read connection
+        if self.shared:
+            with self.write_lock:
+                cursor = self.writer.cursor()
+                try:
+                    yield cursor
+                finally:
+                    cursor.close()
+            return
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute('PRAGMA query_only = ON')
+            self.local.conn = conn
+            with self.readers_lock:
+                self.readers.append(conn)
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    def close(self):
+        with self.readers_lock:
+            for conn in self.readers:
+                conn.close()
+            self.readers = []
+        with self.write_lock:
+            self.writer.close()
+
+# Statements that can't change the database; everything else run through a SnapshotPool's writer is logged
+READ_ONLY_PREFIXES = ('SELECT', 'BEGIN', 'COMMIT', 'END', 'ROLLBACK')
+
+class LoggedCursor:
+    # Wraps the writer's cursor and records every statement that may change the database, with its
+    # parameters, once it has run without error: ('x', sql, params), ('m', sql, rows) or ('s', script, None)
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.ops = []
+
+    def execute(self, sql, parameters=()):
+        self.cursor.execute(sql, parameters)
+        if not sql.lstrip().upper().startswith(READ_ONLY_PREFIXES):
+            self.ops.append(('x', sql, parameters))
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        rows = [tuple(parameters) if not isinstance(parameters, dict) else parameters for parameters in seq_of_parameters]
+        self.cursor.executemany(sql, rows)
+        if rows:
+            self.ops.append(('m', sql, rows))
+        return self
+
+    def executescript(self, script):
+        self.cursor.executescript(script)
+        self.ops.append(('s', script, None))
+        return self
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+class SnapshotPool(ConnectionPool):
+    def __init__(self, database, snapshot_interval=30.0, snapshot_changes=1000, fsync_log=False, snapshot_pages=256, timeout=30):
+        # Serves every read and write from an in-memory copy of `database`, which must not be opened by anyone
+        # else meanwhile. Each committed write transaction is appended to `database`.changes as one JSON line
+        # (written to the OS before write() returns; fsynced too with fsync_log=True). A background thread
+        # snapshots the memory database back to the file every snapshot_interval seconds, or sooner once
+        # snapshot_changes transactions are waiting: a memory-to-memory backup under the write lock freezes the
+        # state, then that copy is written out snapshot_pages pages per backup step, fsynced and renamed over
+        # the file, and the log records it covers are dropped. Opening recovers the last snapshot plus the log.
+        self.database = database
+        self.timeout = timeout
+        self.shared = True
+        self.write_lock = threading.RLock()
+        self.local = threading.local()
+        self.readers = []
+        self.readers_lock = threading.Lock()
+        self.log_path = database + '.changes'
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_changes = snapshot_changes
+        self.fsync_log = fsync_log
+        self.snapshot_pages = snapshot_pages
+        self.snapshot_lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.changes = 0
+        self.writer = sqlite3.connect(':memory:', check_same_thread=False)
+        self.writer.execute('PRAGMA auto_vacuum = INCREMENTAL')  # replaced by the snapshot's mode if there is one
+        self.snapshot_seq = self._load_snapshot()
+        self.seq, log_end, replayed = self._replay_log()
+        # Appends start after the last complete record, overwriting any torn one left by a crash
+        self.log = open(self.log_path, 'ab')
+        self.log.truncate(log_end)
+        self.log_offset = log_end
+        if replayed:
+            logging.info("Recovered %d logged transaction(s) on top of the %s snapshot.", replayed, database)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='snapshot-writer', daemon=True)
+        self.thread.start()
+
+    @contextmanager
+    def write(self):
+        with self.write_lock:
+            cursor = LoggedCursor(self.writer.cursor())
+            try:
+                yield cursor
+                self.writer.commit()
+            except Exception:
+                self.writer.rollback()
+                raise
+            finally:
+                cursor.close()
+            if cursor.ops:
+                self._append(cursor.ops)
+
+    def snapshot(self):
+        # Writes the current state to the database file and compacts the log; returns the sequence number
+        # of the last transaction the snapshot includes
+        with self.snapshot_lock:
+            frozen = sqlite3.connect(':memory:')
+            try:
+                with self.write_lock:
+                    if self.seq == self.snapshot_seq:
+                        return self.seq
+                    self.writer.backup(frozen)
+                    seq, log_offset = self.seq, self.log_offset
+                    self.changes = 0
+                frozen.execute('CREATE TABLE snapshot_info (seq INTEGER NOT NULL)')
+                frozen.execute('INSERT INTO snapshot_info (seq) VALUES (?)', (seq,))
+                frozen.commit()
+                temporary = self.database + '.snapshot'
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+                target = sqlite3.connect(temporary)
+                try:
+                    frozen.backup(target, pages=self.snapshot_pages)
+                finally:
+                    target.close()
+            finally:
+                frozen.close()
+            self._fsync(temporary)
+            os.replace(temporary, self.database)
+            self._fsync_directory()
+            self._compact_log(log_offset)
+            self.snapshot_seq = seq
+            logging.info("Snapshot of %s written through change %d.", self.database, seq)
+            return seq
+
+    def close(self):
+        # Stops the snapshot thread and writes a final snapshot, so the next start has no log to replay
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
+        try:
+            self.snapshot()
+        finally:
+            with self.write_lock:
+                self.log.close()
+                self.writer.close()
+
+    def _load_snapshot(self):
+        # Copies the database file into memory; returns the log sequence number the file was snapshotted at
+        if not os.path.exists(self.database):
+            return 0
+        disk = sqlite3.connect(self.database, timeout=self.timeout)
+        try:
+            disk.backup(self.writer)
+        finally:
+            disk.close()
+        try:
+            seq = self.writer.execute('SELECT seq FROM snapshot_info').fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0  # A plain database file, never snapshotted
+        self.writer.execute('DROP TABLE snapshot_info')
+        self.writer.commit()
+        return seq
+
+    def _replay_log(self):
+        # Applies the logged transactions newer than the snapshot. Returns (last sequence number, offset just
+        # past the last complete record, transactions replayed); a torn or unreadable record ends the log.
+        seq, offset, replayed = self.snapshot_seq, 0, 0
+        if not os.path.exists(self.log_path):
+            return seq, 0, 0
+        with open(self.log_path, 'rb') as log:
+            for line in log:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logging.error("Unreadable record in %s at offset %d; ignoring the rest of the log.", self.log_path, offset)
+                    break
+                if record['seq'] > seq:
+                    cursor = self.writer.cursor()
+                    for kind, sql, parameters in record['ops']:
+                        if kind == 's':
+                            cursor.executescript(sql)
+                        elif kind == 'm':
+                            cursor.executemany(sql, parameters)
+                        else:
+                            cursor.execute(sql, parameters)
+                    self.writer.commit()
+                    cursor.close()
+                    seq = record['seq']
+                    replayed += 1
+                offset += len(line)
+        return seq, offset, replayed
+
+    def _append(self, ops):
+        # Called with the write lock held, right after the transaction committed in memory
+        self.seq += 1
+        line = json.dumps({'seq': self.seq, 'ops': ops}, separators=(',', ':')).encode('utf-8') + b'\n'
+        try:
+            self.log.write(line)
+            self.log.flush()
+            if self.fsync_log:
+                os.fsync(self.log.fileno())
+            self.log_offset += len(line)
+        except (OSError, TypeError, ValueError) as e:
+            # Already committed in memory; only a snapshot can persist it now
+            logging.error("Could not log change %d to %s (%s); snapshotting instead.", self.seq, self.log_path, e)
+            self.changes = self.snapshot_changes
+        self.changes += 1
+        if self.changes >= self.snapshot_changes:
+            with self.condition:
+                self.condition.notify_all()
+
+    def _compact_log(self, offset):
+        # Drops the records before `offset` (all covered by the snapshot just written)
+        with self.write_lock:
+            self.log.flush()
+            with open(self.log_path, 'rb') as log:
+                log.seek(offset)
+                tail = log.read()
+            temporary = self.log_path + '.tmp'
+            with open(temporary, 'wb') as log:
+                log.write(tail)
+                log.flush()
+                os.fsync(log.fileno())
+            self.log.close()
+            os.replace(temporary, self.log_path)
+            self.log = open(self.log_path, 'ab')
+            self.log_offset = len(tail)
+
+    def _fsync(self, path):
+        with open(path, 'rb+') as f:
+            os.fsync(f.fileno())
+
+    def _fsync_directory(self):
+        # Makes the rename itself durable (not possible, nor needed, on Windows)
+        if os.name != 'posix':
+            return
+        directory = os.open(os.path.dirname(os.path.abspath(self.database)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    def _run(self):
+        last = time.monotonic()
+        while True:
+            with self.condition:
+                while self.running and self.changes < self.snapshot_changes:
+                    remaining = last + self.snapshot_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if not self.running:
+                    return
+            try:
+                self.snapshot()
+            except Exception as e:
+                logging.error("Error writing snapshot of %s: %s", self.database, e)
+            last = time.monotonic()
+
+class WriteBuffer:
+    def __init__(self, flush, max_records=500, max_delay=0.01):
+        # Items submitted from any thread are passed to flush(items) in batches on one background thread.
+        # A batch is flushed once it has max_records items or its oldest item has waited max_delay seconds.
+        # flush must return one result per item; each item's Future gets its result (or the batch's exception).
+        self.flush_function = flush
+        self.max_records = max_records
+        self.max_delay = max_delay
+        self.pending = []
+        self.deadline = None
+        self.urgent = False
+        self.flushing = 0
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='write-buffer', daemon=True)
+        self.thread.start()
+        return self
+
+    def submit(self, item, urgent=False):
+        # urgent items are flushed as soon as the flusher is free instead of waiting for the batch to fill up;
+        # everything submitted while a flush is running still shares the next one
+        future = Future()
+        with self.condition:
+            if not self.running:
+                raise RuntimeError("write buffer is stopped")
+            if not self.pending:
+                self.deadline = time.monotonic() + self.max_delay
+            self.pending.append((item, future))
+            if urgent or len(self.pending) >= self.max_records:
+                self.urgent = self.urgent or urgent
+                self.condition.notify_all()
+            elif len(self.pending) == 1:
+                self.condition.notify_all()
+        return future
+
+    def flush(self):
+        # Blocks until everything submitted so far has been flushed
+        with self.condition:
+            self.urgent = True
+            self.condition.notify_all()
+            while self.pending or self.flushing:
+                self.condition.wait()
+
+    def __len__(self):
+        with self.condition:
+            return len(self.pending)
+
+    def stop(self, timeout=10):
+        # Flushes what is left, then stops the flusher thread; later submits raise RuntimeError
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def _next_batch(self):
+        # Waits for a batch to be ready; returns None once stopped with nothing left to flush
+        with self.condition:
+            while True:
+                if self.pending:
+                    remaining = self.deadline - time.monotonic()
+                    if self.urgent or not self.running or remaining <= 0 or len(self.pending) >= self.max_records:
+                        break
+                    self.condition.wait(remaining)
+                elif not self.running:
+                    return None
+                else:
+                    self.condition.wait()
+            batch = self.pending[:self.max_records]
+            self.pending = self.pending[self.max_records:]
+            if self.pending:
+                self.deadline = time.monotonic() + self.max_delay
+            else:
+                self.urgent = False
+            self.flushing += 1
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                results = self.flush_function([item for item, future in batch])
+                for (item, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logging.error("Error flushing %d buffered writes: %s", len(batch), e)
+                for item, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                with self.condition:
+                    self.flushing -= 1
+                    self.condition.notify_all()
@@ -0,0 +1,529 @@
+#This file will contain the notification delivery subsystem used by the Notifier.
+
+#delivery.py:
+# Contains the notification backends (toast, stdout, log file, webhook).
+# Contains the DeliveryQueue, a bounded queue drained by a pool of worker threads with retries.
+# Contains the OutboxRelay, which delivers notifications from the database outbox with at-least-once or
+# at-most-once semantics.
+# Contains the Coalescer and DigestNotifier, which fold bursts of notifications for one channel (tenant) into a
+# single digest, with a cap on digest size and a per-channel rate limit.
+
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from clock import SYSTEM_CLOCK
+from metrics import REGISTRY
+
+DELIVERY_SECONDS = REGISTRY.histogram('notification_delivery_seconds', 'Time taken by a backend to deliver one notification.')
+DELIVERIES_SENT = REGISTRY.counter('notifications_sent_total', 'Notifications delivered successfully.')
+DELIVERIES_FAILED = REGISTRY.counter('notifications_failed_total', 'Notifications that failed after all retries.')
+DELIVERY_RETRIES = REGISTRY.counter('notification_retries_total', 'Delivery attempts scheduled for retry.')
+DELIVERIES_DROPPED = REGISTRY.counter('notifications_dropped_total', 'Notifications dropped because the delivery queue was full.')
+QUEUE_DEPTH = REGISTRY.gauge('notification_queue_depth', 'Deliveries waiting in the queue.')
+OUTBOX_DELIVERED = REGISTRY.counter('outbox_delivered_total', 'Outbox notifications delivered.')
+OUTBOX_RETRIES = REGISTRY.counter('outbox_retries_total', 'Outbox notifications scheduled for another attempt.')
+OUTBOX_FAILED = REGISTRY.counter('outbox_failed_total', 'Outbox notifications given up on.')
+OUTBOX_BATCH_SECONDS = REGISTRY.histogram('outbox_batch_seconds', 'Time taken to claim, deliver and settle one outbox batch.')
+DIGESTS_COMPOSED = REGISTRY.counter('notification_digests_total', 'Digest notifications composed from bursts of reminders.')
+NOTIFICATIONS_COALESCED = REGISTRY.counter('notifications_coalesced_total', 'Reminder notifications folded into a digest.')
+RATE_LIMITED = REGISTRY.counter('notifications_rate_limited_total', 'Outbox notifications put back because their channel hit its rate limit.')
+
+GUARANTEES = ('at-least-once', 'at-most-once')
+
+# Suggested window for Coalescer. Coalescing is off unless asked for (daemon.py --digest-window), since
+# every notification then waits at least the window before it is sent.
+DEFAULT_DIGEST_WINDOW = 2.0
+
+class NotificationBackend:
+    name = 'backend'
+
+    def send(self, title, message):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class ToastBackend(NotificationBackend):
+    name = 'toast'
+
+    def __init__(self, duration=10):
+        # Imported here so the rest of the bot runs on hosts without win10toast (e.g. Linux)
+        from win10toast import ToastNotifier
+        self.toaster = ToastNotifier()
+        self.duration = duration
+        self.lock = threading.Lock()
+
+    def send(self, title, message):
+        # win10toast can only show one toast at a time, so workers take turns
+        with self.lock:
+            self.toaster.show_toast(title, message, duration=self.duration, threaded=False)
+
+class StdoutBackend(NotificationBackend):
+    name = 'stdout'
+
+    def send(self, title, message):
+        print(f"\n[{title}] {message}", flush=True)
+
+class LogFileBackend(NotificationBackend):
+    name = 'logfile'
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def send(self, title, message):
+        line = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {title} - {message}\n"
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+class WebhookBackend(NotificationBackend):
+    name = 'webhook'
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, title, message):
+        import urllib.request  # only webhook users pay for urllib's import (it pulls in http.client, email, ssl)
+        body = json.dumps({'title': title, 'message': message}).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if response.status >= 300:
+                raise RuntimeError(f"Webhook returned HTTP {response.status}")
+
+def default_backends():
+    # Toasts where win10toast is available, stdout everywhere else
+    try:
+        return [ToastBackend()]
+    except Exception as e:
+        logging.info("Toast notifications unavailable (%s); using stdout.", e)
+        return [StdoutBackend()]
+
+class BatchQueue(queue.Queue):
+    def put_all(self, items, timeout=None):
+        # Enqueues every item or none of them: waits up to `timeout` seconds for room for the whole batch,
+        # then raises queue.Full without having added any
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.not_full:
+            while 0 < self.maxsize < self._qsize() + len(items):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Full
+                self.not_full.wait(remaining)
+            for item in items:
+                self._put(item)
+            self.unfinished_tasks += len(items)
+            self.not_empty.notify(len(items))
+
+class Delivery:
+    def __init__(self, backend, title, message, attempt=0):
+        self.backend = backend
+        self.title = title
+        self.message = message
+        self.attempt = attempt
+
+class DeliveryQueue:
+    def __init__(self, backends, workers=4, max_queue_size=1000, enqueue_timeout=1.0, max_retries=3, retry_delay=1.0):
+        # A full queue blocks submit() for up to enqueue_timeout seconds before the notification is dropped.
+        # Failed deliveries are retried per backend with exponential backoff (retry_delay * 2 ** attempt).
+        self.backends = list(backends)
+        self.workers = workers
+        self.queue = BatchQueue(maxsize=max_queue_size)
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.threads = []
+        self.retry_timers = set()
+        self.lock = threading.Lock()
+        self.running = False
+        QUEUE_DEPTH.set_function(self.queue.qsize)
+
+    def start(self):
+        self.running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"delivery-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, title, message):
+        # Queues the notification for every backend, or for none if the queue has no room for all of them,
+        # so a caller that retries after False doesn't send it twice through the backends that had room
+        try:
+            self.queue.put_all([Delivery(backend, title, message) for backend in self.backends], timeout=self.enqueue_timeout)
+        except queue.Full:
+            for backend in self.backends:
+                DELIVERIES_DROPPED.labels(backend=backend.name).inc()
+            logging.error("Delivery queue full; dropped notification: '%s'", message)
+            return False
+        return True
+
+    def send_now(self, title, message):
+        # Delivers on the calling thread through every backend, without the queue or its retries.
+        # Raises the first backend error once all backends have been tried.
+        error = None
+        for backend in self.backends:
+            try:
+                self._send(backend, title, message)
+            except Exception as e:
+                DELIVERIES_FAILED.labels(backend=backend.name).inc()
+                error = error or e
+        if error is not None:
+            raise error
+
+    def _send(self, backend, title, message, attempt=0):
+        start = time.perf_counter()
+        try:
+            backend.send(title, message)
+        finally:
+            DELIVERY_SECONDS.labels(backend=backend.name).observe(time.perf_counter() - start)
+        DELIVERIES_SENT.labels(backend=backend.name).inc()
+        logging.info(
+            "Notification sent via %s: '%s'", backend.name, message,
+            extra={'backend': backend.name, 'attempt': attempt, 'duration_ms': round((time.perf_counter() - start) * 1000, 3)}
+        )
+
+    def join(self):
+        # Blocks until every queued delivery (including pending retries) has been handled
+        while True:
+            self.queue.join()
+            with self.lock:
+                if not self.retry_timers and self.queue.unfinished_tasks == 0:
+                    return
+            time.sleep(0.01)
+
+    def stop(self, timeout=5):
+        self.running = False
+        with self.lock:
+            for timer in self.retry_timers:
+                timer.cancel()
+            self.retry_timers.clear()
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+        for backend in self.backends:
+            backend.close()
+
+    def _work(self):
+        while True:
+            delivery = self.queue.get()
+            try:
+                if delivery is None:
+                    return
+                self._deliver(delivery)
+            finally:
+                self.queue.task_done()
+
+    def _deliver(self, delivery):
+        backend_name = delivery.backend.name
+        try:
+            self._send(delivery.backend, delivery.title, delivery.message, delivery.attempt)
+        except Exception as e:
+            if delivery.attempt >= self.max_retries or not self.running:
+                DELIVERIES_FAILED.labels(backend=backend_name).inc()
+                logging.error("Failed to send notification via %s: %s", backend_name, e)
+                return
+            DELIVERY_RETRIES.labels(backend=backend_name).inc()
+            delay = self.retry_delay * 2 ** delivery.attempt
+            logging.warning("Notification via %s failed (%s); retrying in %.1fs", delivery.backend.name, e, delay)
+            retry = Delivery(delivery.backend, delivery.title, delivery.message, delivery.attempt + 1)
+            self._schedule_retry(retry, delay)
+
+    def _schedule_retry(self, delivery, delay):
+        def requeue():
+            with self.lock:
+                self.retry_timers.discard(timer)
+                if not self.running:
+                    return
+                try:
+                    self.queue.put_nowait(delivery)
+                except queue.Full:
+                    DELIVERIES_DROPPED.labels(backend=delivery.backend.name).inc()
+                    logging.error("Delivery queue full; dropped retry for '%s'", delivery.message)
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        with self.lock:
+            self.retry_timers.add(timer)
+        timer.start()
+
+class Coalescer:
+    def __init__(self, window=DEFAULT_DIGEST_WINDOW, max_items=10, rate_limit=6, rate_period=60.0, clock=SYSTEM_CLOCK):
+        # Policy shared by DigestNotifier and OutboxRelay. Notifications for one channel that fall due within
+        # `window` seconds of each other are sent as one digest listing at most max_items of them (the rest are
+        # summed up as "...and N more"). Each channel may send rate_limit notifications per rate_period seconds
+        # (a token bucket, so a quiet channel can burst up to rate_limit); rate_limit=None turns the limit off.
+        self.window = window
+        self.max_items = max_items
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.clock = clock
+        self.buckets = {}  # channel -> [tokens, monotonic time of the last refill]
+        self.lock = threading.Lock()
+
+    def wait_time(self, channel):
+        # Seconds until `channel` may send its next notification (0 if it may send now)
+        if self.rate_limit is None:
+            return 0.0
+        with self.lock:
+            tokens = self._refill(channel)
+            return 0.0 if tokens >= 1 else (1 - tokens) * self.rate_period / self.rate_limit
+
+    def take(self, channel):
+        # Spends one of the channel's tokens; a forced send may leave the bucket empty but never below zero
+        if self.rate_limit is None:
+            return
+        with self.lock:
+            self.buckets[channel][0] = max(0.0, self._refill(channel) - 1)
+            if len(self.buckets) > 4096:
+                self._prune()
+
+    def compose(self, messages):
+        # (title, message) for one notification carrying every message in the burst
+        if len(messages) == 1:
+            return 'Reminder', messages[0]
+        shown = messages[:self.max_items]
+        lines = [f"- {message}" for message in shown]
+        if len(messages) > len(shown):
+            lines.append(f"...and {len(messages) - len(shown)} more")
+        DIGESTS_COMPOSED.inc()
+        NOTIFICATIONS_COALESCED.inc(len(messages))
+        return f"{len(messages)} reminders", '\n'.join(lines)
+
+    def _refill(self, channel):
+        now = self.clock.monotonic()
+        bucket = self.buckets.get(channel)
+        if bucket is None:
+            bucket = self.buckets[channel] = [float(self.rate_limit), now]
+        bucket[0] = min(float(self.rate_limit), bucket[0] + (now - bucket[1]) * self.rate_limit / self.rate_period)
+        bucket[1] = now
+        return bucket[0]
+
+    def _prune(self):
+        # Full buckets carry no state worth keeping, so channels idle for a whole period are forgotten
+        now = self.clock.monotonic()
+        for channel, (tokens, updated) in list(self.buckets.items()):
+            if now - updated >= self.rate_period:
+                del self.buckets[channel]
+
+class DigestNotifier:
+    def __init__(self, notifier, coalescer=None, clock=SYSTEM_CLOCK, autostart=True):
+        # Sits between the Scheduler and a Notifier when notifications are sent directly (no outbox).
+        # send_notification only buffers the message under its channel; a flusher thread sends each channel's
+        # buffer as one notification once the coalescer's window has passed since its first message and the
+        # channel's rate limit allows. Messages that arrive while a channel is rate limited join its next digest.
+        # autostart=False leaves flushing to the caller (flush()), e.g. when driven by a SimulatedClock.
+        self.notifier = notifier
+        self.clock = clock
+        self.coalescer = coalescer or Coalescer(clock=clock)
+        self.pending = {}  # channel -> [monotonic time of the first message, messages]
+        self.condition = threading.Condition()
+        self.changed = False
+        self.running = False
+        self.thread = None
+        if autostart:
+            self.start()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='digest-flusher', daemon=True)
+        self.thread.start()
+        return self
+
+    def send_notification(self, message, channel=None):
+        with self.condition:
+            pending = self.pending.get(channel)
+            if pending is None:
+                self.pending[channel] = pending = [self.clock.monotonic(), []]
+                self.changed = True
+                self.condition.notify()
+            pending[1].append(message)
+        return True
+
+    def deliver(self, message, title='Reminder'):
+        # Synchronous delivery for an OutboxRelay, which coalesces its own batches
+        self.notifier.deliver(message, title=title)
+
+    def flush(self, force=False):
+        # Sends every channel whose digest is ready (all of them, ignoring window and rate limit, if force);
+        # returns the seconds until the next one will be, or None if nothing is pending
+        ready, next_due = [], None
+        with self.condition:
+            now = self.clock.monotonic()
+            for channel, (first, messages) in list(self.pending.items()):
+                wait = 0.0 if force else max(first + self.coalescer.window - now, self.coalescer.wait_time(channel))
+                if wait <= 0:
+                    del self.pending[channel]
+                    self.coalescer.take(channel)
+                    ready.append(messages)
+                elif next_due is None or wait < next_due:
+                    next_due = wait
+        for messages in ready:
+            title, message = self.coalescer.compose(messages)
+            try:
+                self.notifier.send_notification(message, title=title)
+            except Exception as e:
+                logging.error("Failed to send digest of %d notification(s): %s", len(messages), e)
+        return next_due
+
+    def close(self):
+        # Stops the flusher, sends whatever is still buffered and closes the wrapped notifier
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(10)
+            self.thread = None
+        self.flush(force=True)
+        self.notifier.close()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                self.changed = False
+            next_due = self.flush()
+            with self.condition:
+                if self.running and not self.changed:
+                    self.clock.wait(self.condition, next_due)
+
+class OutboxRelay:
+    def __init__(self, reminder_manager, send, guarantee='at-least-once', batch_size=500, workers=4,
+                 max_retries=5, retry_delay=1.0, poll_interval=1.0, lease_seconds=60, owner=None, clock=SYSTEM_CLOCK, coalescer=None):
+        # Delivers the notifications that Scheduler.process_batch wrote to the outbox. send(message) must
+        # deliver synchronously and raise on failure (Notifier.deliver does).
+        # at-least-once: entries are leased, sent, then removed in one commit per batch. A crash before that
+        #   commit resends them once the lease expires; failures are retried with exponential backoff
+        #   (retry_delay * 2 ** attempts) and kept as failed after max_retries.
+        # at-most-once: entries are removed in the same commit that claims them, before sending, and are
+        #   never sent again, whether delivery fails or the process dies first.
+        # With a coalescer, entries are only claimed once they are coalescer.window seconds old, and each
+        # channel's entries in a batch go out as one digest through send(message, title=...). A channel over its
+        # rate limit has its entries put back until it may send again (at-least-once; at-most-once has already
+        # removed them, so they are sent regardless).
+        if guarantee not in GUARANTEES:
+            raise ValueError(f"Unknown delivery guarantee: '{guarantee}'")
+        self.reminder_manager = reminder_manager
+        self.send = send
+        self.guarantee = guarantee
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.clock = clock
+        self.coalescer = coalescer
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbox-worker')
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='outbox-relay', daemon=True)
+        self.thread.start()
+        return self
+
+    def wake(self):
+        # Called after new entries are committed, so they go out without waiting for the next poll
+        self.wakeup.set()
+
+    def stop(self, timeout=10):
+        self.running = False
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        self.executor.shutdown(wait=True)
+
+    def _run(self):
+        while self.running:
+            self.wakeup.clear()
+            try:
+                handled = self.relay_once()
+            except Exception as e:
+                logging.error("Error relaying outbox: %s", e)
+                handled = 0
+            if handled < self.batch_size:
+                self.wakeup.wait(self.poll_interval)
+
+    def relay_once(self):
+        # Claims, sends and settles one batch; returns the number of entries handled
+        with OUTBOX_BATCH_SECONDS.time():
+            at_most_once = self.guarantee == 'at-most-once'
+            min_age = self.coalescer.window if self.coalescer is not None else 0
+            entries = self.reminder_manager.claim_outbox(self.owner, self.batch_size, self.lease_seconds, remove=at_most_once, min_age=min_age)
+            if not entries:
+                return 0
+            if self.coalescer is None:
+                errors, deferred = list(self.executor.map(self._send_entry, entries)), {}
+            else:
+                errors, deferred = self._send_digests(entries, at_most_once)
+            delivered, retries, failed, deferrals = [], [], [], []
+            now = self.clock.time()
+            for (entry_id, reminder_id, message, fire_at, attempts, channel), error in zip(entries, errors):
+                if entry_id in deferred:
+                    deferrals.append((entry_id, now + deferred[entry_id]))
+                elif error is None:
+                    delivered.append(entry_id)
+                elif at_most_once or attempts >= self.max_retries:
+                    failed.append((entry_id, error))
+                    logging.error("Giving up on notification for reminder ID %d: %s", reminder_id, error, extra={'reminder_id': reminder_id})
+                else:
+                    retries.append((entry_id, now + self.retry_delay * 2 ** attempts, error))
+            if not at_most_once:
+                self.reminder_manager.complete_outbox(delivered, retries, failed, deferrals)
+            OUTBOX_DELIVERED.inc(len(delivered))
+            RATE_LIMITED.inc(len(deferrals))
+            OUTBOX_RETRIES.inc(len(retries))
+            OUTBOX_FAILED.inc(len(failed))
+            if retries:
+                logging.warning("%d outbox notification(s) failed; retrying with backoff", len(retries), extra={'count': len(retries)})
+            return len(entries)
+
+    def _send_entry(self, entry):
+        # Returns None on success, or the error text
+        try:
+            self.send(entry[2])
+            return None
+        except Exception as e:
+            return str(e) or type(e).__name__
+
+    def _send_digests(self, entries, at_most_once):
+        # One digest per channel in the batch. Returns each entry's error (its digest's) and the
+        # {entry_id: seconds} of entries held back by their channel's rate limit.
+        groups = {}
+        for entry in entries:
+            groups.setdefault(entry[5], []).append(entry)
+        deferred, sends = {}, []
+        for channel, group in groups.items():
+            wait = self.coalescer.wait_time(channel)
+            if wait > 0 and not at_most_once:
+                deferred.update((entry[0], wait) for entry in group)
+                continue
+            self.coalescer.take(channel)
+            title, message = self.coalescer.compose([entry[2] for entry in group])
+            sends.append((group, self.executor.submit(self._send_digest, title, message)))
+        errors = {}
+        for group, future in sends:
+            error = future.result()
+            errors.update((entry[0], error) for entry in group)
+        return [errors.get(entry[0]) for entry in entries], deferred
+
+    def _send_digest(self, title, message):
+        try:
+            self.send(message, title=title)
+            return None
+        except Exception as e:
+            return str(e) or type(e).__name__
@@ -0,0 +1,93 @@
+#This file will contain the logging configuration shared by every entry point.
+
+#logging_setup.py:
+# Contains configure_logging(), which installs a QueueHandler on the root logger and a background
+# QueueListener that writes to a rotating log file (JSON lines) and the console.
+# Log calls on the hot path only enqueue a record; file I/O happens on the listener thread.
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and goes into the JSON
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_lock = threading.Lock()
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def _file_handler(log_file, max_bytes, backup_count, when):
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(log_file, when=when, backupCount=backup_count, encoding='utf-8', delay=True)
+    return logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+
+def configure_logging(level=None, log_file='reminder_bot.log', max_bytes=10 * 1024 * 1024, backup_count=5, when=None, file_format=None, console=True):
+    # Sets up logging once per process; later calls are no-ops and return the running listener.
+    # level and file_format ('json' or 'text') default to the REMINDER_BOT_LOG_LEVEL and
+    # REMINDER_BOT_LOG_FORMAT environment variables, then to INFO and json. Passing `when`
+    # (e.g. 'midnight') rotates by time instead of by size.
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+        level = level or os.environ.get('REMINDER_BOT_LOG_LEVEL', 'INFO')
+        file_format = file_format or os.environ.get('REMINDER_BOT_LOG_FORMAT', 'json')
+
+        handlers = []
+        if log_file:
+            file_handler = _file_handler(log_file, max_bytes, backup_count, when)
+            file_handler.setFormatter(JsonFormatter() if file_format == 'json' else logging.Formatter(TEXT_FORMAT))
+            handlers.append(file_handler)
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+            handlers.append(console_handler)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _listener
+
+def shutdown_logging():
+    # Flushes queued records and stops the background writer
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler):
+                root.removeHandler(handler)
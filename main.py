@@ -4,28 +4,47 @@
 # Contains the user interface functions (add_reminder_ui, view_reminders_ui, etc.).
 # Contains the main() function, which initializes the classes and starts the program loop.
 # Manages user interaction and ties everything together.
-
+# Contains the non-interactive subcommands, which open the store and run one operation without starting a
+# scheduler or notifier:
+#   python main.py add "Water the plants" "tomorrow at 9am" [--repeat daily] [--every N] [--until WHEN]
+#   python main.py list [--limit 20] [--search WORDS]
+#   python main.py delete ID [ID ...]
+# They go through the running daemon if there is one (so its scheduler hears about changes at once) and open
+# the database directly otherwise. With no subcommand, the interactive menu starts.
+# A one-shot command should start quickly, so modules only some paths need (the HTTP client, the daemon and
+# asyncio, parsedatetime) are imported where they are used; benchmarks/bench_import_time.py enforces a budget.
+
+import argparse
 import logging
+import os
+import socket
+import sys
 from datetime import datetime
-import parsedatetime
 
 from models import Reminder
-from managers import ReminderManager, Notifier, Scheduler
+from clock import SYSTEM_CLOCK
+from timeparse import TimeParser
+from recurrence import compile_rule, is_frequency
+from logging_setup import configure_logging
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765  # Same as daemon.py's
 
-# Initialize parsedatetime Calendar
-cal = parsedatetime.Calendar()
+# Shared natural-language time parser (fast path for common phrases, parsedatetime otherwise)
+time_parser = TimeParser()
 
-# Configure logging (if not already configured)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("reminder_bot.log"),
-        logging.StreamHandler()
-    ]
-)
+# What the menu treats as "now" when parsing and validating times; tests swap in a SimulatedClock
+clock = SYSTEM_CLOCK
+
+# Number of reminders shown per page in the menus
+PAGE_SIZE = 20
 
 def get_recurrence_info(reminder):
+    if reminder.recurrence and not is_frequency(reminder.recurrence):
+        recurrence_info = f" (Repeats: {reminder.recurrence})"
+        if reminder.recurrence_end:
+            recurrence_info += f", until {datetime.strptime(reminder.recurrence_end, '%Y-%m-%d %H:%M:%S').strftime('%b %d %Y')}"
+        return recurrence_info
     if reminder.recurrence:
         recurrence_info = f" (Repeats every {reminder.recurrence_interval} {reminder.recurrence}"
         if reminder.recurrence_interval > 1:
@@ -37,32 +56,37 @@ def get_recurrence_info(reminder):
     return ""
 
 def get_recurrence_details():
-    recurrence = input("Enter the recurrence pattern ('daily', 'weekly', 'monthly', 'yearly'): ").lower()
-    if recurrence not in ('daily', 'weekly', 'monthly', 'yearly'):
-        print("Invalid recurrence pattern. Setting as one-time reminder.")
+    print("Enter the recurrence pattern: 'daily', 'weekly', 'monthly', 'yearly', or a rule such as")
+    recurrence = input("'every weekday at 9', 'first monday of the month', '30 9 * * 1-5' or 'FREQ=WEEKLY;BYDAY=MO,TH': ").strip()
+    try:
+        compile_rule(recurrence)
+    except ValueError as e:
+        print(f"Invalid recurrence pattern ({e}). Setting as one-time reminder.")
         return None, 1, None
 
-    recurrence_interval_input = input("Enter the interval (e.g., '1' for every day): ")
-    try:
-        recurrence_interval = int(recurrence_interval_input)
-        if recurrence_interval < 1:
+    recurrence_interval = 1
+    if is_frequency(recurrence):
+        recurrence = recurrence.lower()
+        recurrence_interval_input = input("Enter the interval (e.g., '1' for every day): ")
+        try:
+            recurrence_interval = int(recurrence_interval_input)
+            if recurrence_interval < 1:
+                print("Invalid interval. Setting interval to 1.")
+                recurrence_interval = 1
+        except ValueError:
             print("Invalid interval. Setting interval to 1.")
             recurrence_interval = 1
-    except ValueError:
-        print("Invalid interval. Setting interval to 1.")
-        recurrence_interval = 1
 
     recurrence_end_input = input("Enter the end date for recurrence (leave blank for no end date): ")
     if recurrence_end_input.strip() == '':
         recurrence_end = None
     else:
-        end_time_struct, end_parse_status = cal.parse(recurrence_end_input)
-        if end_parse_status == 0:
+        recurrence_end_datetime = time_parser.parse(recurrence_end_input, clock.now())
+        if recurrence_end_datetime is None:
             print("Invalid end date. No end date will be set.")
             recurrence_end = None
         else:
-            recurrence_end_datetime = datetime(*end_time_struct[:6])
-            if recurrence_end_datetime <= datetime.now():
+            if recurrence_end_datetime <= clock.now():
                 print("The recurrence end date is in the past. No end date will be set.")
                 recurrence_end = None
             else:
@@ -74,14 +98,13 @@ def add_reminder_ui(reminder_manager):
     try:
         reminder_text = input("What would you like to be reminded about? ")
         reminder_time = input("When should I remind you? (e.g., 'in 15 minutes', 'tomorrow at 5 pm'): ")
-        time_struct, parse_status = cal.parse(reminder_time)
-        if parse_status == 0:
+        reminder_datetime = time_parser.parse(reminder_time, clock.now())
+        if reminder_datetime is None:
             logging.warning("Failed to parse the reminder time: '%s'", reminder_time)
             print("Sorry, I didn't understand the time you entered.")
             return
         else:
-            reminder_datetime = datetime(*time_struct[:6])
-            if reminder_datetime <= datetime.now():
+            if reminder_datetime <= clock.now():
                 print("The time you entered is in the past. Please enter a future time.")
                 return
 
@@ -101,139 +124,161 @@ def add_reminder_ui(reminder_manager):
             recurrence_interval=recurrence_interval,
             recurrence_end=recurrence_end
         )
-        reminder_manager.add_reminder(reminder)
+        if reminder_manager.add_reminder(reminder) is None:
+            print("An error occurred while adding the reminder.")
+        else:
+            print(f"Reminder set for {reminder_datetime.strftime('%b %d %Y %I:%M %p')}")
     except Exception as e:
         logging.error("Error adding reminder: %s", e)
         print("An error occurred while adding the reminder.")
 
+def format_reminder_line(idx, reminder):
+    formatted_time = reminder.datetime.strftime('%b %d %Y %I:%M %p')
+    recurrence_info = get_recurrence_info(reminder)
+    return f"{idx}. [{formatted_time}] - {reminder.text}{recurrence_info}"
+
 def view_reminders_ui(reminder_manager):
-    reminders = reminder_manager.get_upcoming_reminders()
+    reminders, cursor = reminder_manager.get_upcoming_page(page_size=PAGE_SIZE)
     if not reminders:
         print("You have no upcoming reminders.")
-    else:
-        print("\nHere's your list of upcoming reminders:")
-        for idx, reminder in enumerate(reminders, start=1):
-            formatted_time = reminder.datetime.strftime('%b %d %Y %I:%M %p')
-            recurrence_info = get_recurrence_info(reminder)
-            print(f"{idx}. [{formatted_time}] - {reminder.text}{recurrence_info}")
+        return
+    print("\nHere's your list of upcoming reminders:")
+    idx = 0
+    while True:
+        for idx, reminder in enumerate(reminders, start=idx + 1):
+            print(format_reminder_line(idx, reminder))
+        if cursor is None or input("Press Enter to see more, or type 'q' to return: ").strip().lower() == 'q':
+            return
+        reminders, cursor = reminder_manager.get_upcoming_page(after=cursor, page_size=PAGE_SIZE)
+
+def choose_reminder_ui(reminder_manager, action):
+    # Pages through upcoming reminders (PAGE_SIZE at a time) and returns the selected one, or None.
+    # Raises ValueError on non-numeric input, like the int() prompts it replaces.
+    reminders, cursor = reminder_manager.get_upcoming_page(page_size=PAGE_SIZE)
+    if not reminders:
+        print(f"You have no reminders to {action}.")
+        return None
+
+    print(f"\nSelect a reminder to {action}:")
+    offset = 0
+    while True:
+        for idx, reminder in enumerate(reminders, start=offset + 1):
+            print(format_reminder_line(idx, reminder))
+        prompt = f"Enter the number of the reminder to {action}"
+        if cursor is not None:
+            prompt += " (or 'n' for more)"
+        choice = input(prompt + ": ").strip().lower()
+        if choice == 'n' and cursor is not None:
+            offset += len(reminders)
+            reminders, cursor = reminder_manager.get_upcoming_page(after=cursor, page_size=PAGE_SIZE)
+            continue
+        choice = int(choice)
+        if offset < choice <= offset + len(reminders):
+            return reminders[choice - offset - 1]
+        print("Invalid selection. Please enter a valid number.")
+        return None
 
 def edit_reminder_ui(reminder_manager):
     try:
-        reminders = reminder_manager.get_upcoming_reminders()
-        if not reminders:
-            print("You have no reminders to edit.")
+        selected_reminder = choose_reminder_ui(reminder_manager, 'edit')
+        if selected_reminder is None:
             return
 
-        print("\nSelect a reminder to edit:")
-        for idx, reminder in enumerate(reminders, start=1):
-            formatted_time = reminder.datetime.strftime('%b %d %Y %I:%M %p')
-            recurrence_info = get_recurrence_info(reminder)
-            print(f"{idx}. [{formatted_time}] - {reminder.text}{recurrence_info}")
-
-        choice = int(input("Enter the number of the reminder to edit: "))
-        if 1 <= choice <= len(reminders):
-            selected_reminder = reminders[choice - 1]
-            print("\nWhat would you like to edit?")
-            print("1. Edit reminder text")
-            print("2. Edit reminder time")
-            print("3. Edit both text and time")
-            print("4. Edit recurrence settings")
-            print("5. Edit all (text, time, and recurrence)")
-            edit_choice = input("Enter your choice (1-5): ")
-
-            if edit_choice == '1':
-                # Edit reminder text
-                new_text = input("Enter the new reminder text: ")
-                selected_reminder.text = new_text
-                reminder_manager.update_reminder(selected_reminder)
-                print("Reminder text updated successfully.")
-
-            elif edit_choice == '2':
-                # Edit reminder time
-                new_time_input = input("Enter the new reminder time (e.g., 'in 2 hours'): ")
-                time_struct, parse_status = cal.parse(new_time_input)
-                if parse_status == 0:
-                    print("Sorry, I didn't understand the time you entered.")
-                else:
-                    new_datetime = datetime(*time_struct[:6])
-                    if new_datetime <= datetime.now():
-                        print("The time you entered is in the past. Please enter a future time.")
-                    else:
-                        selected_reminder.datetime = new_datetime
-                        selected_reminder.datetime_str = new_datetime.strftime('%Y-%m-%d %H:%M:%S')
-                        reminder_manager.update_reminder(selected_reminder)
-                        print("Reminder time updated successfully.")
-
-            elif edit_choice == '3':
-                # Edit both text and time
-                new_text = input("Enter the new reminder text: ")
-                new_time_input = input("Enter the new reminder time (e.g., 'tomorrow at 5pm'): ")
-                time_struct, parse_status = cal.parse(new_time_input)
-                if parse_status == 0:
-                    print("Sorry, I didn't understand the time you entered.")
+        print("\nWhat would you like to edit?")
+        print("1. Edit reminder text")
+        print("2. Edit reminder time")
+        print("3. Edit both text and time")
+        print("4. Edit recurrence settings")
+        print("5. Edit all (text, time, and recurrence)")
+        edit_choice = input("Enter your choice (1-5): ")
+
+        if edit_choice == '1':
+            # Edit reminder text
+            new_text = input("Enter the new reminder text: ")
+            selected_reminder.text = new_text
+            reminder_manager.update_reminder(selected_reminder)
+            print("Reminder text updated successfully.")
+
+        elif edit_choice == '2':
+            # Edit reminder time
+            new_time_input = input("Enter the new reminder time (e.g., 'in 2 hours'): ")
+            new_datetime = time_parser.parse(new_time_input, clock.now())
+            if new_datetime is None:
+                print("Sorry, I didn't understand the time you entered.")
+            else:
+                if new_datetime <= clock.now():
+                    print("The time you entered is in the past. Please enter a future time.")
                 else:
-                    new_datetime = datetime(*time_struct[:6])
-                    if new_datetime <= datetime.now():
-                        print("The time you entered is in the past. Please enter a future time.")
-                    else:
-                        selected_reminder.text = new_text
-                        selected_reminder.datetime = new_datetime
-                        selected_reminder.datetime_str = new_datetime.strftime('%Y-%m-%d %H:%M:%S')
-                        reminder_manager.update_reminder(selected_reminder)
-                        print("Reminder text and time updated successfully.")
-
-            elif edit_choice == '4':
-                # Edit recurrence settings
-                recurrence_choice = input("Do you want this reminder to recur? (y/n): ").lower()
-                if recurrence_choice == 'y':
-                    recurrence, recurrence_interval, recurrence_end = get_recurrence_details()
-                    selected_reminder.recurrence = recurrence
-                    selected_reminder.recurrence_interval = recurrence_interval
-                    selected_reminder.recurrence_end = recurrence_end
+                    selected_reminder.datetime = new_datetime
+                    selected_reminder.datetime_str = new_datetime.strftime('%Y-%m-%d %H:%M:%S')
+                    reminder_manager.update_reminder(selected_reminder)
+                    print("Reminder time updated successfully.")
+
+        elif edit_choice == '3':
+            # Edit both text and time
+            new_text = input("Enter the new reminder text: ")
+            new_time_input = input("Enter the new reminder time (e.g., 'tomorrow at 5pm'): ")
+            new_datetime = time_parser.parse(new_time_input, clock.now())
+            if new_datetime is None:
+                print("Sorry, I didn't understand the time you entered.")
+            else:
+                if new_datetime <= clock.now():
+                    print("The time you entered is in the past. Please enter a future time.")
                 else:
-                    # Remove recurrence
-                    selected_reminder.recurrence = None
-                    selected_reminder.recurrence_interval = 1
-                    selected_reminder.recurrence_end = None
-                reminder_manager.update_reminder(selected_reminder)
-                print("Recurrence settings updated successfully.")
-
-            elif edit_choice == '5':
-                # Edit all (text, time, and recurrence)
-                new_text = input("Enter the new reminder text: ")
-                new_time_input = input("Enter the new reminder time (e.g., 'tomorrow at 5pm'): ")
-                time_struct, parse_status = cal.parse(new_time_input)
-                if parse_status == 0:
-                    print("Sorry, I didn't understand the time you entered.")
+                    selected_reminder.text = new_text
+                    selected_reminder.datetime = new_datetime
+                    selected_reminder.datetime_str = new_datetime.strftime('%Y-%m-%d %H:%M:%S')
+                    reminder_manager.update_reminder(selected_reminder)
+                    print("Reminder text and time updated successfully.")
+
+        elif edit_choice == '4':
+            # Edit recurrence settings
+            recurrence_choice = input("Do you want this reminder to recur? (y/n): ").lower()
+            if recurrence_choice == 'y':
+                recurrence, recurrence_interval, recurrence_end = get_recurrence_details()
+                selected_reminder.recurrence = recurrence
+                selected_reminder.recurrence_interval = recurrence_interval
+                selected_reminder.recurrence_end = recurrence_end
+            else:
+                # Remove recurrence
+                selected_reminder.recurrence = None
+                selected_reminder.recurrence_interval = 1
+                selected_reminder.recurrence_end = None
+            reminder_manager.update_reminder(selected_reminder)
+            print("Recurrence settings updated successfully.")
+
+        elif edit_choice == '5':
+            # Edit all (text, time, and recurrence)
+            new_text = input("Enter the new reminder text: ")
+            new_time_input = input("Enter the new reminder time (e.g., 'tomorrow at 5pm'): ")
+            new_datetime = time_parser.parse(new_time_input, clock.now())
+            if new_datetime is None:
+                print("Sorry, I didn't understand the time you entered.")
+                return
+            else:
+                if new_datetime <= clock.now():
+                    print("The time you entered is in the past. Please enter a future time.")
                     return
-                else:
-                    new_datetime = datetime(*time_struct[:6])
-                    if new_datetime <= datetime.now():
-                        print("The time you entered is in the past. Please enter a future time.")
-                        return
-                # Edit recurrence settings
-                recurrence_choice = input("Do you want this reminder to recur? (y/n): ").lower()
-                if recurrence_choice == 'y':
-                    recurrence, recurrence_interval, recurrence_end = get_recurrence_details()
-                    selected_reminder.recurrence = recurrence
-                    selected_reminder.recurrence_interval = recurrence_interval
-                    selected_reminder.recurrence_end = recurrence_end
-                else:
-                    selected_reminder.recurrence = None
-                    selected_reminder.recurrence_interval = 1
-                    selected_reminder.recurrence_end = None
-
-                selected_reminder.text = new_text
-                selected_reminder.datetime = new_datetime
-                selected_reminder.datetime_str = new_datetime.strftime('%Y-%m-%d %H:%M:%S')
-                reminder_manager.update_reminder(selected_reminder)
-                print("Reminder updated successfully.")
-
+            # Edit recurrence settings
+            recurrence_choice = input("Do you want this reminder to recur? (y/n): ").lower()
+            if recurrence_choice == 'y':
+                recurrence, recurrence_interval, recurrence_end = get_recurrence_details()
+                selected_reminder.recurrence = recurrence
+                selected_reminder.recurrence_interval = recurrence_interval
+                selected_reminder.recurrence_end = recurrence_end
             else:
-                print("Invalid choice. Returning to the main menu.")
+                selected_reminder.recurrence = None
+                selected_reminder.recurrence_interval = 1
+                selected_reminder.recurrence_end = None
+
+            selected_reminder.text = new_text
+            selected_reminder.datetime = new_datetime
+            selected_reminder.datetime_str = new_datetime.strftime('%Y-%m-%d %H:%M:%S')
+            reminder_manager.update_reminder(selected_reminder)
+            print("Reminder updated successfully.")
 
         else:
-            print("Invalid selection. Please enter a valid number.")
+            print("Invalid choice. Returning to the main menu.")
 
     except ValueError:
         print("Invalid input. Please enter a number.")
@@ -242,37 +287,175 @@ def edit_reminder_ui(reminder_manager):
         print("An error occurred while editing the reminder.")
 
 def delete_reminder_ui(reminder_manager):
-    reminders = reminder_manager.get_upcoming_reminders()
-    if not reminders:
-        print("You have no reminders to delete.")
-        return
-
-    print("\nSelect a reminder to delete:")
-    for idx, reminder in enumerate(reminders, start=1):
-        formatted_time = reminder.datetime.strftime('%b %d %Y %I:%M %p')
-        recurrence_info = get_recurrence_info(reminder)
-        print(f"{idx}. [{formatted_time}] - {reminder.text}{recurrence_info}")
-
     try:
-        choice = int(input("Enter the number of the reminder to delete: "))
-        if 1 <= choice <= len(reminders):
-            selected_reminder = reminders[choice - 1]
-            confirm = input(f"Are you sure you want to delete reminder '{selected_reminder.text}'? (y/n): ").lower()
-            if confirm == 'y':
-                reminder_manager.delete_reminder(selected_reminder.id)
-                print("Reminder deleted successfully.")
-            else:
-                print("Deletion cancelled.")
+        selected_reminder = choose_reminder_ui(reminder_manager, 'delete')
+        if selected_reminder is None:
+            return
+        confirm = input(f"Are you sure you want to delete reminder '{selected_reminder.text}'? (y/n): ").lower()
+        if confirm == 'y':
+            reminder_manager.delete_reminder(selected_reminder.id)
+            print("Reminder deleted successfully.")
         else:
-            print("Invalid selection. Please enter a valid number.")
+            print("Deletion cancelled.")
     except ValueError:
         print("Invalid input. Please enter a number.")
 
-def main():
-    reminder_manager = ReminderManager('reminders.db')
-    notifier = Notifier()
-    scheduler = Scheduler(reminder_manager, notifier)
-    scheduler.start()
+def search_reminders_ui(reminder_manager):
+    query = input("Search for: ").strip()
+    if not query:
+        return
+    results = reminder_manager.search_reminders(query, limit=PAGE_SIZE)
+    if not results:
+        print(f"No reminders match '{query}'.")
+        return
+    print(f"\nReminders matching '{query}':")
+    for idx, reminder in enumerate(results, start=1):
+        print(format_reminder_line(idx, reminder))
+
+def history_ui(reminder_manager):
+    history = reminder_manager.get_history(limit=PAGE_SIZE)
+    if not history:
+        print("No reminders have fired yet.")
+        return
+    print("\nRecently fired reminders:")
+    for idx, (reminder, archived_at, reason) in enumerate(history, start=1):
+        note = {'expired': " (recurrence ended)", 'missed': " (missed, not sent)"}.get(reason, "")
+        print(f"{format_reminder_line(idx, reminder)}{note}")
+
+def daemon_listening(port, host=DEFAULT_HOST, timeout=0.2):
+    # A bare connect is much cheaper than importing the HTTP client just to find nobody is there
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+def open_store(database, port):
+    # The running daemon's API if it answers, otherwise the database itself (no scheduler, no notifier)
+    if daemon_listening(port):
+        from client import ReminderClient
+        client = ReminderClient(DEFAULT_HOST, port)
+        if client.ping():
+            return client
+        client.close()
+    from managers import ReminderManager
+    return ReminderManager(database)
+
+def parse_future_time(text):
+    # The datetime a phrase means, or raises ValueError if it doesn't parse or isn't in the future
+    when = time_parser.parse(text, clock.now())
+    if when is None:
+        raise ValueError(f"didn't understand the time '{text}'")
+    if when <= clock.now():
+        raise ValueError(f"'{text}' is in the past")
+    return when
+
+def add_command(store, args):
+    when = parse_future_time(args.when)
+    recurrence, recurrence_end = args.repeat, None
+    if recurrence:
+        compile_rule(recurrence, args.every)
+        if is_frequency(recurrence):
+            recurrence = recurrence.lower()
+    if args.until:
+        if not recurrence:
+            raise ValueError("--until needs --repeat")
+        recurrence_end = parse_future_time(args.until).strftime('%Y-%m-%d %H:%M:%S')
+    reminder = Reminder(None, args.text, when.strftime('%Y-%m-%d %H:%M:%S'), recurrence, args.every, recurrence_end)
+    if store.add_reminder(reminder) is None:
+        raise ValueError("the reminder could not be saved")
+    print(f"Reminder {reminder.id} set for {when.strftime('%b %d %Y %I:%M %p')}{get_recurrence_info(reminder)}")
+
+def list_command(store, args):
+    if args.search:
+        reminders = store.search_reminders(args.search, limit=args.limit)
+    else:
+        reminders, _ = store.get_upcoming_page(page_size=args.limit)
+    for reminder in reminders:
+        print(f"{reminder.id:>6}  [{reminder.datetime.strftime('%b %d %Y %I:%M %p')}] - {reminder.text}{get_recurrence_info(reminder)}")
+    if not reminders:
+        print("No matching reminders." if args.search else "You have no upcoming reminders.")
+
+def delete_command(store, args):
+    missing = [reminder_id for reminder_id in args.ids if not store.delete_reminder(reminder_id)]
+    for reminder_id in args.ids:
+        if reminder_id not in missing:
+            print(f"Deleted reminder {reminder_id}.")
+    if missing:
+        raise ValueError(f"no reminder with ID {', '.join(map(str, missing))}")
+
+def compact_command(store, args):
+    if not hasattr(store, 'enable_incremental_vacuum'):
+        raise ValueError("the reminder daemon is running; stop it first, compacting needs the database to itself")
+    if store.enable_incremental_vacuum():
+        print("Database rebuilt; purged history now shrinks the file.")
+    else:
+        print("Nothing to do: purged history already shrinks the file.")
+
+COMMANDS = {'add': add_command, 'list': list_command, 'delete': delete_command, 'compact': compact_command}
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Reminder bot. Without a command, starts the interactive menu.")
+    parser.add_argument('--db', default='reminders.db', help="database file used when no daemon is running")
+    commands = parser.add_subparsers(dest='command')
+    add = commands.add_parser('add', help="add a reminder")
+    add.add_argument('text')
+    add.add_argument('when', help="e.g. 'in 15 minutes', 'tomorrow at 5 pm', '2024-12-24 18:00'")
+    add.add_argument('--repeat', help="daily, weekly, monthly, yearly, or a rule such as 'every weekday at 9'")
+    add.add_argument('--every', type=int, default=1, help="interval for daily/weekly/monthly/yearly (default 1)")
+    add.add_argument('--until', help="when the recurrence ends")
+    show = commands.add_parser('list', help="list upcoming reminders")
+    show.add_argument('--limit', type=int, default=PAGE_SIZE)
+    show.add_argument('--search', help="only reminders matching these words")
+    delete = commands.add_parser('delete', help="delete reminders by ID")
+    delete.add_argument('ids', type=int, nargs='+', metavar='ID')
+    commands.add_parser('compact', help="rebuild a database created by an older version so purged history shrinks the file "
+                                        "(one-off; rewrites the whole file, with the daemon stopped)")
+    return parser
+
+def run_command(args):
+    # Runs one subcommand; returns the process exit status
+    configure_logging(console=False)
+    store = open_store(args.db, int(os.environ.get('REMINDER_BOT_API_PORT', DEFAULT_PORT)))
+    try:
+        COMMANDS[args.command](store, args)
+        return 0
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command is not None:
+        return run_command(args)
+
+    from client import ReminderClient
+    from metrics import start_metrics_server
+
+    configure_logging()
+
+    # Set REMINDER_BOT_METRICS_PORT to serve Prometheus metrics on localhost
+    metrics_port = os.environ.get('REMINDER_BOT_METRICS_PORT')
+    if metrics_port:
+        start_metrics_server(int(metrics_port))
+
+    # The menu is a client of the daemon's API. If no daemon is running, host one in this process
+    # (on a free port) for as long as the menu is open.
+    port = int(os.environ.get('REMINDER_BOT_API_PORT', DEFAULT_PORT))
+    daemon = None
+    reminder_manager = ReminderClient(DEFAULT_HOST, port)
+    if not reminder_manager.ping():
+        from daemon import open_daemon
+
+        reminder_manager.close()
+        # Digests are opt-in: a window holds every notification back at least that long
+        digest_window = float(os.environ.get('REMINDER_BOT_DIGEST_WINDOW', 0))
+        daemon = open_daemon(args.db, DEFAULT_HOST, 0, digest_window=digest_window).start()
+        reminder_manager = ReminderClient(DEFAULT_HOST, daemon.port)
+    else:
+        logging.info("Connected to the reminder daemon on port %d", port)
 
     try:
         while True:
@@ -281,8 +464,10 @@ def main():
             print("2. View upcoming reminders")
             print("3. Edit a reminder")
             print("4. Delete a reminder")
-            print("5. Exit")
-            choice = input("Enter your choice (1-5): ")
+            print("5. Search reminders")
+            print("6. View reminder history")
+            print("7. Exit")
+            choice = input("Enter your choice (1-7): ")
 
             if choice == '1':
                 add_reminder_ui(reminder_manager)
@@ -293,6 +478,10 @@ def main():
             elif choice == '4':
                 delete_reminder_ui(reminder_manager)
             elif choice == '5':
+                search_reminders_ui(reminder_manager)
+            elif choice == '6':
+                history_ui(reminder_manager)
+            elif choice == '7':
                 logging.info("User chose to exit the program.")
                 print("Goodbye!")
                 break
@@ -307,7 +496,9 @@ def main():
         print("An unexpected error occurred. Exiting the program.")
     finally:
         reminder_manager.close()
+        if daemon is not None:
+            daemon.stop()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
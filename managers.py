@@ -5,206 +5,1121 @@
 # Represents the data model for reminders.
 
 
-import sqlite3
+import os
+import re
+import socket
 import threading
-import time
-import schedule
+import uuid
+import heapq
+from itertools import chain, starmap
 import logging
-from datetime import datetime, timedelta
-from win10toast import ToastNotifier
+from datetime import datetime
 from models import Reminder
+from clock import SYSTEM_CLOCK
+from database import ConnectionPool, SnapshotPool, WriteBuffer
+from recurrence import compile_rule, parse_recurrence_end
+from delivery import DeliveryQueue, OutboxRelay, default_backends
+from metrics import REGISTRY, SIZE_BUCKETS, timed
 
-# Configure logging (if not already configured)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("reminder_bot.log"),
-        logging.StreamHandler()
-    ]
-)
-
-# Helper functions for date calculations
-def add_months(sourcedate, months):
-    month = sourcedate.month - 1 + months
-    year = sourcedate.year + month // 12
-    month = month % 12 + 1
-    day = min(
-        sourcedate.day,
-        [
-            31,
-            29 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 28,
-            31,
-            30,
-            31,
-            30,
-            31,
-            31,
-            30,
-            31,
-            30,
-            31
-        ][month - 1]
+# Metrics (see metrics.py)
+DB_QUERY_SECONDS = REGISTRY.histogram('reminder_db_query_seconds', 'Duration of ReminderManager database calls.')
+FIRE_LAG_SECONDS = REGISTRY.histogram('reminder_fire_lag_seconds', 'Delay between a reminder\'s scheduled time and its notification being queued.')
+CHECK_DURATION_SECONDS = REGISTRY.histogram('scheduler_check_duration_seconds', 'Duration of Scheduler.check_reminders passes.')
+BATCH_SIZE = REGISTRY.histogram('scheduler_batch_size', 'Number of due reminders handled per batch.', buckets=SIZE_BUCKETS)
+WRITE_BATCH_SIZE = REGISTRY.histogram('reminder_write_batch_size', 'Number of buffered reminders committed per group-commit transaction.', buckets=SIZE_BUCKETS)
+REMINDERS_FIRED = REGISTRY.counter('reminders_fired_total', 'Notifications queued for due reminders.')
+
+def to_epoch(value):
+    # Naive local datetimes are stored as integer Unix timestamps in the fire_at column
+    return int(value.timestamp())
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+def migrate_base_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS reminders (
+        id INTEGER PRIMARY KEY,
+        text TEXT NOT NULL,
+        datetime TEXT NOT NULL,
+        recurrence TEXT DEFAULT NULL,
+        recurrence_interval INTEGER DEFAULT 1,
+        recurrence_end TEXT DEFAULT NULL
+    )
+    ''')
+    # Databases created before recurrence support lack these columns
+    cursor.execute('PRAGMA table_info(reminders)')
+    columns = {row[1] for row in cursor.fetchall()}
+    for name, definition in (
+        ('recurrence', 'TEXT DEFAULT NULL'),
+        ('recurrence_interval', 'INTEGER DEFAULT 1'),
+        ('recurrence_end', 'TEXT DEFAULT NULL')
+    ):
+        if name not in columns:
+            cursor.execute(f'ALTER TABLE reminders ADD COLUMN {name} {definition}')
+
+def migrate_fire_at_column(cursor):
+    cursor.execute('ALTER TABLE reminders ADD COLUMN fire_at INTEGER')
+    cursor.execute("UPDATE reminders SET fire_at = CAST(strftime('%s', datetime, 'utc') AS INTEGER)")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reminders_fire_at ON reminders (fire_at, id)')
+
+def migrate_misfire_policy_column(cursor):
+    cursor.execute("ALTER TABLE reminders ADD COLUMN misfire_policy TEXT DEFAULT 'once'")
+
+def migrate_claim_columns(cursor):
+    # A scheduler worker claims due rows by writing its owner id and a lease expiry (epoch seconds)
+    cursor.execute('ALTER TABLE reminders ADD COLUMN claim_owner TEXT DEFAULT NULL')
+    cursor.execute('ALTER TABLE reminders ADD COLUMN lease_expires INTEGER DEFAULT NULL')
+
+def migrate_search_index(cursor):
+    # External-content FTS5 index over reminder text. Deletes and text edits are mirrored by triggers, so
+    # every write path (including the scheduler's batch deletes) keeps it in sync. Inserts are indexed by
+    # ReminderManager itself: a per-row insert trigger makes bulk imports about five times slower than
+    # one INSERT ... SELECT per batch. prefix='1 2 3' keeps short prefix queries like "d*" index lookups.
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS reminders_fts USING fts5(
+        text, content='reminders', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
     )
-    return datetime(year, month, day, sourcedate.hour, sourcedate.minute, sourcedate.second)
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS reminders_fts_delete AFTER DELETE ON reminders BEGIN
+        INSERT INTO reminders_fts (reminders_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS reminders_fts_update AFTER UPDATE OF text ON reminders BEGIN
+        INSERT INTO reminders_fts (reminders_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO reminders_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    ''')
+    cursor.execute("INSERT INTO reminders_fts (reminders_fts) VALUES ('rebuild')")
+
+def migrate_outbox_table(cursor):
+    # Notifications for fired reminders, written in the same transaction that reschedules or deletes the
+    # reminder and removed once delivered (see OutboxRelay). next_attempt is NULL once retries are exhausted.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        reminder_id INTEGER NOT NULL,
+        message TEXT NOT NULL,
+        fire_at INTEGER NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL,
+        last_error TEXT,
+        claim_owner TEXT,
+        lease_expires REAL
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt ON outbox (next_attempt)')
+
+def migrate_history_catalog(cursor):
+    # Fired and expired reminders move to one history table per month of archiving (history_YYYYMM, see
+    # create_history_partition), listed here, so the live table only holds pending work and retention
+    # drops whole months instead of deleting row by row
+    cursor.execute('CREATE TABLE IF NOT EXISTS history_partitions (month INTEGER PRIMARY KEY)')
+
+def migrate_tenant_column(cursor):
+    # Owning user/tenant of each reminder (NULL in a single-user store); history partitions keep it too
+    cursor.execute('ALTER TABLE reminders ADD COLUMN tenant TEXT DEFAULT NULL')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reminders_tenant ON reminders (tenant, fire_at, id)')
+    cursor.execute('SELECT month FROM history_partitions')
+    for (month,) in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {history_table(month)} ADD COLUMN tenant TEXT DEFAULT NULL')
+
+def migrate_outbox_channel(cursor):
+    # Channel (the reminder's tenant) each notification goes to, so the relay can coalesce them per channel
+    cursor.execute('ALTER TABLE outbox ADD COLUMN channel TEXT DEFAULT NULL')
+
+def migrate_anchor_column(cursor):
+    # Fire time (epoch) a recurrence counts from. The scheduler sets it to the first occurrence when it first
+    # moves fire_at on, so month-end and leap-day anchors survive shorter months; NULL means fire_at.
+    cursor.execute('ALTER TABLE reminders ADD COLUMN anchor_at INTEGER DEFAULT NULL')
+
+MIGRATIONS = [
+    (1, migrate_base_table),
+    (2, migrate_fire_at_column),
+    (3, migrate_misfire_policy_column),
+    (4, migrate_claim_columns),
+    (5, migrate_search_index),
+    (6, migrate_outbox_table),
+    (7, migrate_history_catalog),
+    (8, migrate_tenant_column),
+    (9, migrate_outbox_channel),
+    (10, migrate_anchor_column)
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
 
-def add_years(sourcedate, years):
-    try:
-        return sourcedate.replace(year=sourcedate.year + years)
-    except ValueError:
-        # Handle February 29 for leap years
-        return sourcedate.replace(month=2, day=28, year=sourcedate.year + years)
+def history_month(epoch):
+    # Partition key for an archive time: 202405 for May 2024 (local time)
+    return int(datetime.fromtimestamp(epoch).strftime('%Y%m'))
+
+def history_table(month):
+    return f'history_{int(month)}'
+
+def create_history_partition(cursor, month):
+    table = history_table(month)
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {table} (
+        reminder_id INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        datetime TEXT NOT NULL,
+        recurrence TEXT,
+        recurrence_interval INTEGER,
+        recurrence_end TEXT,
+        misfire_policy TEXT,
+        fire_at INTEGER NOT NULL,
+        archived_at INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        tenant TEXT DEFAULT NULL
+    )
+    ''')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_archived_at ON {table} (archived_at)')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_reminder_id ON {table} (reminder_id)')
+    cursor.execute('INSERT OR IGNORE INTO history_partitions (month) VALUES (?)', (month,))
+    return table
+
+# Same order as the Reminder constructor's positional arguments, so rows map straight onto it
+REMINDER_COLUMNS = 'id, text, datetime, recurrence, recurrence_interval, recurrence_end, misfire_policy, fire_at, tenant'
+# What the scheduler reads for due reminders: the recurrence anchor as well (the Reminder's last argument)
+DUE_COLUMNS = REMINDER_COLUMNS + ', anchor_at'
+HISTORY_COLUMNS = 'reminder_id, text, datetime, recurrence, recurrence_interval, recurrence_end, misfire_policy, fire_at, tenant, archived_at, reason'
+
+# Rows per INSERT statement in add_reminders_bulk. Binding 100 rows to one multi-row statement costs about a
+# third less than stepping an executemany once per row, and 100 x 8 columns stays under SQLite's old
+# 999-parameter limit.
+BULK_INSERT_ROWS = 100
+
+# Words in a search query; each becomes a quoted FTS5 prefix term, so user input can't inject query syntax
+SEARCH_TERM = re.compile(r'\w+')
+
+def build_search_query(text):
+    # 'pay ele' -> '"pay" "ele"*': every word must match, the last one as a prefix (search-as-you-type).
+    # Returns None if there are no words.
+    terms = SEARCH_TERM.findall(text)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms[:-1]) + (' ' if len(terms) > 1 else '') + f'"{terms[-1]}"*'
+
+DURABILITY_MODES = ('sync', 'group')
+STORAGE_MODES = ('file', 'memory')
 
 class ReminderManager:
-    def __init__(self, database):
-        self.conn = sqlite3.connect(database, check_same_thread=False)
-        self.cursor = self.conn.cursor()
+    def __init__(self, database, durability='sync', group_commit_records=500, group_commit_ms=10, history=True, history_retention_days=None, clock=None,
+                 storage='file', snapshot_interval=30.0, snapshot_changes=1000):
+        # Writes go through the pool's single writer connection; reads use per-thread connections.
+        # durability='sync' commits every add_reminder on its own. durability='group' sends inserts through a
+        # WriteBuffer that commits up to group_commit_records reminders per transaction: concurrent add_reminder
+        # calls share commits and each returns once its row is durable, while submit_reminder returns a Future
+        # at once and its row is committed within group_commit_ms.
+        # With history=True, reminders the scheduler removes (fired once, or past their recurrence end) are
+        # archived to monthly history tables; purge_history drops those older than history_retention_days
+        # (None keeps them forever).
+        # clock (default: the system clock, see clock.py) decides what "now" is for due and upcoming queries.
+        # storage='memory' serves everything from an in-memory copy of the database file, persisted by a change
+        # log and by snapshots every snapshot_interval seconds or snapshot_changes transactions (see SnapshotPool).
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: '{durability}'")
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: '{storage}'")
+        if storage == 'memory':
+            self.pool = SnapshotPool(database, snapshot_interval, snapshot_changes)
+        else:
+            self.pool = ConnectionPool(database)
+        self.listeners = []
+        self.durability = durability
+        self.history = history
+        self.history_retention_days = history_retention_days
+        self.clock = clock or SYSTEM_CLOCK
         self.create_table()
+        self.write_buffer = None
+        if durability == 'group':
+            self.write_buffer = WriteBuffer(self._flush_buffered, group_commit_records, group_commit_ms / 1000).start()
     
     def create_table(self):
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reminders (
-            id INTEGER PRIMARY KEY,
-            text TEXT NOT NULL,
-            datetime TEXT NOT NULL,
-            recurrence TEXT DEFAULT NULL,
-            recurrence_interval INTEGER DEFAULT 1,
-            recurrence_end TEXT DEFAULT NULL
-        )
-        ''')
-        self.conn.commit()
+        # Brings the database up to SCHEMA_VERSION, applying each pending migration in its own transaction
+        with self.pool.read() as cursor:
+            cursor.execute('PRAGMA user_version')
+            version = cursor.fetchone()[0]
+        for target_version, migration in MIGRATIONS:
+            if version >= target_version:
+                continue
+            try:
+                with self.pool.write() as cursor:
+                    cursor.execute('BEGIN')
+                    migration(cursor)
+                    cursor.execute(f'PRAGMA user_version = {target_version}')
+            except Exception:
+                logging.error("Database migration to version %d failed.", target_version)
+                raise
+            logging.info("Database migrated to schema version %d.", target_version)
+            version = target_version
         logging.info("Database connected and table ensured.")
     
+    def incremental_vacuum_enabled(self):
+        # Asks the writer: read connections keep the mode the file had when they opened it
+        with self.pool.write_lock:
+            return self.pool.writer.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    
+    def enable_incremental_vacuum(self):
+        # Lets purge_history hand freed pages back to the filesystem a few at a time. New databases have it
+        # from the start; one created before that needs this once (main.py compact). auto_vacuum only takes
+        # effect after a VACUUM, which rewrites the whole file under an exclusive lock, so it is never run
+        # implicitly. Returns True if the file was rebuilt.
+        if self.incremental_vacuum_enabled():
+            return False
+        with self.pool.write() as cursor:
+            cursor.executescript('PRAGMA auto_vacuum = INCREMENTAL; VACUUM')
+        logging.info("Enabled incremental vacuum.")
+        return True
+    
+    def add_listener(self, listener):
+        # Listeners are called as listener(event, reminder_id, fire_time) after every write
+        self.listeners.append(listener)
+    
+    def _notify_listeners(self, event, reminder_id, fire_time=None):
+        for listener in self.listeners:
+            try:
+                listener(event, reminder_id, fire_time)
+            except Exception as e:
+                logging.error("Error in reminder listener: %s", e)
+    
+    def _insert_reminder(self, cursor, reminder):
+        cursor.execute('''
+        INSERT INTO reminders (text, datetime, fire_at, recurrence, recurrence_interval, recurrence_end, misfire_policy, tenant)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (reminder.text, reminder.datetime_str, reminder.fire_at, reminder.recurrence, reminder.recurrence_interval, reminder.recurrence_end, reminder.misfire_policy, reminder.tenant))
+        reminder.id = cursor.lastrowid
+        cursor.execute('INSERT INTO reminders_fts (rowid, text) VALUES (?, ?)', (reminder.id, reminder.text))
+    
+    @timed(DB_QUERY_SECONDS, operation='add_reminder')
     def add_reminder(self, reminder):
+        # Returns the new id (also stored on the reminder), or None if the insert failed
+        if self.write_buffer is not None:
+            # The caller waits for the commit anyway, so don't hold the batch open: adds from other threads
+            # that arrive while a commit is in progress share the next one
+            try:
+                return self.write_buffer.submit(reminder, urgent=True).result()
+            except Exception as e:
+                logging.error("Error adding reminder: %s", e)
+                return None
         try:
-            self.cursor.execute('''
-            INSERT INTO reminders (text, datetime, recurrence, recurrence_interval, recurrence_end)
-            VALUES (?, ?, ?, ?, ?)
-            ''', (reminder.text, reminder.datetime_str, reminder.recurrence, reminder.recurrence_interval, reminder.recurrence_end))
-            self.conn.commit()
-            logging.info("Added reminder: '%s' at %s", reminder.text, reminder.datetime)
-            print(f"Reminder set for {reminder.datetime.strftime('%b %d %Y %I:%M %p')}")
+            with self.pool.write() as cursor:
+                self._insert_reminder(cursor, reminder)
+            logging.info("Added reminder: '%s' at %s", reminder.text, reminder.datetime, extra={'reminder_id': reminder.id})
+            self._notify_listeners('added', reminder.id, reminder.datetime)
+            return reminder.id
         except Exception as e:
             logging.error("Error adding reminder: %s", e)
-            print("An error occurred while adding the reminder.")
+            return None
+    
+    def submit_reminder(self, reminder):
+        # Group-commit mode only: queues the insert and returns a Future for the new id, set once the batch
+        # holding it is committed. The reminder is invisible to readers (and the scheduler) until then, so one
+        # that is already due, or falls due within the flush delay, makes the buffer commit immediately.
+        if self.write_buffer is None:
+            raise RuntimeError("submit_reminder needs durability='group'")
+        urgent = reminder.fire_at <= self.clock.time() + self.write_buffer.max_delay
+        return self.write_buffer.submit(reminder, urgent)
     
-    def get_due_reminders(self):
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        self.cursor.execute('SELECT * FROM reminders WHERE datetime <= ?', (now,))
-        reminders = self.cursor.fetchall()
-        return [self._create_reminder_from_row(row) for row in reminders]
+    def flush(self):
+        # Commits every buffered reminder now (no-op in sync mode)
+        if self.write_buffer is not None:
+            self.write_buffer.flush()
     
+    @timed(DB_QUERY_SECONDS, operation='flush_write_buffer')
+    def _flush_buffered(self, reminders):
+        # Called by the WriteBuffer thread: the whole batch goes in one transaction, so one commit covers them all
+        try:
+            with self.pool.write() as cursor:
+                cursor.execute('BEGIN IMMEDIATE')
+                for reminder in reminders:
+                    self._insert_reminder(cursor, reminder)
+        except Exception:
+            for reminder in reminders:
+                reminder.id = None  # rolled back
+            raise
+        WRITE_BATCH_SIZE.observe(len(reminders))
+        logging.info("Group commit of %d reminders", len(reminders), extra={'count': len(reminders)})
+        for reminder in reminders:
+            self._notify_listeners('added', reminder.id, reminder.datetime)
+        return [reminder.id for reminder in reminders]
+    
+    @timed(DB_QUERY_SECONDS, operation='add_reminders_bulk')
+    def add_reminders_bulk(self, rows, tenant=None):
+        # rows are (text, datetime_str, fire_at, recurrence, recurrence_interval, recurrence_end, misfire_policy)
+        # tuples, inserted with one executemany in a single transaction, all owned by `tenant`. Returns the new ids.
+        columns = 'text, datetime, fire_at, recurrence, recurrence_interval, recurrence_end, misfire_policy'
+        values = rows
+        if tenant is not None:
+            columns += ', tenant'
+            values = [row + (tenant,) for row in rows]
+        placeholders = '(' + ', '.join('?' * len(columns.split(', '))) + ')'
+        whole = len(values) - len(values) % BULK_INSERT_ROWS
+        with self.pool.write() as cursor:
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM reminders')
+            first_id = cursor.fetchone()[0] + 1
+            if whole:
+                cursor.executemany(
+                    f"INSERT INTO reminders ({columns}) VALUES {', '.join([placeholders] * BULK_INSERT_ROWS)}",
+                    [tuple(chain.from_iterable(values[i:i + BULK_INSERT_ROWS])) for i in range(0, whole, BULK_INSERT_ROWS)]
+                )
+            if whole < len(values):
+                cursor.execute(
+                    f"INSERT INTO reminders ({columns}) VALUES {', '.join([placeholders] * (len(values) - whole))}",
+                    tuple(chain.from_iterable(values[whole:]))
+                )
+            count = len(values)
+            cursor.execute(
+                'INSERT INTO reminders_fts (rowid, text) SELECT id, text FROM reminders WHERE id >= ? AND id < ?',
+                (first_id, first_id + count)
+            )
+        # Rowids are max(id) + 1 for each insert, and the writer lock keeps the batch contiguous
+        ids = range(first_id, first_id + count)
+        logging.info("Bulk inserted %d reminders", count, extra={'count': count})
+        if self.listeners:
+            for reminder_id, row in zip(ids, rows):
+                self._notify_listeners('added', reminder_id, datetime.fromtimestamp(row[2]))
+        return ids
+    
+    def iter_rows(self, batch_size=1000):
+        # Streams every stored reminder as a raw row (REMINDER_COLUMNS order) in id order
+        with self.pool.read() as cursor:
+            cursor.execute(f'SELECT {REMINDER_COLUMNS} FROM reminders ORDER BY id')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+    
+    @timed(DB_QUERY_SECONDS, operation='get_due_reminders')
+    def get_due_reminders(self, limit=None):
+        now = to_epoch(self.clock.now())
+        query = f'SELECT {DUE_COLUMNS} FROM reminders WHERE fire_at <= ? ORDER BY fire_at, id'
+        if limit is not None:
+            query += f' LIMIT {int(limit)}'
+        with self.pool.read() as cursor:
+            cursor.execute(query, (now,))
+            reminders = cursor.fetchall()
+        return self._create_reminders_from_rows(reminders)
+    
+    @timed(DB_QUERY_SECONDS, operation='update_reminder')
     def update_reminder(self, reminder):
         try:
-            self.cursor.execute('''
-            UPDATE reminders
-            SET text = ?, datetime = ?, recurrence = ?, recurrence_interval = ?, recurrence_end = ?
-            WHERE id = ?
-            ''', (reminder.text, reminder.datetime_str, reminder.recurrence, reminder.recurrence_interval, reminder.recurrence_end, reminder.id))
-            self.conn.commit()
-            logging.info("Updated reminder ID %d", reminder.id)
+            with self.pool.write() as cursor:
+                cursor.execute('BEGIN IMMEDIATE')  # see process_due_batch
+                cursor.execute('''
+                UPDATE reminders
+                SET text = ?, datetime = ?, fire_at = ?, recurrence = ?, recurrence_interval = ?, recurrence_end = ?, misfire_policy = ?,
+                    anchor_at = NULL, claim_owner = NULL, lease_expires = NULL
+                WHERE id = ?
+                ''', (reminder.text, reminder.datetime_str, reminder.fire_at, reminder.recurrence, reminder.recurrence_interval, reminder.recurrence_end, reminder.misfire_policy, reminder.id))
+                updated = cursor.rowcount > 0
+            logging.info("Updated reminder ID %d", reminder.id, extra={'reminder_id': reminder.id})
+            self._notify_listeners('updated', reminder.id, reminder.datetime)
+            return updated
         except Exception as e:
             logging.error("Error updating reminder: %s", e)
+            return False
     
-    def delete_reminder(self, reminder_id):
+    @timed(DB_QUERY_SECONDS, operation='delete_reminder')
+    def delete_reminder(self, reminder_id, tenant=None):
+        # With a tenant, only deletes the reminder if that tenant owns it
+        tenant_clause = ' AND tenant = ?' if tenant is not None else ''
         try:
-            self.cursor.execute('DELETE FROM reminders WHERE id = ?', (reminder_id,))
-            self.conn.commit()
-            logging.info("Deleted reminder ID %d", reminder_id)
+            with self.pool.write() as cursor:
+                cursor.execute('BEGIN IMMEDIATE')  # see process_due_batch
+                cursor.execute(f'DELETE FROM reminders WHERE id = ?{tenant_clause}', (reminder_id,) + ((tenant,) if tenant is not None else ()))
+                deleted = cursor.rowcount > 0
+            logging.info("Deleted reminder ID %d", reminder_id, extra={'reminder_id': reminder_id})
+            self._notify_listeners('deleted', reminder_id)
+            return deleted
         except Exception as e:
             logging.error("Error deleting reminder: %s", e)
+            return False
+    
+    @timed(DB_QUERY_SECONDS, operation='claim_due_reminders')
+    def claim_due_reminders(self, owner, limit, lease_seconds=60):
+        # Atomically claims up to `limit` due reminders for `owner`, skipping rows under another worker's
+        # live lease. Expired leases (e.g. from a crashed worker) are reclaimed. BEGIN IMMEDIATE takes the
+        # database write lock before the SELECT, so concurrent processes never claim the same row.
+        now = to_epoch(self.clock.now())
+        with self.pool.write() as cursor:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(f'''
+            SELECT {DUE_COLUMNS} FROM reminders
+            WHERE fire_at <= ? AND (claim_owner IS NULL OR lease_expires < ?)
+            ORDER BY fire_at, id LIMIT ?
+            ''', (now, now, limit))
+            rows = cursor.fetchall()
+            cursor.executemany(
+                'UPDATE reminders SET claim_owner = ?, lease_expires = ? WHERE id = ?',
+                [(owner, now + lease_seconds, row[0]) for row in rows]
+            )
+        return self._create_reminders_from_rows(rows)
+    
+    @timed(DB_QUERY_SECONDS, operation='process_due_batch')
+    def process_due_batch(self, rescheduled, deleted_ids, owner=None, outbox=(), archive=True, missed_ids=()):
+        # Applies a whole batch of reschedules and deletes in one transaction (one commit, one fsync).
+        # With an owner, only rows still claimed by that owner are touched, and their claims are released;
+        # listeners only hear about the rows that were.
+        # outbox holds (reminder_id, message, fire_at) notifications to queue in the same transaction, so a
+        # fired reminder is never rescheduled without its notification, nor notified twice.
+        # Deleted rows are moved to this month's history partition unless archive=False or history is off.
+        # One-time reminders in missed_ids were dropped by their misfire policy rather than fired, and are
+        # archived as 'missed'.
+        # BEGIN IMMEDIATE: the FTS delete trigger reads the index before writing, and a deferred transaction
+        # that starts as a reader fails at once with "database is locked" if another process wrote meanwhile.
+        owner_clause = ' AND claim_owner = ?' if owner is not None else ''
+        owner_param = (owner,) if owner is not None else ()
+        now = self.clock.time()
+        try:
+            with self.pool.write() as cursor:
+                cursor.execute('BEGIN IMMEDIATE')
+                # Before the updates, while the claims still show which rows this worker owns
+                cursor.executemany(f'''
+                INSERT INTO outbox (reminder_id, message, fire_at, next_attempt, channel)
+                SELECT id, ?, ?, ?, tenant FROM reminders WHERE id = ?{owner_clause}
+                ''', [(message, fire_at, now, reminder_id) + owner_param for reminder_id, message, fire_at in outbox])
+                # Row by row rather than executemany, whose rowcount is only the total: a row whose lease
+                # another worker took over is left alone and must not be reported as changed
+                updated = []
+                for reminder in rescheduled:
+                    cursor.execute(f'''
+                    UPDATE reminders SET anchor_at = COALESCE(anchor_at, fire_at), datetime = ?, fire_at = ?, claim_owner = NULL, lease_expires = NULL
+                    WHERE id = ?{owner_clause}
+                    ''', (reminder.datetime_str, reminder.fire_at, reminder.id) + owner_param)
+                    if cursor.rowcount == 1:
+                        updated.append(reminder)
+                if archive and self.history and deleted_ids:
+                    table = create_history_partition(cursor, history_month(now))
+                    missed_ids = set(missed_ids)
+                    cursor.executemany(f'''
+                    INSERT INTO {table} ({HISTORY_COLUMNS})
+                    SELECT {REMINDER_COLUMNS}, ?, CASE WHEN recurrence IS NOT NULL THEN 'expired' WHEN ? THEN 'missed' ELSE 'fired' END
+                    FROM reminders WHERE id = ?{owner_clause}
+                    ''', [(int(now), reminder_id in missed_ids, reminder_id) + owner_param for reminder_id in deleted_ids])
+                removed = []
+                for reminder_id in deleted_ids:
+                    cursor.execute(f'DELETE FROM reminders WHERE id = ?{owner_clause}', (reminder_id,) + owner_param)
+                    if cursor.rowcount == 1:
+                        removed.append(reminder_id)
+            logging.info(
+                "Processed due batch: %d rescheduled, %d deleted", len(updated), len(removed),
+                extra={'rescheduled': len(updated), 'deleted': len(removed), 'outbox': len(outbox), 'owner': owner}
+            )
+        except Exception as e:
+            logging.error("Error processing due batch: %s", e)
+            return False
+        for reminder in updated:
+            self._notify_listeners('updated', reminder.id, reminder.datetime)
+        for reminder_id in removed:
+            self._notify_listeners('deleted', reminder_id)
+        return True
+    
+    @timed(DB_QUERY_SECONDS, operation='claim_outbox')
+    def claim_outbox(self, owner, limit, lease_seconds=60, remove=False, min_age=0):
+        # Claims up to `limit` outbox entries that are ready to send, as (id, reminder_id, message, fire_at, attempts,
+        # channel) tuples. remove=True deletes them in the same transaction instead of leasing them (at-most-once
+        # delivery). min_age holds entries back until they have been ready that many seconds, so a burst written
+        # over a few seconds is claimed in one batch.
+        now = self.clock.time()
+        with self.pool.write() as cursor:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+            SELECT id, reminder_id, message, fire_at, attempts, channel FROM outbox
+            WHERE next_attempt <= ? AND (claim_owner IS NULL OR lease_expires < ?)
+            ORDER BY next_attempt, id LIMIT ?
+            ''', (now - min_age, now, limit))
+            entries = cursor.fetchall()
+            if remove:
+                cursor.executemany('DELETE FROM outbox WHERE id = ?', [(entry[0],) for entry in entries])
+            else:
+                cursor.executemany(
+                    'UPDATE outbox SET claim_owner = ?, lease_expires = ? WHERE id = ?',
+                    [(owner, now + lease_seconds, entry[0]) for entry in entries]
+                )
+        return entries
+    
+    @timed(DB_QUERY_SECONDS, operation='complete_outbox')
+    def complete_outbox(self, delivered_ids, retries=(), failed=(), deferred=()):
+        # Settles a claimed batch in one transaction: delivered entries are removed, retries are
+        # (id, next_attempt, error) and failed entries (id, error) are kept with next_attempt NULL.
+        # deferred entries (id, next_attempt) were not attempted (rate limited) and keep their attempt count.
+        with self.pool.write() as cursor:
+            cursor.executemany('DELETE FROM outbox WHERE id = ?', [(entry_id,) for entry_id in delivered_ids])
+            cursor.executemany('''
+            UPDATE outbox SET attempts = attempts + 1, next_attempt = ?, last_error = ?, claim_owner = NULL, lease_expires = NULL
+            WHERE id = ?
+            ''', [(next_attempt, error, entry_id) for entry_id, next_attempt, error in retries])
+            cursor.executemany('''
+            UPDATE outbox SET attempts = attempts + 1, next_attempt = NULL, last_error = ?, claim_owner = NULL, lease_expires = NULL
+            WHERE id = ?
+            ''', [(error, entry_id) for entry_id, error in failed])
+            cursor.executemany(
+                'UPDATE outbox SET next_attempt = ?, claim_owner = NULL, lease_expires = NULL WHERE id = ?',
+                [(next_attempt, entry_id) for entry_id, next_attempt in deferred]
+            )
+    
+    def get_outbox(self, failed=False):
+        # Pending outbox entries (or, with failed=True, the ones that ran out of retries) as
+        # (id, reminder_id, message, fire_at, attempts, last_error) tuples
+        condition = 'next_attempt IS NULL' if failed else 'next_attempt IS NOT NULL'
+        with self.pool.read() as cursor:
+            cursor.execute(f'SELECT id, reminder_id, message, fire_at, attempts, last_error FROM outbox WHERE {condition} ORDER BY id')
+            return cursor.fetchall()
+    
+    def reschedule_reminders(self, reminders):
+        return self.process_due_batch(reminders, [])
+    
+    def delete_reminders(self, reminder_ids):
+        return self.process_due_batch([], reminder_ids, archive=False)
+    
+    @timed(DB_QUERY_SECONDS, operation='get_history')
+    def get_history(self, start=None, end=None, reminder_id=None, limit=100, tenant=None):
+        # Archived reminders, newest first, as (reminder, archived_at, reason) tuples; reason is 'fired' for
+        # one-time reminders, 'missed' for one-time reminders their misfire policy skipped and 'expired' for
+        # recurring ones past their end. start/end restrict the archive
+        # time to [start, end) and only the monthly partitions overlapping that range are read.
+        conditions = []
+        params = []
+        if tenant is not None:
+            conditions.append('tenant = ?')
+            params.append(tenant)
+        if start is not None:
+            conditions.append('archived_at >= ?')
+            params.append(to_epoch(start))
+        if end is not None:
+            conditions.append('archived_at < ?')
+            params.append(to_epoch(end))
+        if reminder_id is not None:
+            conditions.append('reminder_id = ?')
+            params.append(reminder_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        entries = []
+        with self.pool.read() as cursor:
+            cursor.execute('SELECT month FROM history_partitions ORDER BY month DESC')
+            months = [row[0] for row in cursor.fetchall()]
+            for month in months:
+                if start is not None and month < history_month(to_epoch(start)):
+                    break
+                if end is not None and month > history_month(to_epoch(end)):
+                    continue
+                cursor.execute(
+                    f'SELECT {HISTORY_COLUMNS} FROM {history_table(month)} {where} ORDER BY archived_at DESC, rowid DESC LIMIT ?',
+                    params + [limit - len(entries)]
+                )
+                entries.extend((Reminder(*row[:9]), datetime.fromtimestamp(row[9]), row[10]) for row in cursor.fetchall())
+                if len(entries) >= limit:
+                    break
+        return entries
     
+    @timed(DB_QUERY_SECONDS, operation='purge_history')
+    def purge_history(self, retention_days=None, vacuum_pages=1000):
+        # Removes history archived more than retention_days ago (default: history_retention_days) and returns
+        # the number of rows removed. Whole months past the cutoff are dropped; only the month containing the
+        # cutoff is deleted row by row. Then up to vacuum_pages free pages are returned to the filesystem.
+        if retention_days is None:
+            retention_days = self.history_retention_days
+        if retention_days is None:
+            return 0
+        cutoff = int(self.clock.time() - retention_days * 86400)
+        cutoff_month = history_month(cutoff)
+        removed = 0
+        with self.pool.write() as cursor:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT month FROM history_partitions WHERE month <= ?', (cutoff_month,))
+            for (month,) in cursor.fetchall():
+                table = history_table(month)
+                if month < cutoff_month:
+                    cursor.execute(f'SELECT COUNT(*) FROM {table}')
+                    removed += cursor.fetchone()[0]
+                    cursor.execute(f'DROP TABLE IF EXISTS {table}')
+                    cursor.execute('DELETE FROM history_partitions WHERE month = ?', (month,))
+                else:
+                    cursor.execute(f'DELETE FROM {table} WHERE archived_at < ?', (cutoff,))
+                    removed += cursor.rowcount
+        if vacuum_pages:
+            if self.incremental_vacuum_enabled():
+                with self.pool.write() as cursor:
+                    cursor.executescript(f'PRAGMA incremental_vacuum({int(vacuum_pages)})')
+            elif removed:
+                logging.info("Purged history pages stay in the file for reuse; run 'main.py compact' once to let purges shrink it.")
+        logging.info("Purged %d history rows older than %s days.", removed, retention_days, extra={'removed': removed})
+        return removed
+    
+    @timed(DB_QUERY_SECONDS, operation='get_upcoming_reminders')
     def get_upcoming_reminders(self):
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        self.cursor.execute('SELECT * FROM reminders WHERE datetime > ? ORDER BY datetime ASC', (now,))
-        reminders = self.cursor.fetchall()
-        return [self._create_reminder_from_row(row) for row in reminders]
+        now = to_epoch(self.clock.now())
+        with self.pool.read() as cursor:
+            cursor.execute(f'SELECT {REMINDER_COLUMNS} FROM reminders WHERE fire_at > ? ORDER BY fire_at, id', (now,))
+            reminders = cursor.fetchall()
+        return self._create_reminders_from_rows(reminders)
+    
+    @timed(DB_QUERY_SECONDS, operation='get_upcoming_page')
+    def get_upcoming_page(self, after=None, page_size=50, recurring_only=False, start=None, end=None, tenant=None):
+        # Keyset pagination over (fire_at, id): returns (reminders, cursor), where cursor is passed back
+        # as `after` to fetch the next page and is None once there are no more rows.
+        # start/end optionally restrict fire times to [start, end); the default start is now.
+        # tenant restricts the page to one tenant's reminders (None: all of them).
+        if after is None:
+            lower = to_epoch(start if start is not None else self.clock.now())
+            conditions = ['fire_at > ?' if start is None else 'fire_at >= ?']
+            params = [lower]
+        else:
+            conditions = ['(fire_at, id) > (?, ?)']
+            params = list(after)
+        if end is not None:
+            conditions.append('fire_at < ?')
+            params.append(to_epoch(end))
+        if recurring_only:
+            conditions.append('recurrence IS NOT NULL')
+        if tenant is not None:
+            conditions.append('tenant = ?')
+            params.append(tenant)
+        params.append(page_size + 1)
+        query = f"SELECT {REMINDER_COLUMNS} FROM reminders WHERE {' AND '.join(conditions)} ORDER BY fire_at, id LIMIT ?"
+        with self.pool.read() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = (rows[-1][7], rows[-1][0])
+        return self._create_reminders_from_rows(rows), next_cursor
+    
+    def iter_upcoming_reminders(self, page_size=500, recurring_only=False, start=None, end=None, tenant=None):
+        # Streams upcoming reminders page by page without loading the whole table
+        after = None
+        while True:
+            page, after = self.get_upcoming_page(after, page_size, recurring_only, start, end, tenant)
+            yield from page
+            if after is None:
+                return
+    
+    @timed(DB_QUERY_SECONDS, operation='search_reminders')
+    def search_reminders(self, query, limit=20, tenant=None):
+        # Full-text search over reminder text using the FTS5 index; best matches (bm25) first,
+        # ties broken by fire time. tenant restricts the matches to one tenant's reminders.
+        return [reminder for _, reminder in self.search_ranked(query, limit, tenant)]
+    
+    def search_ranked(self, query, limit=20, tenant=None):
+        # search_reminders as [(bm25 rank, reminder)], lower is better, for merging results from several stores.
+        # Every match is ranked, keeping only the best `limit` while sorting, so the cost grows with the number
+        # of matches (about 3 us each): queries matching a few thousand reminders stay under 10 ms, while a
+        # one-letter prefix over 100k reminders takes ~75 ms. Ranking only a capped subset would be faster
+        # but could miss the best match, so broad queries are left slower rather than wrong.
+        match = build_search_query(query)
+        if match is None:
+            return []
+        columns = ', '.join(f'r.{column}' for column in REMINDER_COLUMNS.split(', '))
+        tenant_clause = ' AND r.tenant = ?' if tenant is not None else ''
+        with self.pool.read() as cursor:
+            cursor.execute(f'''
+            SELECT reminders_fts.rank, {columns} FROM reminders_fts JOIN reminders r ON r.id = reminders_fts.rowid
+            WHERE reminders_fts MATCH ?{tenant_clause}
+            ORDER BY reminders_fts.rank, r.fire_at LIMIT ?
+            ''', (match,) + ((tenant,) if tenant is not None else ()) + (limit,))
+            rows = cursor.fetchall()
+        reminders = self._create_reminders_from_rows([row[1:] for row in rows])
+        return [(row[0], reminder) for row, reminder in zip(rows, reminders)]
+    
+    @timed(DB_QUERY_SECONDS, operation='get_reminder')
+    def get_reminder(self, reminder_id, tenant=None):
+        # With a tenant, reminders owned by someone else are reported as missing
+        with self.pool.read() as cursor:
+            cursor.execute(f'SELECT {REMINDER_COLUMNS} FROM reminders WHERE id = ?', (reminder_id,))
+            row = cursor.fetchone()
+        if row is None or (tenant is not None and row[8] != tenant):
+            return None
+        return self._create_reminder_from_row(row)
+    
+    def get_tenant_counts(self):
+        # {tenant: number of pending reminders}; the single-user rows count under None
+        with self.pool.read() as cursor:
+            cursor.execute('SELECT tenant, COUNT(*) FROM reminders GROUP BY tenant')
+            return dict(cursor.fetchall())
+    
+    @timed(DB_QUERY_SECONDS, operation='move_tenant')
+    def move_tenant_from(self, source, tenant):
+        # Moves every pending reminder of `tenant` from the ReminderManager `source` (another database file)
+        # into this one and returns how many moved. Both databases are written in one transaction on this
+        # connection with the source ATTACHed, so a reminder is never live in both for the schedulers to fire.
+        # Moved reminders get new ids here; their history and outbox entries stay in the source.
+        # An in-memory database (storage='memory') can't be attached, so both sides must use file storage.
+        if isinstance(self.pool, SnapshotPool) or isinstance(source.pool, SnapshotPool):
+            raise ValueError("moving a tenant needs file storage on both shards")
+        with self.pool.write() as cursor:
+            cursor.execute('ATTACH DATABASE ? AS source', (source.pool.database,))
+        try:
+            with self.pool.write() as cursor:
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute('SELECT COALESCE(MAX(id), 0) FROM main.reminders')
+                first_id = cursor.fetchone()[0] + 1
+                cursor.execute('''
+                INSERT INTO main.reminders (text, datetime, fire_at, recurrence, recurrence_interval, recurrence_end, misfire_policy, tenant, anchor_at)
+                SELECT text, datetime, fire_at, recurrence, recurrence_interval, recurrence_end, misfire_policy, tenant, anchor_at
+                FROM source.reminders WHERE tenant = ? ORDER BY id
+                ''', (tenant,))
+                cursor.execute('INSERT INTO main.reminders_fts (rowid, text) SELECT id, text FROM main.reminders WHERE id >= ?', (first_id,))
+                cursor.execute('SELECT id FROM source.reminders WHERE tenant = ?', (tenant,))
+                moved_ids = [row[0] for row in cursor.fetchall()]
+                cursor.execute('DELETE FROM source.reminders WHERE tenant = ?', (tenant,))
+                cursor.execute('SELECT id, fire_at FROM main.reminders WHERE id >= ?', (first_id,))
+                added = cursor.fetchall()
+        finally:
+            with self.pool.write() as cursor:
+                cursor.execute('DETACH DATABASE source')
+        logging.info("Moved %d reminders of tenant '%s' from %s", len(added), tenant, source.pool.database, extra={'tenant': tenant, 'count': len(added)})
+        for reminder_id in moved_ids:
+            source._notify_listeners('deleted', reminder_id)
+        for reminder_id, fire_at in added:
+            self._notify_listeners('added', reminder_id, datetime.fromtimestamp(fire_at))
+        return len(added)
+    
+    def get_schedule_entries(self):
+        # (fire_time, reminder_id) pairs for every stored reminder, used to seed the scheduler
+        with self.pool.read() as cursor:
+            cursor.execute('SELECT id, fire_at FROM reminders')
+            rows = cursor.fetchall()
+        return [(datetime.fromtimestamp(row[1]), row[0]) for row in rows]
     
     def _create_reminder_from_row(self, row):
-        return Reminder(
-            reminder_id=row[0],
-            text=row[1],
-            datetime_str=row[2],
-            recurrence=row[3],
-            recurrence_interval=row[4],
-            recurrence_end=row[5]
-        )
+        return Reminder(*row)
+    
+    def _create_reminders_from_rows(self, rows):
+        # Bulk path: starmap drives the constructor from C without a per-row Python loop
+        return list(starmap(Reminder, rows))
     
     def close(self):
-        self.conn.close()
+        if self.write_buffer is not None:
+            self.write_buffer.stop()
+        self.pool.close()
         logging.info("Database connection closed.")
 
 class Notifier:
-    def __init__(self):
-        self.toaster = ToastNotifier()
+    def __init__(self, backends=None, workers=4, max_queue_size=1000, max_retries=3, retry_delay=1.0):
+        # Delivery happens on worker threads; send_notification only enqueues.
+        # The backends (a toast notifier by default) and the worker threads are only set up by the first
+        # notification, so a process that never fires anything doesn't pay for them.
+        self.backends = backends
+        self.options = {'workers': workers, 'max_queue_size': max_queue_size, 'max_retries': max_retries, 'retry_delay': retry_delay}
+        self._delivery_queue = None
+        self.lock = threading.Lock()
+    
+    @property
+    def delivery_queue(self):
+        if self._delivery_queue is None:
+            with self.lock:
+                if self._delivery_queue is None:
+                    backends = self.backends if self.backends is not None else default_backends()
+                    delivery_queue = DeliveryQueue(backends, **self.options)
+                    delivery_queue.start()
+                    self._delivery_queue = delivery_queue
+        return self._delivery_queue
     
-    def send_notification(self, message):
+    def send_notification(self, message, channel=None, title="Reminder"):
+        # channel is the tenant the notification is for; every channel goes to the same backends here
         try:
-            self.toaster.show_toast(
-                "Reminder",
-                message,
-                duration=10,
-                threaded=True
-            )
-            while self.toaster.notification_active():
-                time.sleep(0.1)
-            logging.info("Notification sent: '%s'", message)
+            return self.delivery_queue.submit(title, message)
         except Exception as e:
-            logging.error("Failed to send notification: %s", e)
+            logging.error("Failed to queue notification: %s", e)
+            return False
+    
+    def deliver(self, message, title="Reminder"):
+        # Synchronous delivery for the OutboxRelay; raises if a backend fails
+        self.delivery_queue.send_now(title, message)
+    
+    def close(self):
+        with self.lock:
+            if self._delivery_queue is not None:
+                self._delivery_queue.stop()
+                self._delivery_queue = None
+
+class FireQueue:
+    # Min-heap of (fire_time, reminder_id) entries guarded by a condition variable.
+    # Stale entries left behind by updates and deletes are skipped lazily when they reach the head.
+    def __init__(self, clock=SYSTEM_CLOCK):
+        self.heap = []
+        self.fire_times = {}
+        self.condition = threading.Condition()
+        self.clock = clock
+    
+    def load(self, entries):
+        with self.condition:
+            # Entries pushed by listeners while the snapshot was being read are newer, so they win
+            loaded = {reminder_id: fire_time for fire_time, reminder_id in entries}
+            loaded.update(self.fire_times)
+            self.fire_times = loaded
+            self.heap = [(fire_time, reminder_id) for reminder_id, fire_time in self.fire_times.items()]
+            heapq.heapify(self.heap)
+            self.condition.notify_all()
+    
+    def push(self, fire_time, reminder_id):
+        with self.condition:
+            head = self._peek()
+            self.fire_times[reminder_id] = fire_time
+            heapq.heappush(self.heap, (fire_time, reminder_id))
+            if head is None or fire_time < head:
+                self.condition.notify_all()
+    
+    def remove(self, reminder_id):
+        with self.condition:
+            self.fire_times.pop(reminder_id, None)
+    
+    def wake(self):
+        with self.condition:
+            self.condition.notify_all()
+    
+    def __len__(self):
+        return len(self.fire_times)
+    
+    def _peek(self):
+        while self.heap:
+            fire_time, reminder_id = self.heap[0]
+            if self.fire_times.get(reminder_id) == fire_time:
+                return fire_time
+            heapq.heappop(self.heap)
+        return None
+    
+    def wait_until_due(self, max_sleep):
+        # Waits until the head falls due (at most max_sleep seconds) and returns the ids that are due then,
+        # or an empty list if woken before anything fell due
+        with self.condition:
+            head = self._peek()
+            now = self.clock.now()
+            if head is None or head > now:
+                timeout = max_sleep
+                if head is not None:
+                    timeout = min(max_sleep, (head - now).total_seconds())
+                self.clock.wait(self.condition, timeout)
+                head = self._peek()
+                now = self.clock.now()
+            due_ids = []
+            while head is not None and head <= now:
+                fire_time, reminder_id = heapq.heappop(self.heap)
+                del self.fire_times[reminder_id]
+                due_ids.append(reminder_id)
+                head = self._peek()
+            return due_ids
 
 class Scheduler:
-    def __init__(self, reminder_manager, notifier):
+    def __init__(self, reminder_manager, notifier, mode='event', max_sleep=60, max_batch_size=500, misfire_grace=60, worker_id=None, lease_seconds=60, guarantee=None, purge_interval=3600, clock=None, coalescer=None):
+        # mode='event' sleeps until the next fire time; mode='polling' keeps the old once-a-minute check.
+        # max_batch_size bounds how many due reminders are written per transaction.
+        # Reminders more than misfire_grace seconds late are treated as missed (see catch_up).
+        # Due reminders are leased to worker_id for lease_seconds, so several scheduler processes can
+        # share one database without double-firing; a crashed worker's leases expire and are reclaimed.
+        # guarantee=None hands notifications straight to the notifier before the batch is committed.
+        # 'at-least-once' or 'at-most-once' writes them to the outbox in the batch's transaction instead,
+        # and an OutboxRelay delivers them through notifier.deliver (see delivery.py), in per-channel digests if a
+        # coalescer is given. For direct delivery, coalesce by passing a DigestNotifier as the notifier instead.
+        # Every purge_interval seconds, history past the manager's retention is purged (see purge_history).
+        # clock defaults to the manager's; with a SimulatedClock, run(until=...) replays a period without waiting.
         self.reminder_manager = reminder_manager
         self.notifier = notifier
-        schedule.every(1).minutes.do(self.check_reminders)
+        self.clock = clock or reminder_manager.clock
+        self.mode = mode
+        self.max_sleep = max_sleep
+        self.max_batch_size = max_batch_size
+        self.misfire_grace = misfire_grace
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.relay = None
+        if guarantee is not None:
+            self.relay = OutboxRelay(reminder_manager, notifier.deliver, guarantee, owner=self.worker_id, clock=self.clock, coalescer=coalescer)
+        self.lease_seconds = lease_seconds
+        self.purge_interval = purge_interval
+        self.running = False
+        self.stopping = threading.Event()  # ends check_reminders after the batch in progress
+        self.scheduler_thread = None
+        if mode == 'event':
+            self.fire_queue = FireQueue(self.clock)
+            self.fire_queue_loaded = False
+            reminder_manager.add_listener(self.on_reminder_changed)
+        elif mode != 'polling':
+            raise ValueError(f"Unknown scheduler mode: '{mode}'")
     
     def start(self):
+        self.running = True
+        self.stopping.clear()
+        if self.relay is not None:
+            self.relay.start()
+        if self.mode == 'event':
+            self._load_fire_queue()
         self.scheduler_thread = threading.Thread(target=self.run, daemon=True)
         self.scheduler_thread.start()
     
-    def run(self):
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+    def stop(self, timeout=10):
+        # Returns once the scheduler thread has finished its batch in progress (or after `timeout` seconds),
+        # so the manager and notifier can be closed behind it without cutting a pass short
+        self.running = False
+        self.stopping.set()
+        if self.mode == 'event':
+            self.fire_queue.wake()
+        if self.scheduler_thread is not None and self.scheduler_thread is not threading.current_thread():
+            self.scheduler_thread.join(timeout)
+            if self.scheduler_thread.is_alive():
+                logging.warning("Scheduler thread still running after %s s; stopping anyway.", timeout)
+            self.scheduler_thread = None
+        if self.relay is not None:
+            self.relay.stop()
+    
+    def run(self, until=None):
+        # Runs the scheduler loop in the calling thread until stop(), or until the clock reaches `until`
+        self.running = True
+        last_check = last_purge = self.clock.monotonic()
+        if self.mode == 'polling':
+            while self.running and (until is None or self.clock.now() < until):
+                if self.clock.monotonic() - last_check >= 60:
+                    self.check_reminders()
+                    last_check = self.clock.monotonic()
+                if self.clock.monotonic() - last_purge >= self.purge_interval:
+                    self.purge_history()
+                    last_purge = self.clock.monotonic()
+                self.clock.sleep(1)
+        else:
+            if not self.fire_queue_loaded:
+                self._load_fire_queue()
+            # Besides firing at the heap's due times, check every max_sleep seconds to pick up rows written by
+            # other processes and leases that expired after a worker crashed
+            while self.running:
+                max_sleep = self.max_sleep
+                if until is not None:
+                    remaining = (until - self.clock.now()).total_seconds()
+                    if remaining <= 0:
+                        break
+                    max_sleep = min(max_sleep, remaining)
+                due_ids = self.fire_queue.wait_until_due(max_sleep)
+                if not self.running:
+                    break
+                if due_ids or self.clock.monotonic() - last_check >= self.max_sleep:
+                    self.check_reminders()
+                    last_check = self.clock.monotonic()
+                if self.clock.monotonic() - last_purge >= self.purge_interval:
+                    self.purge_history()
+                    last_purge = self.clock.monotonic()
+    
+    def _load_fire_queue(self):
+        self.fire_queue.load(self.reminder_manager.get_schedule_entries())
+        self.fire_queue_loaded = True
+        logging.info("Event scheduler started with %d reminders queued.", len(self.fire_queue))
+    
+    def on_reminder_changed(self, event, reminder_id, fire_time):
+        if event == 'deleted':
+            self.fire_queue.remove(reminder_id)
+        else:
+            self.fire_queue.push(fire_time, reminder_id)
     
     def check_reminders(self):
         try:
-            due_reminders = self.reminder_manager.get_due_reminders()
-            for reminder in due_reminders:
-                self.notifier.send_notification(reminder.text)
-                if reminder.recurrence:
-                    next_datetime = self.calculate_next_occurrence(reminder)
-                    if next_datetime:
-                        reminder.datetime = next_datetime
-                        reminder.datetime_str = next_datetime.strftime('%Y-%m-%d %H:%M:%S')
-                        self.reminder_manager.update_reminder(reminder)
-                    else:
-                        self.reminder_manager.delete_reminder(reminder.id)
-                else:
-                    self.reminder_manager.delete_reminder(reminder.id)
+            with CHECK_DURATION_SECONDS.time():
+                self._check_reminders()
         except Exception as e:
             logging.error("Error checking reminders: %s", e)
     
-    def calculate_next_occurrence(self, reminder):
-        # Calculate the next occurrence based on the recurrence pattern
-        current_datetime = reminder.datetime
-        recurrence_interval = reminder.recurrence_interval
-        if reminder.recurrence == 'daily':
-            next_datetime = current_datetime + timedelta(days=recurrence_interval)
-        elif reminder.recurrence == 'weekly':
-            next_datetime = current_datetime + timedelta(weeks=recurrence_interval)
-        elif reminder.recurrence == 'monthly':
-            next_datetime = add_months(current_datetime, recurrence_interval)
-        elif reminder.recurrence == 'yearly':
-            next_datetime = add_years(current_datetime, recurrence_interval)
+    def purge_history(self):
+        try:
+            self.reminder_manager.purge_history()
+        except Exception as e:
+            logging.error("Error purging reminder history: %s", e)
+    
+    def _check_reminders(self):
+        while True:
+            due_reminders = self.reminder_manager.claim_due_reminders(self.worker_id, self.max_batch_size, self.lease_seconds)
+            if not due_reminders:
+                break
+            if not self.process_batch(due_reminders):
+                break
+            if len(due_reminders) < self.max_batch_size or self.stopping.is_set():
+                break
+    
+    def process_batch(self, due_reminders):
+        rescheduled = []
+        deleted_ids = []
+        missed_ids = []
+        outbox = []
+        now = self.clock.now()
+        BATCH_SIZE.observe(len(due_reminders))
+        for reminder in due_reminders:
+            fires, next_datetime = self.catch_up(reminder, now)
+            if fires:
+                FIRE_LAG_SECONDS.observe(max(0.0, self.clock.time() - reminder.fire_at))
+                REMINDERS_FIRED.inc(fires)
+            if self.relay is not None:
+                outbox.extend([(reminder.id, reminder.text, reminder.fire_at)] * fires)
+            else:
+                for _ in range(fires):
+                    # Only tenants' reminders name a channel, so single-user notifiers keep the one-argument call
+                    if reminder.tenant is None:
+                        self.notifier.send_notification(reminder.text)
+                    else:
+                        self.notifier.send_notification(reminder.text, channel=reminder.tenant)
+            if next_datetime:
+                reminder.datetime = next_datetime
+                rescheduled.append(reminder)
+            else:
+                deleted_ids.append(reminder.id)
+                if not fires:
+                    missed_ids.append(reminder.id)
+        committed = self.reminder_manager.process_due_batch(rescheduled, deleted_ids, owner=self.worker_id, outbox=outbox, missed_ids=missed_ids)
+        if committed and outbox:
+            self.relay.wake()
+        return committed
+    
+    def catch_up(self, reminder, now):
+        # Returns (notifications to send, next fire time or None) for a due reminder in a single step,
+        # however many occurrences were missed. Reminders later than misfire_grace follow their misfire policy.
+        next_datetime = None
+        missed = 1
+        if reminder.recurrence:
+            next_datetime = self.calculate_next_occurrence(reminder, now)
+            if reminder.misfire_policy == 'all':
+                recurrence_end = self._recurrence_end(reminder)
+                limit = min(now, recurrence_end) if recurrence_end else now
+                try:
+                    rule = self._rule(reminder)
+                    missed = rule.count_through(reminder.anchor, limit)[0]
+                    if reminder.anchor_at is not None:
+                        # Only the occurrences from this fire time on are missed ones
+                        missed -= rule.count_through(reminder.anchor, reminder.datetime)[0] - 1
+                except ValueError:
+                    # Unknown pattern (already logged above): fire it once like a one-time reminder
+                    missed = 1
+        
+        if (now - reminder.datetime).total_seconds() <= self.misfire_grace:
+            return 1, next_datetime
+        if reminder.misfire_policy == 'skip':
+            fires = 0
+        elif reminder.misfire_policy == 'all':
+            fires = missed
         else:
+            fires = 1
+        logging.info(
+            "Reminder ID %d missed its fire time; policy '%s' sends %d notification(s)", reminder.id, reminder.misfire_policy, fires,
+            extra={'reminder_id': reminder.id, 'lateness_s': (now - reminder.datetime).total_seconds()}
+        )
+        return fires, next_datetime
+    
+    def calculate_next_occurrence(self, reminder, after=None):
+        # First occurrence strictly after `after` (default: the reminder's own fire time), from the compiled rule.
+        # Counted from the reminder's anchor rather than its current fire time, so day-of-month is kept.
+        if after is None or after < reminder.datetime:
+            after = reminder.datetime
+        try:
+            next_datetime = self._rule(reminder).next_after(reminder.anchor, after)
+        except ValueError:
             logging.warning("Unknown recurrence pattern: '%s'", reminder.recurrence)
             return None
         
-        if reminder.recurrence_end:
-            recurrence_end_datetime = datetime.strptime(reminder.recurrence_end, '%Y-%m-%d %H:%M:%S')
-            if next_datetime > recurrence_end_datetime:
-                logging.info("Recurring reminder ended: ID %d", reminder.id)
-                return None  # Recurrence has ended
+        recurrence_end_datetime = self._recurrence_end(reminder)
+        if next_datetime is None or (recurrence_end_datetime and next_datetime > recurrence_end_datetime):
+            logging.info("Recurring reminder ended: ID %d", reminder.id, extra={'reminder_id': reminder.id})
+            return None  # Recurrence has ended
         
         return next_datetime
+    
+    def _rule(self, reminder):
+        # Compiled once per distinct (recurrence, interval) and shared by every reminder using it
+        return compile_rule(reminder.recurrence, reminder.recurrence_interval or 1)
+    
+    def _recurrence_end(self, reminder):
+        if reminder.recurrence_end:
+            return parse_recurrence_end(reminder.recurrence_end)
+        return None
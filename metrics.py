@@ -0,0 +1,255 @@
+#This file will contain the in-process metrics used to instrument the scheduler, database and notifier.
+
+#metrics.py:
+# Contains Counter, Gauge and Histogram metrics kept in a MetricsRegistry.
+# Exposes them as a stats dict (snapshot) and in the Prometheus text format, optionally over HTTP.
+#
+# Histograms use fixed buckets, so recording a value is a bisect plus an increment under a lock;
+# cheap enough to leave on in production.
+
+import threading
+import time
+import logging
+from bisect import bisect_left
+from functools import wraps
+
+# Upper bounds in seconds, from sub-millisecond database calls to minutes of firing lag
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        return [(name, _format_labels(labels), self.value)]
+
+    def stats(self):
+        return {'value': self.value}
+
+class Gauge:
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        # The gauge reads its value from `function` at collection time (e.g. a queue depth)
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function else self.value
+
+    def samples(self, name, labels):
+        return [(name, _format_labels(labels), self.get())]
+
+    def stats(self):
+        return {'value': self.get()}
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, fraction):
+        # Upper bound of the bucket containing the requested quantile
+        with self.lock:
+            counts = list(self.counts)
+            count = self.count
+        if not count:
+            return 0.0
+        target = fraction * count
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            running += bucket_count
+            if running >= target:
+                return bound
+        return float('inf')
+
+    def samples(self, name, labels):
+        with self.lock:
+            counts = list(self.counts)
+            count = self.count
+            total = self.sum
+        samples = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            running += bucket_count
+            samples.append((f'{name}_bucket', _format_labels(labels, ('le', _format_value(bound))), running))
+        samples.append((f'{name}_sum', _format_labels(labels), total))
+        samples.append((f'{name}_count', _format_labels(labels), count))
+        return samples
+
+    def stats(self):
+        count = self.count
+        return {
+            'count': count,
+            'sum': self.sum,
+            'mean': self.sum / count if count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99)
+        }
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+class MetricFamily:
+    # A named metric with optional labels; each distinct label set gets its own child metric
+    def __init__(self, name, help_text, kind, factory):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.factory = factory
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(sorted(labels.items()))
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self.factory())
+        return child
+
+    # Unlabelled shortcuts
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+class MetricsRegistry:
+    def __init__(self):
+        self.families = {}
+        self.lock = threading.Lock()
+
+    def _family(self, name, help_text, kind, factory):
+        with self.lock:
+            family = self.families.get(name)
+            if family is None:
+                family = self.families[name] = MetricFamily(name, help_text, kind, factory)
+            return family
+
+    def counter(self, name, help_text):
+        return self._family(name, help_text, 'counter', Counter)
+
+    def gauge(self, name, help_text):
+        return self._family(name, help_text, 'gauge', Gauge)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._family(name, help_text, 'histogram', lambda: Histogram(buckets))
+
+    def snapshot(self):
+        # Stats API: {metric name: {label string: stats dict}}
+        result = {}
+        for name, family in sorted(self.families.items()):
+            result[name] = {_format_labels(key) or '': child.stats() for key, child in sorted(family.children.items())}
+        return result
+
+    def render_prometheus(self):
+        lines = []
+        for name, family in sorted(self.families.items()):
+            lines.append(f'# HELP {name} {family.help_text}')
+            lines.append(f'# TYPE {name} {family.kind}')
+            for key, child in sorted(family.children.items()):
+                for sample_name, labels, value in child.samples(name, key):
+                    lines.append(f'{sample_name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            for family in self.families.values():
+                family.children.clear()
+
+# Process-wide registry used by the managers and the delivery queue
+REGISTRY = MetricsRegistry()
+
+def timed(family, **labels):
+    # Decorator recording each call's duration in a histogram family
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            histogram = family.labels(**labels)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def start_metrics_server(port=9464, host='127.0.0.1', registry=REGISTRY):
+    # Serves the Prometheus text format at /metrics on a background thread; returns the server.
+    # http.server is imported here so that recording metrics doesn't pay for it.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    logging.info("Metrics available at http://%s:%d/metrics", host, server.server_address[1])
+    return server
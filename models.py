@@ -6,17 +6,70 @@
 
 from datetime import datetime
 
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
 class Reminder:
-    def __init__(self, reminder_id, text, datetime_str, recurrence=None, recurrence_interval=1, recurrence_end=None):
+    # __slots__ keeps each instance small; the datetime is only built when first accessed,
+    # preferably from the stored integer epoch (fire_at) rather than by strptime on the string.
+    __slots__ = ('id', 'text', '_datetime_str', '_datetime', '_fire_at', 'recurrence', 'recurrence_interval', 'recurrence_end', 'misfire_policy', 'tenant', 'anchor_at')
+
+    def __init__(self, reminder_id, text, datetime_str, recurrence=None, recurrence_interval=1, recurrence_end=None, misfire_policy='once', fire_at=None, tenant=None, anchor_at=None):
         self.id = reminder_id
         self.text = text
-        self.datetime_str = datetime_str  # Stored as a string for database compatibility
-        self.datetime = datetime.strptime(datetime_str, '%Y-%m-%d %H:%M:%S')  # Convert to datetime object
+        self._datetime_str = datetime_str  # Stored as a string for database compatibility
+        self._datetime = None
+        self._fire_at = fire_at
         self.recurrence = recurrence
         self.recurrence_interval = recurrence_interval
         self.recurrence_end = recurrence_end
+        self.misfire_policy = misfire_policy or 'once'  # 'once', 'all' or 'skip' for reminders found long overdue
+        self.tenant = tenant  # Owning user/tenant; None for a single-user store
+        self.anchor_at = anchor_at  # Epoch of the occurrence recurrences count from; None until first rescheduled
 
-    def __repr__(self):
-        return f"<Reminder(id={self.id}, text='{self.text}', datetime='{self.datetime_str}', recurrence='{self.recurrence}', interval={self.recurrence_interval}, end='{self.recurrence_end}')>"
+    @property
+    def datetime(self):
+        if self._datetime is None:
+            if self._fire_at is not None:
+                self._datetime = datetime.fromtimestamp(self._fire_at)
+            else:
+                self._datetime = datetime.strptime(self._datetime_str, DATETIME_FORMAT)
+        return self._datetime
+
+    @datetime.setter
+    def datetime(self, value):
+        self._datetime = value
+        self._datetime_str = None
+        self._fire_at = None
 
+    @property
+    def datetime_str(self):
+        if self._datetime_str is None:
+            self._datetime_str = self._datetime.strftime(DATETIME_FORMAT)
+        return self._datetime_str
 
+    @datetime_str.setter
+    def datetime_str(self, value):
+        if self._datetime is not None and self._datetime_str is None and self._datetime.strftime(DATETIME_FORMAT) == value:
+            self._datetime_str = value
+            return
+        self._datetime_str = value
+        self._datetime = None
+        self._fire_at = None
+
+    @property
+    def fire_at(self):
+        # Fire time as an integer Unix timestamp (naive local time)
+        if self._fire_at is None:
+            self._fire_at = int(self.datetime.timestamp())
+        return self._fire_at
+
+    @property
+    def anchor(self):
+        # Start of the recurrence: rescheduling moves the fire time but not this, so a monthly reminder set
+        # for the 31st comes back to the 31st after a 30-day month
+        if self.anchor_at is None:
+            return self.datetime
+        return datetime.fromtimestamp(self.anchor_at)
+
+    def __repr__(self):
+        return f"<Reminder(id={self.id}, text='{self.text}', datetime='{self.datetime_str}', recurrence='{self.recurrence}', interval={self.recurrence_interval}, end='{self.recurrence_end}', misfire='{self.misfire_policy}', tenant='{self.tenant}')>"
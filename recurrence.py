@@ -0,0 +1,570 @@
+#This file will contain the recurrence engine used by the scheduler.
+
+#recurrence.py:
+# Contains compile_rule, which turns a reminder's recurrence into a compiled rule object, cached per distinct rule.
+# A recurrence is one of:
+#   a frequency word        'daily', 'weekly', 'monthly', 'yearly' (repeated every recurrence_interval periods)
+#   an RRULE                'FREQ=WEEKLY;BYDAY=MO,WE,FR;BYHOUR=9' (optionally prefixed with 'RRULE:')
+#   a cron expression       '30 9 * * 1-5' (minute hour day-of-month month day-of-week), or @daily/@weekly/...
+#   a phrase                'every weekday at 9', 'first monday of the month', 'every mon and thu at 7:30 pm'
+# Contains IntervalRule (closed-form every-N-periods) and CalendarRule (calendar fields matched against
+# per-month tables of matching days and a sorted list of times of day).
+
+import re
+from bisect import bisect_left, bisect_right
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+from itertools import islice, takewhile
+
+from models import DATETIME_FORMAT
+
+FREQUENCIES = ('daily', 'weekly', 'monthly', 'yearly')
+
+# Month lengths for common and leap years
+MONTH_LENGTHS = (
+    (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31),
+    (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+)
+
+# RRULE weekday codes, in date.weekday() order
+WEEKDAY_CODES = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+WEEKDAY_NAMES = {
+    'monday': 0, 'mon': 0, 'tuesday': 1, 'tue': 1, 'tues': 1, 'wednesday': 2, 'wed': 2,
+    'thursday': 3, 'thu': 3, 'thurs': 3, 'friday': 4, 'fri': 4, 'saturday': 5, 'sat': 5, 'sunday': 6, 'sun': 6
+}
+MONTH_NAMES = {name: number for number, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), start=1
+)}
+ORDINALS = {
+    'first': 1, '1st': 1, 'second': 2, '2nd': 2, 'third': 3, '3rd': 3,
+    'fourth': 4, '4th': 4, 'fifth': 5, '5th': 5, 'last': -1
+}
+CRON_MACROS = {
+    '@hourly': '0 * * * *', '@daily': '0 0 * * *', '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0', '@monthly': '0 0 1 * *', '@yearly': '0 0 1 1 *', '@annually': '0 0 1 1 *'
+}
+
+# Rule fields marked FROM_START are taken from the reminder's own fire time, as RRULE does with DTSTART
+FROM_START = 'start'
+
+# How far ahead a calendar rule looks before deciding it never matches again (e.g. "0 0 30 2 *")
+MAX_SEARCH_MONTHS = 12 * 400
+
+# Helper functions for date calculations
+def is_leap(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+def month_length(year, month):
+    return MONTH_LENGTHS[is_leap(year)][month - 1]
+
+@lru_cache(maxsize=4096)
+def first_weekday(year, month):
+    return date(year, month, 1).weekday()
+
+def add_months(sourcedate, months):
+    month = sourcedate.month - 1 + months
+    year = sourcedate.year + month // 12
+    month = month % 12 + 1
+    day = min(sourcedate.day, month_length(year, month))
+    return datetime(year, month, day, sourcedate.hour, sourcedate.minute, sourcedate.second)
+
+def add_years(sourcedate, years):
+    try:
+        return sourcedate.replace(year=sourcedate.year + years)
+    except ValueError:
+        # Handle February 29 for leap years
+        return sourcedate.replace(month=2, day=28, year=sourcedate.year + years)
+
+def count_occurrences(start, recurrence, interval, limit):
+    # Closed-form (count of occurrences in [start, limit], first occurrence after limit) for a recurrence.
+    # Months and years are always offset from `start` so day-of-month clamping never drifts.
+    if limit < start:
+        return 0, start
+    if recurrence in ('daily', 'weekly'):
+        step = timedelta(days=interval) if recurrence == 'daily' else timedelta(weeks=interval)
+        count = (limit - start) // step + 1
+        return count, start + count * step
+    if recurrence == 'monthly':
+        steps = ((limit.year - start.year) * 12 + limit.month - start.month) // interval
+        advance = lambda k: add_months(start, k * interval)
+    elif recurrence == 'yearly':
+        steps = (limit.year - start.year) // interval
+        advance = lambda k: add_years(start, k * interval)
+    else:
+        raise ValueError(f"Unknown recurrence pattern: '{recurrence}'")
+    # The estimate is off by at most one step because of day/time-of-day within the period
+    while steps > 0 and advance(steps) > limit:
+        steps -= 1
+    while advance(steps + 1) <= limit:
+        steps += 1
+    return steps + 1, advance(steps + 1)
+
+@lru_cache(maxsize=4096)
+def parse_recurrence_end(value):
+    # recurrence_end strings are shared by many reminders and checked on every firing, so parse each once
+    return datetime.strptime(value, DATETIME_FORMAT)
+
+class Rule:
+    # A compiled recurrence. Occurrences are anchored at `start` (the reminder's fire time), which is
+    # always the first occurrence; every query takes it so one compiled rule serves all reminders using it.
+    text = None
+
+    def next_after(self, start, after):
+        # First occurrence strictly after `after`, or None if there is none
+        raise NotImplementedError
+
+    def count_through(self, start, limit):
+        # (number of occurrences in [start, limit], first occurrence after limit)
+        raise NotImplementedError
+
+    def to_rrule(self):
+        # RRULE text for iCalendar export, or None if the rule can't be expressed as one
+        return None
+
+    def iter_after(self, start, after):
+        current = after
+        while True:
+            current = self.next_after(start, current)
+            if current is None:
+                return
+            yield current
+
+    def next_n(self, start, after, count):
+        return list(islice(self.iter_after(start, after), count))
+
+    def between(self, start, window_start, window_end):
+        # Occurrences in [window_start, window_end)
+        return list(takewhile(lambda when: when < window_end, self.iter_after(start, window_start - timedelta(seconds=1))))
+
+    def __repr__(self):
+        return f"<{type(self).__name__} '{self.text}'>"
+
+class IntervalRule(Rule):
+    # Every `interval` days/weeks/months/years from start, evaluated in closed form
+    def __init__(self, frequency, interval=1, text=None):
+        if interval < 1:
+            raise ValueError(f"Invalid interval {interval}")
+        self.frequency = frequency
+        self.interval = interval
+        self.text = text or frequency
+
+    def next_after(self, start, after):
+        if after < start:
+            return start
+        return count_occurrences(start, self.frequency, self.interval, after)[1]
+
+    def count_through(self, start, limit):
+        return count_occurrences(start, self.frequency, self.interval, limit)
+
+    def to_rrule(self):
+        return f'FREQ={self.frequency.upper()};INTERVAL={self.interval}'
+
+class CalendarRule(Rule):
+    # Fires at every `times` time of day on days matching the calendar fields:
+    #   months      allowed months (1-12), or None for all
+    #   monthdays   days of the month (negative counts from the end, -1 is the last day), or None
+    #   weekdays    (weekday, nth) pairs; nth 0 is every such weekday, 1 the first, -1 the last in the month
+    # When both monthdays and weekdays are given a day must match both (day_match='and', as in RRULE)
+    # or either (day_match='or', as in cron). With a frequency and interval > 1, only every interval-th
+    # day/week/month/year counted from start is used. Any field may be FROM_START.
+    def __init__(self, months=None, monthdays=None, weekdays=None, hours=FROM_START, minutes=FROM_START,
+                 seconds=FROM_START, day_match='and', frequency=None, interval=1, text=None):
+        if interval < 1:
+            raise ValueError(f"Invalid interval {interval}")
+        self.months = months
+        self.monthdays = monthdays
+        self.weekdays = weekdays
+        self.hours = hours
+        self.minutes = minutes
+        self.seconds = seconds
+        self.day_match = day_match
+        self.frequency = frequency
+        self.interval = interval
+        self.text = text
+        self.anchored = FROM_START in (months, monthdays, weekdays, hours, minutes, seconds)
+        self.times = None
+        if not self.anchored:
+            self.times = tuple(sorted({hour * 3600 + minute * 60 + second for hour in hours for minute in minutes for second in seconds}))
+        self.month_tables = {}
+        self.bound_rules = {}
+
+    def _bound(self, start):
+        # The rule with FROM_START fields filled in from start; cached per distinct anchor
+        if not self.anchored:
+            return self
+        key = (start.month, start.day, start.weekday(), start.hour, start.minute, start.second)
+        rule = self.bound_rules.get(key)
+        if rule is None:
+            pick = lambda value, anchor: (anchor,) if value == FROM_START else value
+            rule = CalendarRule(
+                pick(self.months, start.month), pick(self.monthdays, start.day), pick(self.weekdays, (start.weekday(), 0)),
+                pick(self.hours, start.hour), pick(self.minutes, start.minute), pick(self.seconds, start.second),
+                self.day_match, self.frequency, self.interval, self.text
+            )
+            if len(self.bound_rules) < 4096:
+                self.bound_rules[key] = rule
+        return rule
+
+    def _month_days(self, year, month):
+        # Sorted days of this month that match the day fields (ignoring the interval)
+        key = year * 12 + month
+        days = self.month_tables.get(key)
+        if days is not None:
+            return days
+        if self.months is not None and month not in self.months:
+            days = ()
+        else:
+            length = month_length(year, month)
+            by_monthday = None
+            if self.monthdays is not None:
+                by_monthday = {day if day > 0 else length + 1 + day for day in self.monthdays}
+                by_monthday = {day for day in by_monthday if 1 <= day <= length}
+            by_weekday = None
+            if self.weekdays is not None:
+                by_weekday = set()
+                first = first_weekday(year, month)
+                for weekday, nth in self.weekdays:
+                    matching = range(1 + (weekday - first) % 7, length + 1, 7)
+                    if nth == 0:
+                        by_weekday.update(matching)
+                    elif -len(matching) <= nth <= len(matching):
+                        by_weekday.add(matching[nth - 1 if nth > 0 else nth])
+            if by_monthday is None and by_weekday is None:
+                days = tuple(range(1, length + 1))
+            elif by_monthday is None or by_weekday is None:
+                days = tuple(sorted(by_monthday if by_weekday is None else by_weekday))
+            elif self.day_match == 'or':
+                days = tuple(sorted(by_monthday | by_weekday))
+            else:
+                days = tuple(sorted(by_monthday & by_weekday))
+        if len(self.month_tables) < 4800:
+            self.month_tables[key] = days
+        return days
+
+    def _month_in_phase(self, start, year, month):
+        if self.interval == 1:
+            return True
+        if self.frequency == 'monthly':
+            return ((year - start.year) * 12 + month - start.month) % self.interval == 0
+        if self.frequency == 'yearly':
+            return (year - start.year) % self.interval == 0
+        return True
+
+    def _day_in_phase(self, start, day):
+        if self.interval == 1:
+            return True
+        if self.frequency == 'daily':
+            return (day.toordinal() - start.toordinal()) % self.interval == 0
+        if self.frequency == 'weekly':
+            # Weeks start on Monday
+            return ((day.toordinal() - day.weekday()) - (start.toordinal() - start.weekday())) // 7 % self.interval == 0
+        return True
+
+    def _days(self, start, year, month):
+        # Matching days of one month that are also in phase with the interval
+        if not self._month_in_phase(start, year, month):
+            return ()
+        days = self._month_days(year, month)
+        if self.interval > 1 and self.frequency in ('daily', 'weekly'):
+            days = tuple(day for day in days if self._day_in_phase(start, date(year, month, day)))
+        return days
+
+    def next_after(self, start, after):
+        if after < start:
+            return start
+        return self._bound(start)._next(start, after)
+
+    def _next(self, start, after):
+        times = self.times
+        year, month = after.year, after.month
+        days = self._days(start, year, month)
+        index = bisect_left(days, after.day)
+        if index < len(days) and days[index] == after.day:
+            later = bisect_right(times, after.hour * 3600 + after.minute * 60 + after.second)
+            if later < len(times):
+                return self._at(year, month, after.day, times[later])
+            index += 1
+        if index < len(days):
+            return self._at(year, month, days[index], times[0])
+        for _ in range(MAX_SEARCH_MONTHS):
+            month += 1
+            if month > 12:
+                year, month = year + 1, 1
+            days = self._days(start, year, month)
+            if days:
+                return self._at(year, month, days[0], times[0])
+        return None
+
+    def _at(self, year, month, day, seconds):
+        return datetime(year, month, day, seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+    def count_through(self, start, limit):
+        if limit < start:
+            return 0, start
+        rule = self._bound(start)
+        return 1 + rule._count(start, start, limit), rule._next(start, limit)
+
+    def _count(self, start, after, limit):
+        # Occurrences in (after, limit], a month table at a time
+        times = self.times
+        first_day, last_day = after.date(), limit.date()
+        after_seconds = after.hour * 3600 + after.minute * 60 + after.second
+        limit_seconds = limit.hour * 3600 + limit.minute * 60 + limit.second
+        count = 0
+        year, month = after.year, after.month
+        while (year, month) <= (limit.year, limit.month):
+            for day in self._days(start, year, month):
+                current = date(year, month, day)
+                if current < first_day or current > last_day:
+                    continue
+                low = bisect_right(times, after_seconds) if current == first_day else 0
+                high = bisect_right(times, limit_seconds) if current == last_day else len(times)
+                count += max(0, high - low)
+            month += 1
+            if month > 12:
+                year, month = year + 1, 1
+        return count
+
+    def to_rrule(self):
+        if self.day_match == 'or' and self.monthdays is not None and self.weekdays is not None:
+            return None
+        frequency = self.frequency
+        if frequency is None:
+            if self.months is not None:
+                frequency = 'yearly'
+            elif self.monthdays is not None or any(nth for weekday, nth in self.weekdays or ()):
+                frequency = 'monthly'
+            elif self.weekdays is not None:
+                frequency = 'weekly'
+            else:
+                frequency = 'daily'
+        parts = [f'FREQ={frequency.upper()}']
+        if self.interval > 1:
+            parts.append(f'INTERVAL={self.interval}')
+        join = lambda values: ','.join(str(value) for value in sorted(values))
+        if self.months not in (None, FROM_START):
+            parts.append(f'BYMONTH={join(self.months)}')
+        if self.monthdays not in (None, FROM_START):
+            parts.append(f'BYMONTHDAY={join(self.monthdays)}')
+        if self.weekdays not in (None, FROM_START):
+            parts.append('BYDAY=' + ','.join(f"{nth or ''}{WEEKDAY_CODES[weekday]}" for weekday, nth in sorted(self.weekdays)))
+        for name, values in (('BYHOUR', self.hours), ('BYMINUTE', self.minutes), ('BYSECOND', self.seconds)):
+            if values != FROM_START:
+                parts.append(f'{name}={join(values)}')
+        return ';'.join(parts)
+
+# Parsers: each returns a Rule or raises ValueError
+
+def _int_list(value, low, high, name, negative=False):
+    # negative=True also accepts -high..-low (counting from the end)
+    try:
+        numbers = tuple(int(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError(f"invalid {name} '{value}'")
+    for number in numbers:
+        if not (low <= (abs(number) if negative else number) <= high):
+            raise ValueError(f"invalid {name} '{value}'")
+    return numbers
+
+BYDAY_RE = re.compile(r'([+-]?\d{1,2})?(MO|TU|WE|TH|FR|SA|SU)')
+
+def compile_rrule(text, interval=1):
+    body = text[6:] if text.upper().startswith('RRULE:') else text
+    parts = {}
+    for part in body.split(';'):
+        if part:
+            name, _, value = part.partition('=')
+            parts[name.strip().upper()] = value.strip().upper()
+    frequency = parts.pop('FREQ', '').lower()
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"unsupported FREQ '{frequency.upper()}'")
+    try:
+        interval = int(parts.pop('INTERVAL', interval))
+    except ValueError:
+        raise ValueError("invalid INTERVAL")
+    parts.pop('WKST', None)
+    if 'UNTIL' in parts or 'COUNT' in parts:
+        raise ValueError("UNTIL and COUNT are not supported; use the reminder's recurrence end")
+    known = ('BYMONTH', 'BYMONTHDAY', 'BYDAY', 'BYHOUR', 'BYMINUTE', 'BYSECOND')
+    unknown = [name for name in parts if name not in known]
+    if unknown:
+        raise ValueError(f"unsupported rule part '{unknown[0]}'")
+    if not parts:
+        return IntervalRule(frequency, interval, text)
+
+    months = _int_list(parts['BYMONTH'], 1, 12, 'BYMONTH') if 'BYMONTH' in parts else None
+    monthdays = _int_list(parts['BYMONTHDAY'], 1, 31, 'BYMONTHDAY', negative=True) if 'BYMONTHDAY' in parts else None
+    weekdays = None
+    if 'BYDAY' in parts:
+        weekdays = []
+        for item in parts['BYDAY'].split(','):
+            match = BYDAY_RE.fullmatch(item)
+            if not match or (match.group(1) and not 1 <= abs(int(match.group(1))) <= 5):
+                raise ValueError(f"invalid BYDAY '{item}'")
+            nth = int(match.group(1) or 0)
+            if nth and (frequency in ('daily', 'weekly') or (frequency == 'yearly' and months is None)):
+                raise ValueError(f"BYDAY '{item}' needs FREQ=MONTHLY (or YEARLY with BYMONTH)")
+            weekdays.append((WEEKDAY_CODES.index(match.group(2)), nth))
+        weekdays = tuple(weekdays)
+    if frequency == 'weekly' and monthdays is not None:
+        raise ValueError("BYMONTHDAY can't be used with FREQ=WEEKLY")
+    # Missing day fields come from start, as RRULE takes them from DTSTART
+    if frequency == 'weekly' and weekdays is None:
+        weekdays = FROM_START
+    elif frequency == 'monthly' and weekdays is None and monthdays is None:
+        monthdays = FROM_START
+    elif frequency == 'yearly' and weekdays is None and monthdays is None:
+        monthdays = FROM_START
+        if months is None:
+            months = FROM_START
+    return CalendarRule(
+        months, monthdays, weekdays,
+        _int_list(parts['BYHOUR'], 0, 23, 'BYHOUR') if 'BYHOUR' in parts else FROM_START,
+        _int_list(parts['BYMINUTE'], 0, 59, 'BYMINUTE') if 'BYMINUTE' in parts else FROM_START,
+        _int_list(parts['BYSECOND'], 0, 59, 'BYSECOND') if 'BYSECOND' in parts else FROM_START,
+        'and', frequency, interval, text
+    )
+
+def _cron_field(value, low, high, names=None):
+    # Returns the allowed values, or None for '*'
+    if value in ('*', '?'):
+        return None
+    allowed = set()
+    for item in value.split(','):
+        item, _, step = item.partition('/')
+        if item == '*':
+            first, last = low, high
+        else:
+            first, _, last = item.partition('-')
+            try:
+                first = names[first] if names and first in names else int(first)
+                last = (names[last] if names and last in names else int(last)) if last else (high if step else first)
+            except ValueError:
+                raise ValueError(f"invalid cron field '{value}'")
+        if not (low <= first <= high and low <= last <= high and first <= last):
+            raise ValueError(f"cron field '{value}' out of range")
+        try:
+            step = int(step) if step else 1
+        except ValueError:
+            raise ValueError(f"invalid cron step in '{value}'")
+        if step < 1:
+            raise ValueError(f"invalid cron step in '{value}'")
+        allowed.update(range(first, last + 1, step))
+    return tuple(sorted(allowed))
+
+CRON_DAY_NAMES = {name: (number + 1) % 7 for name, number in WEEKDAY_NAMES.items() if len(name) == 3}
+CRON_FIELD_RE = re.compile(r'[\d*,/-]+')
+
+def compile_cron(text):
+    fields = CRON_MACROS.get(text.strip().lower(), text).lower().split()
+    if len(fields) != 5:
+        raise ValueError("a cron expression has five fields: minute hour day-of-month month day-of-week")
+    minute, hour, monthday, month, weekday = fields
+    minutes = _cron_field(minute, 0, 59) or tuple(range(60))
+    hours = _cron_field(hour, 0, 23) or tuple(range(24))
+    monthdays = _cron_field(monthday, 1, 31)
+    months = _cron_field(month, 1, 12, MONTH_NAMES)
+    cron_weekdays = _cron_field(weekday, 0, 7, CRON_DAY_NAMES)
+    # cron counts days from Sunday (0 or 7)
+    weekdays = None if cron_weekdays is None else tuple(sorted({((day - 1) % 7, 0) for day in cron_weekdays}))
+    return CalendarRule(months, monthdays, weekdays, hours, minutes, (0,), 'or', None, 1, text)
+
+def is_cron(text):
+    fields = text.split()
+    return text.strip().lower() in CRON_MACROS or (len(fields) == 5 and all(CRON_FIELD_RE.fullmatch(field) for field in fields[:2]))
+
+# Phrases
+
+TIME_PATTERN = r'(?:at\s+)?(?P<time>noon|midnight|\d{1,2}(?::\d{2})?\s*(?:am|pm)?)'
+DAY_LIST_PATTERN = r'(?:[a-z]+)(?:\s*(?:,|and|&)\s*(?:and\s+)?[a-z]+)*'
+EVERY_RE = re.compile(rf'^(?:every|each)\s+(?:(?P<count>\d+|other)\s+)?(?P<unit>{DAY_LIST_PATTERN})(?:\s+{TIME_PATTERN})?$')
+NTH_WEEKDAY_RE = re.compile(
+    rf'^(?:on\s+)?(?:the\s+)?(?P<nth>{"|".join(ORDINALS)})\s+(?P<day>[a-z]+)\s+of\s+(?:the|every|each)\s+month(?:\s+{TIME_PATTERN})?$'
+)
+MONTHDAY_RE = re.compile(
+    rf'^(?:every|each)\s+month\s+on\s+the\s+(?P<day>\d{{1,2}})(?:st|nd|rd|th)?(?:\s+{TIME_PATTERN})?$'
+)
+UNIT_FREQUENCIES = {'day': 'daily', 'week': 'weekly', 'month': 'monthly', 'year': 'yearly'}
+
+def _parse_phrase_time(value):
+    # (hours, minutes, seconds) for a time of day, or FROM_START for all three when there is none
+    if value is None:
+        return FROM_START, FROM_START, FROM_START
+    if value in ('noon', 'midnight'):
+        return (12 if value == 'noon' else 0,), (0,), (0,)
+    match = re.fullmatch(r'(\d{1,2})(?::(\d{2}))?\s*(am|pm)?', value)
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            raise ValueError(f"invalid time '{value}'")
+        hour = hour % 12 + (12 if meridiem == 'pm' else 0)
+    if hour > 23 or minute > 59:
+        raise ValueError(f"invalid time '{value}'")
+    return (hour,), (minute,), (0,)
+
+def _weekday(name):
+    name = name[:-1] if name.endswith('s') and name[:-1] in WEEKDAY_NAMES else name
+    if name not in WEEKDAY_NAMES:
+        raise ValueError(f"unknown day '{name}'")
+    return WEEKDAY_NAMES[name]
+
+def compile_phrase(text, interval=1):
+    phrase = ' '.join(text.lower().split())
+    match = EVERY_RE.match(phrase)
+    if match:
+        count = match.group('count')
+        interval = 2 if count == 'other' else int(count) if count else interval
+        hours, minutes, seconds = _parse_phrase_time(match.group('time'))
+        unit = match.group('unit')
+        singular = unit[:-1] if unit.endswith('s') else unit
+        if singular in UNIT_FREQUENCIES:
+            frequency = UNIT_FREQUENCIES[singular]
+            if hours == FROM_START:
+                return IntervalRule(frequency, interval, text)
+            # "every week at 9": the day comes from start, like an RRULE without BYDAY/BYMONTHDAY
+            weekdays = FROM_START if frequency == 'weekly' else None
+            monthdays = FROM_START if frequency in ('monthly', 'yearly') else None
+            months = FROM_START if frequency == 'yearly' else None
+            return CalendarRule(months, monthdays, weekdays, hours, minutes, seconds, 'and', frequency, interval, text)
+        if singular == 'weekday':
+            weekdays = tuple((day, 0) for day in range(5))
+        elif singular == 'weekend':
+            weekdays = ((5, 0), (6, 0))
+        else:
+            weekdays = tuple(sorted({(_weekday(name), 0) for name in re.split(r'\s*(?:,|&|\band\b)\s*', unit) if name}))
+        return CalendarRule(None, None, weekdays, hours, minutes, seconds, 'and', 'weekly', interval, text)
+    match = NTH_WEEKDAY_RE.match(phrase)
+    if match:
+        hours, minutes, seconds = _parse_phrase_time(match.group('time'))
+        nth = ORDINALS[match.group('nth')]
+        if match.group('day') == 'day':
+            return CalendarRule(None, (nth,), None, hours, minutes, seconds, 'and', 'monthly', interval, text)
+        return CalendarRule(None, None, ((_weekday(match.group('day')), nth),), hours, minutes, seconds, 'and', 'monthly', interval, text)
+    match = MONTHDAY_RE.match(phrase)
+    if match:
+        day = int(match.group('day'))
+        if not 1 <= day <= 31:
+            raise ValueError(f"invalid day of the month '{day}'")
+        hours, minutes, seconds = _parse_phrase_time(match.group('time'))
+        return CalendarRule(None, (day,), None, hours, minutes, seconds, 'and', 'monthly', interval, text)
+    raise ValueError(f"Unknown recurrence pattern: '{text}'")
+
+@lru_cache(maxsize=1024)
+def compile_rule(recurrence, interval=1):
+    # Compiles a reminder's recurrence (and its recurrence_interval, used when the rule doesn't set one).
+    # Cached, so reminders sharing a rule share one compiled object and its day tables.
+    text = recurrence.strip()
+    lower = text.lower()
+    if lower in FREQUENCIES:
+        return IntervalRule(lower, interval)
+    if lower.startswith('rrule:') or lower.startswith('freq='):
+        return compile_rrule(text, interval)
+    if is_cron(lower):
+        if interval != 1:
+            raise ValueError("cron expressions don't take an interval")
+        return compile_cron(text)
+    return compile_phrase(text, interval)
+
+def is_frequency(recurrence):
+    # True for the plain frequency words, which repeat every recurrence_interval periods
+    return recurrence is not None and recurrence.strip().lower() in FREQUENCIES
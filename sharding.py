@@ -0,0 +1,347 @@
+#This file will contain the multi-tenant reminder store sharded across several SQLite files.
+
+#sharding.py:
+# Contains ShardedReminderStore, which places each tenant's reminders in one of several database files (one
+# ReminderManager per shard), so writes for tenants on different shards never wait on the same write lock.
+# Contains ShardedScheduler, which runs one Scheduler per shard.
+# Tenants are placed by rendezvous hashing over the shard names, so adding a shard only claims about 1/N of
+# the tenants. Placements that differ from the hash (after a rebalance, or for tenants pinned while a new
+# shard fills up) are kept in placement.db next to the shard files.
+#
+# Usage (rebalancing tool):
+#   python sharding.py --dir shards stats
+#   python sharding.py --dir shards rebalance [--max-skew 0.1] [--dry-run]
+#   python sharding.py --dir shards move TENANT SHARD
+#   python sharding.py --dir shards add-shard
+# --shards N sets the number of shards when the directory is first created.
+
+import argparse
+import hashlib
+import heapq
+import logging
+import os
+from itertools import islice
+
+from database import ConnectionPool
+from managers import ReminderManager, Scheduler
+
+DEFAULT_SHARDS = 4
+
+# Sorts after every real rowid, for cursors that must skip a whole fire time on a shard
+MAX_ID = 2 ** 63 - 1
+
+class TenantRequiredError(ValueError):
+    pass
+
+def rendezvous_shard(tenant, names):
+    # Highest-random-weight hashing: every shard scores the tenant and the highest score wins, so removing
+    # or adding one shard only moves the tenants that it wins or loses
+    return max(names, key=lambda name: hashlib.blake2b(f'{name}\0{tenant}'.encode('utf-8'), digest_size=8).digest())
+
+class ShardedReminderStore:
+    def __init__(self, directory, shards=DEFAULT_SHARDS, **manager_options):
+        # Opens (or creates with `shards` shards) the store in `directory`. An existing store keeps its own
+        # shard list. manager_options (durability, clock, history_retention_days, ...) go to every shard's
+        # ReminderManager. Offers the ReminderManager methods the API uses, routed by tenant.
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.manager_options = manager_options
+        self.placement_pool = ConnectionPool(os.path.join(directory, 'placement.db'))
+        with self.placement_pool.write() as cursor:
+            cursor.execute('CREATE TABLE IF NOT EXISTS shards (position INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)')
+            cursor.execute('CREATE TABLE IF NOT EXISTS placements (tenant TEXT PRIMARY KEY, shard TEXT NOT NULL)')
+            cursor.execute('SELECT COUNT(*) FROM shards')
+            if cursor.fetchone()[0] == 0:
+                cursor.executemany('INSERT INTO shards (position, name) VALUES (?, ?)', [(i, f'shard-{i:02d}') for i in range(shards)])
+            cursor.execute('SELECT name FROM shards ORDER BY position')
+            self.names = [row[0] for row in cursor.fetchall()]
+        self.positions = {name: position for position, name in enumerate(self.names)}
+        self.managers = [self._open_shard(name) for name in self.names]
+        self.clock = self.managers[0].clock
+        self.hashed = {}
+        self.refresh_placements()
+
+    def _open_shard(self, name):
+        return ReminderManager(os.path.join(self.directory, f'{name}.db'), **self.manager_options)
+
+    def refresh_placements(self):
+        # Reloads placement overrides, e.g. after another process rebalanced the store
+        with self.placement_pool.read() as cursor:
+            cursor.execute('SELECT tenant, shard FROM placements')
+            self.placements = dict(cursor.fetchall())
+
+    def shard_for(self, tenant):
+        # Index of the shard that holds `tenant`
+        if tenant is None:
+            raise TenantRequiredError("a sharded store needs a tenant")
+        name = self.placements.get(tenant)
+        if name is None:
+            name = self.hashed.get(tenant)
+            if name is None:
+                name = self.hashed[tenant] = rendezvous_shard(tenant, self.names)
+        return self.positions[name]
+
+    def manager_for(self, tenant):
+        return self.managers[self.shard_for(tenant)]
+
+    # Writes and single-reminder lookups go to the tenant's shard
+
+    def add_reminder(self, reminder):
+        return self.manager_for(reminder.tenant).add_reminder(reminder)
+
+    def add_reminders_bulk(self, rows, tenant=None):
+        return self.manager_for(tenant).add_reminders_bulk(rows, tenant)
+
+    def update_reminder(self, reminder):
+        return self.manager_for(reminder.tenant).update_reminder(reminder)
+
+    def delete_reminder(self, reminder_id, tenant=None):
+        return self.manager_for(tenant).delete_reminder(reminder_id, tenant)
+
+    def get_reminder(self, reminder_id, tenant=None):
+        return self.manager_for(tenant).get_reminder(reminder_id, tenant)
+
+    # Reads without a tenant merge every shard
+
+    def get_upcoming_page(self, after=None, page_size=50, recurring_only=False, start=None, end=None, tenant=None):
+        # Same contract as ReminderManager.get_upcoming_page. Without a tenant the shards are merged in
+        # (fire_at, shard, id) order and the cursor is that triple.
+        if tenant is not None:
+            return self.manager_for(tenant).get_upcoming_page(after, page_size, recurring_only, start, end, tenant)
+        pages = []
+        more = False
+        for position, manager in enumerate(self.managers):
+            shard_after = None
+            if after is not None:
+                fire_at, after_position, reminder_id = after
+                if position < after_position:
+                    shard_after = (fire_at, MAX_ID)
+                elif position == after_position:
+                    shard_after = (fire_at, reminder_id)
+                else:
+                    shard_after = (fire_at, 0)
+            page, cursor = manager.get_upcoming_page(shard_after, page_size, recurring_only, start, end)
+            pages.append([(reminder.fire_at, position, reminder.id, reminder) for reminder in page])
+            more = more or cursor is not None
+        merged = list(heapq.merge(*pages))
+        taken = merged[:page_size]
+        next_cursor = None
+        if taken and (more or len(merged) > page_size):
+            next_cursor = taken[-1][:3]
+        return [entry[3] for entry in taken], next_cursor
+
+    def iter_upcoming_reminders(self, page_size=500, recurring_only=False, start=None, end=None, tenant=None):
+        # Upcoming reminders of every shard as one stream in fire order
+        if tenant is not None:
+            return self.manager_for(tenant).iter_upcoming_reminders(page_size, recurring_only, start, end, tenant)
+        return heapq.merge(
+            *(manager.iter_upcoming_reminders(page_size, recurring_only, start, end) for manager in self.managers),
+            key=lambda reminder: reminder.fire_at
+        )
+
+    def next_due(self, limit=10):
+        # The next `limit` reminders to fire across all shards
+        return list(islice(self.iter_upcoming_reminders(page_size=limit), limit))
+
+    def get_due_reminders(self, limit=None):
+        due = heapq.merge(*(manager.get_due_reminders(limit) for manager in self.managers), key=lambda reminder: reminder.fire_at)
+        return list(islice(due, limit))
+
+    def search_reminders(self, query, limit=20, tenant=None):
+        # Without a tenant every shard is searched and the matches are merged by bm25 rank, then fire time.
+        # Each shard scores against its own index statistics, which is close enough for shards of similar size.
+        if tenant is not None:
+            return self.manager_for(tenant).search_reminders(query, limit, tenant)
+        matches = [match for manager in self.managers for match in manager.search_ranked(query, limit)]
+        matches.sort(key=lambda match: (match[0], match[1].fire_at))
+        return [reminder for _, reminder in matches[:limit]]
+
+    def get_history(self, start=None, end=None, reminder_id=None, limit=100, tenant=None):
+        # History stays on the shard where the reminder fired, so a moved tenant's history spans shards
+        entries = [entry for manager in self.managers for entry in manager.get_history(start, end, reminder_id, limit, tenant)]
+        return sorted(entries, key=lambda entry: entry[1], reverse=True)[:limit]
+
+    def purge_history(self, retention_days=None):
+        return sum(manager.purge_history(retention_days) for manager in self.managers)
+
+    def add_listener(self, listener):
+        for manager in self.managers:
+            manager.add_listener(listener)
+
+    def flush(self):
+        for manager in self.managers:
+            manager.flush()
+
+    def close(self):
+        for manager in self.managers:
+            manager.close()
+        self.placement_pool.close()
+
+    # Rebalancing
+
+    def shard_loads(self):
+        # [{tenant: pending reminders}] per shard, in shard order
+        return [manager.get_tenant_counts() for manager in self.managers]
+
+    def _place(self, tenant, position):
+        # Only placements that differ from the hash are stored
+        name = self.names[position]
+        hashed = rendezvous_shard(tenant, self.names) == name
+        with self.placement_pool.write() as cursor:
+            if hashed:
+                cursor.execute('DELETE FROM placements WHERE tenant = ?', (tenant,))
+            else:
+                cursor.execute('INSERT OR REPLACE INTO placements (tenant, shard) VALUES (?, ?)', (tenant, name))
+        if hashed:
+            self.placements.pop(tenant, None)
+        else:
+            self.placements[tenant] = name
+
+    def _move(self, tenant, source, target):
+        # New writes are routed to the target first; rows written to the source by a process that had not
+        # seen the new placement yet are swept up by the next rebalance
+        self._place(tenant, target)
+        return self.managers[target].move_tenant_from(self.managers[source], tenant)
+
+    def move_tenant(self, tenant, target):
+        # Moves a tenant's pending reminders to shard `target` (index or name); returns how many moved
+        if not isinstance(target, int):
+            target = self.positions[target]
+        source = self.shard_for(tenant)
+        if source == target:
+            return 0
+        return self._move(tenant, source, target)
+
+    def plan_rebalance(self, max_skew=0.1):
+        # Returns the (tenant, source, target, reminders) moves that put every tenant's rows on its placed shard,
+        # then even out the shards until the fullest holds at most (1 + max_skew) times the average
+        loads = self.shard_loads()
+        moves = []
+        placement = {}
+        for position, counts in enumerate(loads):
+            for tenant, count in counts.items():
+                if tenant is None:
+                    continue
+                target = self.shard_for(tenant)
+                placement[tenant] = target
+                if target != position:
+                    moves.append((tenant, position, target, count))
+        totals = [0] * len(loads)
+        tenants = [{} for _ in loads]
+        for position, counts in enumerate(loads):
+            for tenant, count in counts.items():
+                home = placement.get(tenant, position)
+                totals[home] += count
+                tenants[home][tenant] = tenants[home].get(tenant, 0) + count
+        average = sum(totals) / len(totals)
+        while True:
+            heavy = max(range(len(totals)), key=totals.__getitem__)
+            light = min(range(len(totals)), key=totals.__getitem__)
+            gap = totals[heavy] - totals[light]
+            if totals[heavy] <= average * (1 + max_skew) or gap <= 1:
+                break
+            # The tenant closest to half the gap narrows it most; anything as large as the gap would not help
+            candidates = [(abs(count - gap / 2), tenant) for tenant, count in tenants[heavy].items() if tenant is not None and count < gap]
+            if not candidates:
+                break
+            tenant = min(candidates)[1]
+            count = tenants[heavy].pop(tenant)
+            tenants[light][tenant] = count
+            totals[heavy] -= count
+            totals[light] += count
+            moves.append((tenant, heavy, light, count))
+        return moves
+
+    def rebalance(self, max_skew=0.1, dry_run=False):
+        # Plans and (unless dry_run) performs the moves from plan_rebalance; returns them with shard names
+        moves = self.plan_rebalance(max_skew)
+        if not dry_run:
+            for tenant, source, target, count in moves:
+                self._move(tenant, source, target)
+        return [(tenant, self.names[source], self.names[target], count) for tenant, source, target, count in moves]
+
+    def add_shard(self):
+        # Adds an empty shard and returns its index. Tenants that the new shard wins by hash are pinned to
+        # their current shard so they stay reachable; rebalance() then moves tenants onto it.
+        name = f'shard-{len(self.names):02d}'
+        names = self.names + [name]
+        pinned = [
+            (tenant, self.names[position])
+            for position, counts in enumerate(self.shard_loads())
+            for tenant in counts
+            if tenant is not None and tenant not in self.placements and rendezvous_shard(tenant, names) == name
+        ]
+        with self.placement_pool.write() as cursor:
+            cursor.executemany('INSERT OR REPLACE INTO placements (tenant, shard) VALUES (?, ?)', pinned)
+            cursor.execute('INSERT INTO shards (position, name) VALUES (?, ?)', (len(self.names), name))
+        self.placements.update(pinned)
+        self.names = names
+        self.positions[name] = len(names) - 1
+        self.managers.append(self._open_shard(name))
+        self.hashed = {}
+        logging.info("Added %s; pinned %d tenants to their current shards.", name, len(pinned))
+        return len(names) - 1
+
+class ShardedScheduler:
+    def __init__(self, store, notifier, **scheduler_options):
+        # One Scheduler (with its own thread, fire queue and claims) per shard; scheduler_options go to each.
+        # A worker_id is suffixed with the shard name so claims stay distinct per shard.
+        worker_id = scheduler_options.pop('worker_id', None)
+        self.schedulers = [
+            Scheduler(manager, notifier, worker_id=f'{worker_id}/{name}' if worker_id else None, **scheduler_options)
+            for name, manager in zip(store.names, store.managers)
+        ]
+
+    def start(self):
+        for scheduler in self.schedulers:
+            scheduler.start()
+
+    def stop(self, timeout=10):
+        # Every scheduler is told to stop before any is waited for, so their last batches finish together
+        for scheduler in self.schedulers:
+            scheduler.running = False
+            scheduler.stopping.set()
+        for scheduler in self.schedulers:
+            scheduler.stop(timeout)
+
+    def check_reminders(self):
+        for scheduler in self.schedulers:
+            scheduler.check_reminders()
+
+def main(argv=None):
+    from logging_setup import configure_logging
+
+    parser = argparse.ArgumentParser(description="Inspect and rebalance a sharded reminder store.")
+    parser.add_argument('--dir', default='shards', help="directory holding placement.db and the shard files")
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS, help="number of shards for a new store")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help="reminders and tenants per shard")
+    rebalance = commands.add_parser('rebalance', help="move tenants until the shards are even")
+    rebalance.add_argument('--max-skew', type=float, default=0.1, help="allowed excess of the fullest shard over the average")
+    rebalance.add_argument('--dry-run', action='store_true')
+    move = commands.add_parser('move', help="move one tenant to another shard")
+    move.add_argument('tenant')
+    move.add_argument('shard', help="shard name or index")
+    commands.add_parser('add-shard', help="add an empty shard (run rebalance afterwards)")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    store = ShardedReminderStore(args.dir, args.shards)
+    try:
+        if args.command == 'rebalance':
+            moves = store.rebalance(args.max_skew, args.dry_run)
+            for tenant, source, target, count in moves:
+                print(f"{'Would move' if args.dry_run else 'Moved'} {tenant} ({count} reminders): {source} -> {target}")
+            print(f"{len(moves)} tenant move(s).")
+        elif args.command == 'move':
+            target = int(args.shard) if args.shard.isdigit() else args.shard
+            print(f"Moved {store.move_tenant(args.tenant, target)} reminders of {args.tenant}.")
+        elif args.command == 'add-shard':
+            print(f"Added {store.names[store.add_shard()]}.")
+        for name, counts in zip(store.names, store.shard_loads()):
+            print(f"{name}: {sum(counts.values())} reminders, {len(counts)} tenants")
+    finally:
+        store.close()
+
+if __name__ == '__main__':
+    main()
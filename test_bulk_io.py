@@ -0,0 +1,84 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from managers import ReminderManager
+from bulk_io import import_file, export_file, import_reminders
+
+@pytest.fixture
+def reminder_manager(tmp_path):
+    manager = ReminderManager(str(tmp_path / 'reminders.db'))
+    yield manager
+    manager.close()
+
+def test_csv_import_validates_and_inserts(reminder_manager, tmp_path):
+    path = tmp_path / 'in.csv'
+    path.write_text(
+        'text,datetime,recurrence,recurrence_interval,recurrence_end,misfire_policy\n'
+        'Pay rent,2099-01-01 09:00:00,monthly,1,2099-12-31 00:00:00,skip\n'
+        'Dentist,2099-02-03T10:30,,,,\n'
+        ',2099-02-03 10:30:00,,,,\n'
+        'Bad time,whenever,,,,\n'
+        'Bad recurrence,2099-02-03 10:30:00,hourly,1,,\n'
+        'Bad rule,2099-02-03 10:30:00,every blursday at 9,1,,\n'
+    )
+    imported, errors = import_file(reminder_manager, str(path))
+    assert imported == 2
+    assert [number for number, _ in errors] == [3, 4, 5, 6]
+    rent, dentist = reminder_manager.get_upcoming_reminders()
+    assert (rent.text, rent.recurrence, rent.recurrence_end, rent.misfire_policy) == ('Pay rent', 'monthly', '2099-12-31 00:00:00', 'skip')
+    assert dentist.datetime == datetime(2099, 2, 3, 10, 30)
+
+def test_imports_in_chunks_and_notifies_listeners(reminder_manager):
+    events = []
+    reminder_manager.add_listener(lambda event, reminder_id, fire_time: events.append((reminder_id, fire_time)))
+    base = datetime(2099, 1, 1)
+    records = ({'text': f'R{i}', 'datetime': (base + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S')} for i in range(25))
+    imported, errors = import_reminders(reminder_manager, records, chunk_size=10)
+    assert (imported, errors) == (25, [])
+    assert [reminder_id for reminder_id, _ in events] == list(range(1, 26))
+    assert events[-1][1] == base + timedelta(minutes=24)
+    assert reminder_manager.get_reminder(25).text == 'R24'
+
+def test_import_spanning_multi_row_statements(reminder_manager):
+    base = datetime(2099, 1, 1)
+    records = [{'text': f'Task {i}', 'datetime': (base + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'), 'recurrence': 'weekly' if i % 2 else ''} for i in range(250)]
+    records.insert(7, {'text': 'Odd interval', 'datetime': '2099-01-01 00:00:00', 'recurrence': 'daily', 'recurrence_interval': [2]})
+    imported, errors = import_reminders(reminder_manager, records, tenant='acme')
+    assert imported == 250 and [number for number, _ in errors] == [8]
+    stored = list(reminder_manager.iter_rows())
+    assert [row[1] for row in stored] == [f'Task {i}' for i in range(250)]
+    assert {row[8] for row in stored} == {'acme'}
+    assert [r.text for r in reminder_manager.search_reminders('task 249', tenant='acme')] == ['Task 249']
+
+@pytest.mark.parametrize('extension', ['.csv', '.jsonl', '.ics'])
+def test_export_import_round_trip(reminder_manager, tmp_path, extension):
+    records = [
+        {'text': 'Standup, daily; with "quotes"', 'datetime': '2099-01-01 09:00:00', 'recurrence': 'daily', 'recurrence_interval': 2, 'recurrence_end': '2099-06-01 09:00:00'},
+        {'text': 'One-off', 'datetime': '2099-03-04 05:06:07'},
+        {'text': 'Gym', 'datetime': '2099-01-02 09:00:00', 'recurrence': 'every mon, wed and fri at 9', 'recurrence_end': '2099-06-01 09:00:00'},
+        {'text': 'Board meeting', 'datetime': '2099-01-05 10:00:00', 'recurrence': 'FREQ=MONTHLY;BYDAY=1MO;BYHOUR=10'},
+        {'text': 'Lucky day', 'datetime': '2099-01-01 00:00:00', 'recurrence': '0 0 13 * 5'}
+    ]
+    assert import_reminders(reminder_manager, records) == (5, [])
+    path = str(tmp_path / ('out' + extension))
+    assert export_file(reminder_manager, path) == 5
+
+    target = ReminderManager(str(tmp_path / 'copy.db'))
+    try:
+        imported, errors = import_file(target, path)
+        assert (imported, errors) == (5, [])
+        assert list(target.iter_rows()) == list(reminder_manager.iter_rows())
+    finally:
+        target.close()
+
+def test_ics_utc_times_are_converted_to_local(reminder_manager, tmp_path):
+    path = tmp_path / 'in.ics'
+    path.write_text(
+        'BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nDTSTART:20990101T120000Z\r\n'
+        'SUMMARY:Long summary that was\r\n  folded\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n'
+    )
+    assert import_file(reminder_manager, str(path)) == (1, [])
+    [reminder] = reminder_manager.get_upcoming_reminders()
+    assert reminder.text == 'Long summary that was folded'
+    expected = datetime(2099, 1, 1, 12, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert reminder.datetime == expected
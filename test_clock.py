@@ -0,0 +1,25 @@
+import threading
+from datetime import datetime, timedelta
+
+from clock import SYSTEM_CLOCK, SimulatedClock
+
+def test_system_clock_tracks_wall_time():
+    assert abs((SYSTEM_CLOCK.now() - datetime.now()).total_seconds()) < 1
+
+def test_simulated_clock_only_moves_when_advanced():
+    start = datetime(2024, 2, 28, 23, 59, 30)
+    clock = SimulatedClock(start)
+    assert clock.now() == start and clock.time() == start.timestamp()
+    clock.sleep(60)
+    assert clock.now() == datetime(2024, 2, 29, 0, 0, 30)
+    clock.set(start)  # never goes backwards
+    assert clock.now() == datetime(2024, 2, 29, 0, 0, 30)
+    clock.set(datetime(2025, 1, 1))
+    assert clock.monotonic() == datetime(2025, 1, 1).timestamp()
+
+def test_simulated_wait_elapses_timeout_without_blocking():
+    clock = SimulatedClock(datetime(2024, 1, 1))
+    condition = threading.Condition()
+    with condition:
+        assert clock.wait(condition, 86400 * 365) is False
+    assert clock.now() == datetime(2024, 1, 1) + timedelta(days=365)
@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import pytest
+from datetime import datetime, timedelta
+
+from models import Reminder
+from managers import ReminderManager, Scheduler
+from sharding import ShardedReminderStore
+from daemon import ReminderDaemon
+from client import ReminderClient, ApiError
+
+@pytest.fixture
+def api(tmp_path):
+    manager = ReminderManager(str(tmp_path / 'reminders.db'))
+    daemon = ReminderDaemon(manager, port=0, owned=(manager,)).start()
+    client = ReminderClient(port=daemon.port)
+    yield client, daemon
+    client.close()
+    daemon.stop()
+
+def future(**delta):
+    return (datetime.now().replace(microsecond=0) + timedelta(**delta)).strftime('%Y-%m-%d %H:%M:%S')
+
+def test_add_list_edit_delete(api):
+    client, daemon = api
+    reminder = Reminder(None, 'Water plants', future(days=1), 'weekly', 2)
+    reminder_id = client.add_reminder(reminder)
+    assert reminder_id is not None and reminder.id == reminder_id
+
+    stored = client.get_reminder(reminder_id)
+    assert (stored.text, stored.recurrence, stored.recurrence_interval) == ('Water plants', 'weekly', 2)
+
+    stored.text = 'Water the plants'
+    assert client.update_reminder(stored)
+    page, cursor = client.get_upcoming_page()
+    assert [r.text for r in page] == ['Water the plants'] and cursor is None
+
+    # Partial edits only touch the given fields; times may be natural language
+    result = client.request('PATCH', f'/reminders/{reminder_id}', {'datetime': 'tomorrow at 9am', 'recurrence': None})
+    assert result['reminder']['recurrence'] is None
+    assert result['reminder']['datetime'].endswith('09:00:00')
+
+    assert client.delete_reminder(reminder_id)
+    assert client.get_reminder(reminder_id) is None
+    assert not client.delete_reminder(reminder_id)
+
+def test_paging_and_bulk(api):
+    client, daemon = api
+    records = [{'text': f'Bulk {i}', 'datetime': future(hours=1, seconds=i)} for i in range(25)]
+    imported, errors = client.add_reminders(records + [{'text': 'No time'}])
+    assert imported == 25 and errors == [(26, 'missing datetime')]
+
+    seen = []
+    page, cursor = client.get_upcoming_page(page_size=10)
+    seen += page
+    while cursor is not None:
+        page, cursor = client.get_upcoming_page(after=cursor, page_size=10)
+        seen += page
+    assert [r.text for r in seen] == [f'Bulk {i}' for i in range(25)]
+    assert [r.text for r in client.search_reminders('bulk 7')] == ['Bulk 7']
+
+def test_history(api):
+    client, daemon = api
+    manager = daemon.api.reminder_manager
+    reminder = Reminder(None, 'Fired', future(minutes=-1))
+    manager.add_reminder(reminder)
+    manager.process_due_batch([], [reminder.id])
+
+    [(archived, archived_at, reason)] = client.get_history(reminder_id=reminder.id)
+    assert (archived.id, archived.text, reason) == (reminder.id, 'Fired', 'fired')
+    assert client.get_history(start=archived_at + timedelta(seconds=1)) == []
+    with pytest.raises(ApiError):
+        client.request('GET', '/history?start=yesterday')
+
+def test_errors(api):
+    client, daemon = api
+    with pytest.raises(ApiError) as e:
+        client.request('POST', '/reminders', {'text': 'Bad', 'datetime': future(days=1), 'recurrence': 'hourly'})
+    assert e.value.status == 400
+    with pytest.raises(ApiError) as e:
+        client.request('GET', '/nowhere')
+    assert e.value.status == 404
+    with pytest.raises(ApiError) as e:
+        client.request('PUT', '/reminders')
+    assert e.value.status == 405
+
+def test_concurrent_clients(api):
+    _, daemon = api
+    errors = []
+
+    def worker(n):
+        client = ReminderClient(port=daemon.port)
+        try:
+            for i in range(20):
+                assert client.add_reminder(Reminder(None, f'Client {n} #{i}', future(days=1))) is not None
+                client.get_upcoming_page(page_size=5)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    checker = ReminderClient(port=daemon.port)
+    page, cursor = checker.get_upcoming_page(page_size=1000)
+    checker.close()
+    assert len(page) == 200
+
+def test_sharded_tenants(tmp_path):
+    store = ShardedReminderStore(str(tmp_path / 'shards'), shards=2)
+    daemon = ReminderDaemon(store, port=0, owned=(store,)).start()
+    alice = ReminderClient(port=daemon.port, tenant='alice')
+    bob = ReminderClient(port=daemon.port, tenant='bob')
+    anonymous = ReminderClient(port=daemon.port)
+    try:
+        reminder_id = alice.add_reminder(Reminder(None, 'Alice only', future(days=1)))
+        bob.add_reminder(Reminder(None, 'Bob only', future(days=2)))
+        assert [r.text for r in alice.get_upcoming_page()[0]] == ['Alice only']
+        assert alice.get_reminder(reminder_id).tenant == 'alice'
+        assert [r.text for r in anonymous.get_upcoming_page()[0]] == ['Alice only', 'Bob only']
+        with pytest.raises(ApiError) as e:
+            anonymous.request('POST', '/reminders', {'text': 'Nobody', 'datetime': future(days=1)})
+        assert e.value.status == 400
+    finally:
+        for client in (alice, bob, anonymous):
+            client.close()
+        daemon.stop()
+
+class Owned:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        if self.fail:
+            raise RuntimeError("close failed")
+
+def test_stop_after_serve_was_cancelled(tmp_path):
+    # Like Ctrl-C under asyncio.run(daemon.serve()): the loop is closed by the time stop() runs
+    manager = ReminderManager(str(tmp_path / 'reminders.db'))
+    failing, closing = Owned(fail=True), Owned()
+    daemon = ReminderDaemon(manager, port=0, owned=(failing, closing, manager))
+
+    async def serve_then_cancel():
+        task = asyncio.ensure_future(daemon.serve())
+        await asyncio.get_running_loop().run_in_executor(None, daemon.ready.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(serve_then_cancel())
+    assert daemon.loop.is_closed()
+    daemon.stop()
+    assert failing.closed and closing.closed
+    with pytest.raises(Exception):
+        manager.get_upcoming_reminders()
+
+class BlockingNotifier(Owned):
+    # The first notification blocks until released, holding the scheduler inside its batch
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.sent_after_close = 0
+
+    def send_notification(self, message):
+        self.entered.set()
+        self.release.wait(5)
+        if self.closed:
+            self.sent_after_close += 1
+
+def test_stop_waits_for_the_batch_in_progress(tmp_path):
+    path = str(tmp_path / 'reminders.db')
+    manager = ReminderManager(path)
+    for i in range(30):
+        manager.add_reminder(Reminder(None, f'Due {i}', future(seconds=-2)))
+    notifier = BlockingNotifier()
+    scheduler = Scheduler(manager, notifier, max_batch_size=10)
+    daemon = ReminderDaemon(manager, port=0, owned=(scheduler, notifier, manager)).start()
+    scheduler.start()
+    assert notifier.entered.wait(5)
+
+    stopper = threading.Thread(target=daemon.stop)
+    stopper.start()
+    stopper.join(0.3)
+    # Still waiting for the batch: nothing it needs has been closed yet
+    assert stopper.is_alive() and not notifier.closed
+    notifier.release.set()
+    stopper.join(10)
+
+    assert not stopper.is_alive() and notifier.closed and notifier.sent_after_close == 0
+    # The interrupted batch was settled before the manager closed, and no further batch was claimed
+    reopened = ReminderManager(path)
+    try:
+        assert len(reopened.get_due_reminders()) == 20
+        assert len(reopened.get_history()) == 10
+    finally:
+        reopened.close()
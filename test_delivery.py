@@ -0,0 +1,157 @@
+import threading
+import time
+from datetime import datetime
+
+from delivery import Coalescer, DeliveryQueue, DigestNotifier, LogFileBackend, NotificationBackend
+from clock import SimulatedClock
+
+class FlakyBackend(NotificationBackend):
+    name = 'flaky'
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.sent = []
+
+    def send(self, title, message):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("backend unavailable")
+        self.sent.append((title, message))
+
+class BlockingBackend(NotificationBackend):
+    name = 'blocking'
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def send(self, title, message):
+        self.release.wait(5)
+
+def test_retries_failed_deliveries():
+    backend = FlakyBackend(failures=2)
+    delivery_queue = DeliveryQueue([backend], workers=1, retry_delay=0.01)
+    delivery_queue.start()
+    try:
+        assert delivery_queue.submit("Reminder", "Call mom")
+        delivery_queue.join()
+        assert backend.sent == [("Reminder", "Call mom")]
+    finally:
+        delivery_queue.stop()
+
+def test_gives_up_after_max_retries():
+    backend = FlakyBackend(failures=10)
+    delivery_queue = DeliveryQueue([backend], workers=1, max_retries=2, retry_delay=0.01)
+    delivery_queue.start()
+    try:
+        delivery_queue.submit("Reminder", "Never delivered")
+        delivery_queue.join()
+        assert backend.sent == []
+        assert backend.failures == 7
+    finally:
+        delivery_queue.stop()
+
+def test_submit_applies_backpressure_when_full():
+    backend = BlockingBackend()
+    delivery_queue = DeliveryQueue([backend], workers=1, max_queue_size=1, enqueue_timeout=0.05)
+    delivery_queue.start()
+    try:
+        assert delivery_queue.submit("Reminder", "first")   # taken by the worker
+        time.sleep(0.05)
+        assert delivery_queue.submit("Reminder", "second")  # fills the queue
+        assert not delivery_queue.submit("Reminder", "third")
+    finally:
+        backend.release.set()
+        delivery_queue.stop()
+
+def test_submit_queues_for_all_backends_or_none(tmp_path):
+    slow = BlockingBackend()
+    log_backend = LogFileBackend(str(tmp_path / 'notifications.log'))
+    delivery_queue = DeliveryQueue([slow, log_backend], workers=1, max_queue_size=4, enqueue_timeout=0.05)
+    delivery_queue.start()
+    try:
+        assert delivery_queue.submit("Reminder", "first")  # the worker blocks on the slow copy
+        time.sleep(0.05)
+        assert delivery_queue.submit("Reminder", "second")  # 3 queued: first's log copy and both of second's
+        assert not delivery_queue.submit("Reminder", "third")  # room for one copy, not both
+        assert delivery_queue.queue.qsize() == 3
+    finally:
+        slow.release.set()
+        delivery_queue.join()
+        delivery_queue.stop()
+    assert 'third' not in (tmp_path / 'notifications.log').read_text()
+
+def test_submit_does_not_wait_for_delivery(tmp_path):
+    slow = BlockingBackend()
+    log_backend = LogFileBackend(str(tmp_path / 'notifications.log'))
+    delivery_queue = DeliveryQueue([slow, log_backend], workers=2)
+    delivery_queue.start()
+    try:
+        start = time.monotonic()
+        for i in range(30):
+            delivery_queue.submit("Reminder", f"Reminder {i}")
+        assert time.monotonic() - start < 1
+    finally:
+        slow.release.set()
+        delivery_queue.join()
+        delivery_queue.stop()
+    assert len((tmp_path / 'notifications.log').read_text().splitlines()) == 30
+
+class TitledNotifier:
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    def send_notification(self, message, channel=None, title='Reminder'):
+        self.sent.append((title, message))
+
+    def close(self):
+        self.closed = True
+
+def test_coalescer_rate_limit_refills():
+    clock = SimulatedClock(datetime(2024, 1, 1))
+    coalescer = Coalescer(rate_limit=2, rate_period=60, clock=clock)
+    assert coalescer.wait_time('alice') == 0
+    coalescer.take('alice')
+    coalescer.take('alice')
+    assert coalescer.wait_time('alice') == 30 and coalescer.wait_time('bob') == 0
+    clock.advance(30)
+    assert coalescer.wait_time('alice') == 0
+    assert Coalescer(rate_limit=None).wait_time('alice') == 0
+
+def test_digest_notifier_coalesces_within_window():
+    clock = SimulatedClock(datetime(2024, 1, 1))
+    notifier = TitledNotifier()
+    digest = DigestNotifier(notifier, Coalescer(window=2, max_items=2, rate_limit=1, rate_period=60, clock=clock), clock, autostart=False)
+    for n in range(3):
+        digest.send_notification(f'Alice {n}', channel='alice')
+    digest.send_notification('Solo')
+    assert digest.flush() == 2 and notifier.sent == []
+    clock.advance(2)
+    assert digest.flush() is None
+    assert sorted(notifier.sent) == [('3 reminders', '- Alice 0\n- Alice 1\n...and 1 more'), ('Reminder', 'Solo')]
+
+    # Rate limited: later messages wait for the next token and go out together
+    digest.send_notification('Alice 3', channel='alice')
+    clock.advance(2)
+    digest.send_notification('Alice 4', channel='alice')
+    assert digest.flush() == 58
+    clock.advance(58)
+    digest.flush()
+    assert notifier.sent[-1] == ('2 reminders', '- Alice 3\n- Alice 4')
+
+    digest.send_notification('Left over', channel='alice')
+    digest.close()
+    assert notifier.sent[-1] == ('Reminder', 'Left over') and notifier.closed
+
+def test_digest_notifier_flushes_in_background():
+    notifier = TitledNotifier()
+    digest = DigestNotifier(notifier, Coalescer(window=0.05))
+    try:
+        digest.send_notification('One')
+        digest.send_notification('Two')
+        deadline = time.monotonic() + 5
+        while not notifier.sent and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert notifier.sent == [('2 reminders', '- One\n- Two')]
+    finally:
+        digest.close()
@@ -0,0 +1,33 @@
+import json
+import logging
+
+import logging_setup
+
+def test_json_records_are_written_by_background_listener(tmp_path):
+    log_file = tmp_path / 'bot.log'
+    listener = logging_setup.configure_logging(log_file=str(log_file), console=False, file_format='json')
+    try:
+        assert logging_setup.configure_logging() is listener
+        logging.info("Deleted reminder ID %d", 42, extra={'reminder_id': 42, 'duration_ms': 1.5})
+        logging.debug("not logged at INFO")
+    finally:
+        logging_setup.shutdown_logging()
+
+    [line] = log_file.read_text().splitlines()
+    entry = json.loads(line)
+    assert entry['message'] == "Deleted reminder ID 42"
+    assert entry['level'] == 'INFO'
+    assert entry['reminder_id'] == 42
+    assert entry['duration_ms'] == 1.5
+
+def test_size_based_rotation(tmp_path):
+    log_file = tmp_path / 'bot.log'
+    logging_setup.configure_logging(log_file=str(log_file), console=False, file_format='text', max_bytes=2000, backup_count=2)
+    try:
+        for i in range(200):
+            logging.info("Rotating line %d", i)
+    finally:
+        logging_setup.shutdown_logging()
+    assert (tmp_path / 'bot.log.1').exists()
+    assert not (tmp_path / 'bot.log.3').exists()
+    assert log_file.stat().st_size <= 2000
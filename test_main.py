@@ -0,0 +1,48 @@
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+@pytest.fixture
+def cli(tmp_path):
+    # A port nobody listens on, so commands open the database directly instead of finding a daemon
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, REMINDER_BOT_API_PORT=str(port))
+
+    def run(*args):
+        return subprocess.run([sys.executable, MAIN, '--db', str(tmp_path / 'reminders.db'), *args],
+                              cwd=tmp_path, env=env, capture_output=True, text=True, timeout=30)
+    return run
+
+def test_add_list_delete(cli):
+    added = cli('add', 'Water the plants', 'tomorrow at 9am', '--repeat', 'weekly', '--every', '2')
+    assert added.returncode == 0 and added.stdout.startswith('Reminder 1 set for')
+    assert cli('add', 'Call mom', 'in 2 hours').returncode == 0
+
+    listed = cli('list')
+    assert [line.split(' - ', 1)[1] for line in listed.stdout.splitlines()] == ['Call mom', 'Water the plants (Repeats every 2 weeklys)']
+    assert cli('list', '--search', 'plant').stdout.split()[0] == '1'
+
+    deleted = cli('delete', '2', '9')
+    assert deleted.returncode == 1 and 'Deleted reminder 2.' in deleted.stdout and 'no reminder with ID 9' in deleted.stderr
+    assert [line.split()[0] for line in cli('list').stdout.splitlines()] == ['1']
+
+def test_add_rejects_bad_input(cli):
+    for args in (('Late', 'yesterday at 9am'), ('Gibberish', 'when pigs fly'), ('Bad rule', 'in 1 hour', '--repeat', 'fortnightly')):
+        result = cli('add', *args)
+        assert result.returncode == 1 and result.stderr.startswith('Error:')
+    assert cli('list').stdout.strip() == 'You have no upcoming reminders.'
+
+def test_import_leaves_heavy_modules_for_first_use():
+    heavy = ('parsedatetime', 'asyncio', 'http.client', 'http.server', 'urllib.request', 'sqlite3')
+    loaded = subprocess.run(
+        [sys.executable, '-c', f'import sys, main; print([m for m in {heavy!r} if m in sys.modules])'],
+        cwd=os.path.dirname(MAIN), capture_output=True, text=True, check=True
+    ).stdout.strip()
+    assert loaded == '[]'
@@ -0,0 +1,789 @@
+import calendar
+import time
+import sqlite3
+import threading
+import multiprocessing
+import pytest
+from datetime import date, datetime, timedelta
+
+from models import Reminder
+from managers import ReminderManager, Scheduler, FireQueue, SCHEMA_VERSION, create_history_partition, history_month, history_table, to_epoch
+from recurrence import count_occurrences
+from delivery import Coalescer, OutboxRelay
+from clock import SimulatedClock
+
+class RecordingNotifier:
+    def __init__(self):
+        self.messages = []
+        self.sent_at = []
+
+    def send_notification(self, message):
+        self.messages.append(message)
+        self.sent_at.append(datetime.now())
+
+class FlakyNotifier(RecordingNotifier):
+    # deliver() fails for messages listed in `failures` (as many times as listed)
+    def __init__(self, failures=()):
+        super().__init__()
+        self.failures = list(failures)
+        self.attempts = []
+
+    def deliver(self, message):
+        self.attempts.append(message)
+        if message in self.failures:
+            self.failures.remove(message)
+            raise RuntimeError(f"could not deliver {message}")
+        self.send_notification(message)
+
+@pytest.fixture
+def reminder_manager(tmp_path):
+    manager = ReminderManager(str(tmp_path / 'reminders.db'))
+    yield manager
+    manager.close()
+
+def make_reminder(text, when, recurrence=None, recurrence_interval=1, recurrence_end=None):
+    return Reminder(
+        reminder_id=None,
+        text=text,
+        datetime_str=when.strftime('%Y-%m-%d %H:%M:%S'),
+        recurrence=recurrence,
+        recurrence_interval=recurrence_interval,
+        recurrence_end=recurrence_end
+    )
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_fire_queue_skips_stale_entries():
+    queue = FireQueue()
+    past = datetime.now() - timedelta(seconds=1)
+    queue.push(past, 1)
+    queue.push(past, 2)
+    queue.push(datetime.now() + timedelta(hours=1), 1)  # rescheduled
+    queue.remove(2)
+    assert queue.wait_until_due(0) == []
+    assert len(queue) == 1
+
+def test_event_scheduler_fires_without_polling(reminder_manager):
+    notifier = RecordingNotifier()
+    scheduler = Scheduler(reminder_manager, notifier)
+    scheduler.start()
+    try:
+        due = (datetime.now() + timedelta(seconds=1)).replace(microsecond=0)
+        reminder_manager.add_reminder(make_reminder('Stretch', due))
+        assert wait_for(lambda: notifier.messages)
+        assert notifier.messages == ['Stretch']
+        assert notifier.sent_at[0] - due < timedelta(seconds=1)
+        assert wait_for(lambda: not reminder_manager.get_schedule_entries())
+    finally:
+        scheduler.stop()
+
+def test_event_scheduler_wakes_for_earlier_reminder(reminder_manager):
+    notifier = RecordingNotifier()
+    scheduler = Scheduler(reminder_manager, notifier)
+    reminder_manager.add_reminder(make_reminder('Later', datetime.now() + timedelta(hours=1)))
+    scheduler.start()
+    try:
+        reminder_manager.add_reminder(make_reminder('Sooner', datetime.now() + timedelta(seconds=1)))
+        assert wait_for(lambda: notifier.messages)
+        assert notifier.messages == ['Sooner']
+    finally:
+        scheduler.stop()
+
+class ClockNotifier(RecordingNotifier):
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def send_notification(self, message):
+        self.messages.append(message)
+        self.sent_at.append(self.clock.now())
+
+def test_simulated_year_fires_every_occurrence(tmp_path):
+    clock = SimulatedClock(datetime(2025, 1, 1))
+    manager = ReminderManager(str(tmp_path / 'simulated.db'), clock=clock)
+    try:
+        manager.add_reminder(make_reminder('Once', datetime(2025, 3, 1, 9, 30)))
+        manager.add_reminder(make_reminder('Daily', datetime(2025, 1, 1, 8, 0), recurrence='daily'))
+        manager.add_reminder(make_reminder('Weekly', datetime(2025, 1, 6, 18, 0), recurrence='weekly'))
+        manager.add_reminder(make_reminder('Monthly', datetime(2025, 1, 15, 12, 0), recurrence='monthly'))
+        manager.add_reminder(make_reminder('Weekdays', datetime(2025, 1, 1, 9, 0), recurrence='every weekday at 9'))
+        notifier = ClockNotifier(clock)
+        started = time.monotonic()
+
+        Scheduler(manager, notifier, max_sleep=86400).run(until=datetime(2026, 1, 1))
+
+        assert time.monotonic() - started < 30
+        counts = {text: notifier.messages.count(text) for text in set(notifier.messages)}
+        assert counts == {'Once': 1, 'Daily': 365, 'Weekly': 52, 'Monthly': 12, 'Weekdays': 261}
+        daily = [when for text, when in zip(notifier.messages, notifier.sent_at) if text == 'Daily']
+        assert daily == [datetime(2025, 1, 1, 8, 0) + timedelta(days=i) for i in range(365)]
+        assert manager.get_due_reminders() == []
+        assert [r.datetime for r in manager.get_upcoming_reminders()][0] == datetime(2026, 1, 1, 8, 0)
+    finally:
+        manager.close()
+
+def test_month_end_reminders_keep_their_day(tmp_path):
+    clock = SimulatedClock(datetime(2024, 1, 1))
+    manager = ReminderManager(str(tmp_path / 'month_end.db'), clock=clock)
+    try:
+        manager.add_reminder(make_reminder('Month end', datetime(2024, 1, 31, 9, 0), recurrence='monthly'))
+        manager.add_reminder(make_reminder('Leap day', datetime(2024, 2, 29, 9, 0), recurrence='yearly'))
+        notifier = ClockNotifier(clock)
+
+        Scheduler(manager, notifier, max_sleep=86400).run(until=datetime(2029, 1, 1))
+
+        fired = lambda name: [when for text, when in zip(notifier.messages, notifier.sent_at) if text == name]
+        expected = [datetime(year, month, calendar.monthrange(year, month)[1], 9, 0) for year in range(2024, 2029) for month in range(1, 13)]
+        assert fired('Month end') == expected
+        assert [when.date() for when in fired('Leap day')] == [date(2024, 2, 29), date(2025, 2, 28), date(2026, 2, 28), date(2027, 2, 28), date(2028, 2, 29)]
+    finally:
+        manager.close()
+
+def test_catch_up_after_month_end_slide_counts_from_anchor(tmp_path):
+    clock = SimulatedClock(datetime(2024, 1, 1))
+    manager = ReminderManager(str(tmp_path / 'slide.db'), clock=clock)
+    try:
+        reminder = make_reminder('Month end', datetime(2024, 1, 31, 9, 0), recurrence='monthly')
+        reminder.misfire_policy = 'all'
+        manager.add_reminder(reminder)
+        notifier = RecordingNotifier()
+        scheduler = Scheduler(manager, notifier)
+        clock.set(datetime(2024, 2, 1))
+        scheduler.check_reminders()
+        assert [r.datetime for r in manager.get_upcoming_reminders()] == [datetime(2024, 2, 29, 9, 0)]
+
+        # Down from before Feb 29 until May: Feb 29, Mar 31 and Apr 30 were missed
+        clock.set(datetime(2024, 5, 1))
+        scheduler.check_reminders()
+
+        assert len(notifier.messages) == 4
+        assert [r.datetime for r in manager.get_upcoming_reminders()] == [datetime(2024, 5, 31, 9, 0)]
+    finally:
+        manager.close()
+
+def test_polling_scheduler_follows_simulated_clock(tmp_path):
+    clock = SimulatedClock(datetime(2025, 1, 1))
+    manager = ReminderManager(str(tmp_path / 'polling.db'), clock=clock)
+    try:
+        manager.add_reminder(make_reminder('Soon', datetime(2025, 1, 1, 0, 5)))
+        notifier = ClockNotifier(clock)
+        Scheduler(manager, notifier, mode='polling').run(until=datetime(2025, 1, 1, 0, 10))
+        assert notifier.messages == ['Soon']
+        assert datetime(2025, 1, 1, 0, 5) <= notifier.sent_at[0] <= datetime(2025, 1, 1, 0, 6)
+    finally:
+        manager.close()
+
+def test_migrates_legacy_database(tmp_path):
+    database = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(database)
+    conn.execute('CREATE TABLE reminders (id INTEGER PRIMARY KEY, text TEXT NOT NULL, datetime TEXT NOT NULL)')
+    conn.execute("INSERT INTO reminders (text, datetime) VALUES ('Old', '2099-01-02 03:04:05')")
+    conn.commit()
+    conn.close()
+
+    manager = ReminderManager(database)
+    try:
+        with manager.pool.read() as cursor:
+            cursor.execute('PRAGMA user_version')
+            assert cursor.fetchone()[0] == SCHEMA_VERSION
+            cursor.execute('SELECT fire_at, recurrence_interval FROM reminders')
+            assert cursor.fetchone() == (to_epoch(datetime(2099, 1, 2, 3, 4, 5)), 1)
+        [reminder] = manager.get_upcoming_reminders()
+        assert reminder.text == 'Old'
+        assert [r.id for r in manager.search_reminders('old')] == [reminder.id]
+    finally:
+        manager.close()
+
+def test_due_and_upcoming_queries_use_fire_at_index(reminder_manager):
+    for query in (
+        'SELECT * FROM reminders WHERE fire_at <= ? ORDER BY fire_at, id',
+        'SELECT * FROM reminders WHERE fire_at > ? ORDER BY fire_at, id'
+    ):
+        with reminder_manager.pool.read() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + query, (0,))
+            plan = ' '.join(row[3] for row in cursor.fetchall())
+        assert 'idx_reminders_fire_at' in plan
+        assert 'TEMP B-TREE' not in plan
+
+def test_check_reminders_processes_due_batches(reminder_manager):
+    past = datetime.now().replace(microsecond=0) - timedelta(minutes=1)
+    for i in range(20):
+        reminder_manager.add_reminder(make_reminder(f'One-time {i}', past))
+    for i in range(5):
+        reminder_manager.add_reminder(make_reminder(f'Daily {i}', past, recurrence='daily'))
+    notifier = RecordingNotifier()
+    scheduler = Scheduler(reminder_manager, notifier, max_batch_size=10)
+    batches = []
+    process_due_batch = reminder_manager.process_due_batch
+    def record_batch(rescheduled, deleted_ids, **kwargs):
+        batches.append(len(rescheduled) + len(deleted_ids))
+        return process_due_batch(rescheduled, deleted_ids, **kwargs)
+    reminder_manager.process_due_batch = record_batch
+
+    scheduler.check_reminders()
+
+    assert len(notifier.messages) == 25
+    assert batches == [10, 10, 5]
+    upcoming = reminder_manager.get_upcoming_reminders()
+    assert [reminder.datetime for reminder in upcoming] == [past + timedelta(days=1)] * 5
+
+@pytest.mark.parametrize('recurrence, interval, limit, expected', [
+    ('daily', 1, datetime(2024, 1, 31, 8, 59), (30, datetime(2024, 1, 31, 9, 0))),
+    ('weekly', 2, datetime(2024, 3, 1), (5, datetime(2024, 3, 11, 9, 0))),
+    ('monthly', 1, datetime(2024, 3, 30), (3, datetime(2024, 4, 1, 9, 0))),
+    ('yearly', 1, datetime(2030, 1, 1, 9, 0), (7, datetime(2031, 1, 1, 9, 0))),
+])
+def test_count_occurrences_closed_form(recurrence, interval, limit, expected):
+    assert count_occurrences(datetime(2024, 1, 1, 9, 0), recurrence, interval, limit) == expected
+
+def test_count_occurrences_keeps_month_end_anchor():
+    start = datetime(2024, 1, 31, 9, 0)
+    assert count_occurrences(start, 'monthly', 1, datetime(2024, 3, 1)) == (2, datetime(2024, 3, 31, 9, 0))
+    assert count_occurrences(datetime(2024, 2, 29), 'yearly', 1, datetime(2025, 1, 1)) == (1, datetime(2025, 2, 28))
+
+@pytest.mark.parametrize('policy, expected_fires', [('once', 1), ('all', 31), ('skip', 0)])
+def test_catch_up_after_downtime_is_single_pass(reminder_manager, policy, expected_fires):
+    start = datetime.now().replace(microsecond=0) - timedelta(days=30, minutes=5)
+    reminder = make_reminder('Daily', start, recurrence='daily')
+    reminder.misfire_policy = policy
+    reminder_manager.add_reminder(reminder)
+    notifier = RecordingNotifier()
+    scheduler = Scheduler(reminder_manager, notifier)
+
+    scheduler.check_reminders()
+
+    assert len(notifier.messages) == expected_fires
+    [upcoming] = reminder_manager.get_upcoming_reminders()
+    assert upcoming.datetime == start + timedelta(days=31)
+    assert upcoming.misfire_policy == policy
+
+def test_catch_up_fire_all_respects_recurrence_end(reminder_manager):
+    start = datetime.now().replace(microsecond=0) - timedelta(days=30, minutes=5)
+    end = start + timedelta(days=9, hours=1)
+    reminder = make_reminder('Daily', start, recurrence='daily', recurrence_end=end.strftime('%Y-%m-%d %H:%M:%S'))
+    reminder.misfire_policy = 'all'
+    reminder_manager.add_reminder(reminder)
+    notifier = RecordingNotifier()
+
+    Scheduler(reminder_manager, notifier).check_reminders()
+
+    assert len(notifier.messages) == 10
+    assert reminder_manager.get_schedule_entries() == []
+
+def test_catch_up_fire_all_survives_corrupt_recurrence(reminder_manager):
+    start = datetime.now().replace(microsecond=0) - timedelta(days=3, minutes=5)
+    ids = []
+    for text in ('Before', 'Corrupt', 'After'):
+        reminder = make_reminder(text, start, recurrence='daily')
+        reminder.misfire_policy = 'all'
+        ids.append(reminder_manager.add_reminder(reminder))
+    with reminder_manager.pool.write() as cursor:
+        cursor.execute("UPDATE reminders SET recurrence = 'fortnightly-ish' WHERE id = ?", (ids[1],))
+    notifier = RecordingNotifier()
+
+    Scheduler(reminder_manager, notifier).check_reminders()
+
+    # The corrupt row fires once like a one-time reminder; the rest of the batch still catches up
+    assert sorted(notifier.messages) == ['After'] * 4 + ['Before'] * 4 + ['Corrupt']
+    assert sorted(r.text for r in reminder_manager.get_upcoming_reminders()) == ['After', 'Before']
+
+def test_concurrent_readers_and_writers(reminder_manager, capsys):
+    with reminder_manager.pool.read() as cursor:
+        assert cursor.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    future = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    errors = []
+    writes_per_thread = 50
+
+    def writer(n):
+        try:
+            for i in range(writes_per_thread):
+                reminder = make_reminder(f'Writer {n} #{i}', future + timedelta(seconds=i))
+                reminder_manager.add_reminder(reminder)
+                assert reminder.id is not None
+                if i % 5 == 0:
+                    reminder.text += ' (edited)'
+                    reminder_manager.update_reminder(reminder)
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            for _ in range(50):
+                upcoming = reminder_manager.get_upcoming_reminders()
+                assert all(reminder.datetime >= future for reminder in upcoming)
+                reminder_manager.get_due_reminders()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    threads += [threading.Thread(target=reader) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert 'An error occurred' not in capsys.readouterr().out
+    upcoming = reminder_manager.get_upcoming_reminders()
+    assert len(upcoming) == 8 * writes_per_thread
+    assert sum(reminder.text.endswith('(edited)') for reminder in upcoming) == 8 * 10
+
+def test_keyset_pagination_and_filters(reminder_manager):
+    base = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    for i in range(25):
+        # Pairs of reminders share a fire time so the id tie-breaker is exercised
+        recurrence = 'daily' if i % 5 == 0 else None
+        reminder_manager.add_reminder(make_reminder(f'R{i}', base + timedelta(minutes=i // 2), recurrence=recurrence))
+
+    seen = []
+    page, cursor = reminder_manager.get_upcoming_page(page_size=10)
+    while True:
+        seen.extend(reminder.text for reminder in page)
+        if cursor is None:
+            break
+        page, cursor = reminder_manager.get_upcoming_page(after=cursor, page_size=10)
+    assert seen == [f'R{i}' for i in range(25)]
+
+    streamed = [reminder.text for reminder in reminder_manager.iter_upcoming_reminders(page_size=3, recurring_only=True)]
+    assert streamed == ['R0', 'R5', 'R10', 'R15', 'R20']
+
+    window = reminder_manager.iter_upcoming_reminders(page_size=4, start=base + timedelta(minutes=2), end=base + timedelta(minutes=4))
+    assert [reminder.text for reminder in window] == ['R4', 'R5', 'R6', 'R7']
+
+    page, cursor = reminder_manager.get_upcoming_page(page_size=25)
+    assert len(page) == 25 and cursor is None
+
+def test_get_reminder_by_id(reminder_manager):
+    reminder = make_reminder('Lookup', datetime.now() + timedelta(hours=1))
+    reminder_manager.add_reminder(reminder)
+    assert reminder_manager.get_reminder(reminder.id).text == 'Lookup'
+    assert reminder_manager.get_reminder(reminder.id + 1) is None
+
+def test_search_reminders_stays_in_sync(reminder_manager):
+    soon = datetime.now().replace(microsecond=0) + timedelta(hours=1)
+    dentist = make_reminder('Call the dentist', soon)
+    reminder_manager.add_reminder(dentist)
+    reminder_manager.add_reminders_bulk([
+        ('Pay electric bill', soon.strftime('%Y-%m-%d %H:%M:%S'), to_epoch(soon), None, 1, None, 'once'),
+        ('Pay rent', soon.strftime('%Y-%m-%d %H:%M:%S'), to_epoch(soon), None, 1, None, 'once'),
+        ('Dentist follow-up call', soon.strftime('%Y-%m-%d %H:%M:%S'), to_epoch(soon), None, 1, None, 'once')
+    ])
+
+    assert {r.text for r in reminder_manager.search_reminders('pay')} == {'Pay electric bill', 'Pay rent'}
+    assert [r.text for r in reminder_manager.search_reminders('pay ele')] == ['Pay electric bill']
+    # Shorter texts rank higher for the same matches
+    assert [r.text for r in reminder_manager.search_reminders('dent')] == ['Call the dentist', 'Dentist follow-up call']
+    assert reminder_manager.search_reminders('"; DROP') == []
+    assert reminder_manager.search_reminders('   ') == []
+    assert len(reminder_manager.search_reminders('pay', limit=1)) == 1
+
+    dentist.text = 'Call the orthodontist'
+    reminder_manager.update_reminder(dentist)
+    assert [r.text for r in reminder_manager.search_reminders('dentist')] == ['Dentist follow-up call']
+    assert [r.id for r in reminder_manager.search_reminders('orthodontist')] == [dentist.id]
+
+    reminder_manager.delete_reminder(dentist.id)
+    reminder_manager.delete_reminders([r.id for r in reminder_manager.search_reminders('rent')])
+    assert reminder_manager.search_reminders('orthodontist') == []
+    assert [r.text for r in reminder_manager.search_reminders('pay')] == ['Pay electric bill']
+
+def test_search_ranks_older_matches_too(reminder_manager):
+    soon = datetime.now().replace(microsecond=0) + timedelta(hours=1)
+    row = lambda text: (text, soon.strftime('%Y-%m-%d %H:%M:%S'), to_epoch(soon), None, 1, None, 'once')
+    reminder_manager.add_reminders_bulk([row('Invoice')])
+    # Many newer, weaker matches inserted after the best one
+    reminder_manager.add_reminders_bulk([row(f'Check the invoice folder for batch {i} and file it') for i in range(1200)])
+    found = reminder_manager.search_reminders('invoice', limit=3)
+    assert found[0].text == 'Invoice' and found[0].id == 1
+
+def test_group_commit_batches_concurrent_adds(tmp_path):
+    manager = ReminderManager(str(tmp_path / 'group.db'), durability='group', group_commit_records=50, group_commit_ms=200)
+    batches = []
+    flush = manager._flush_buffered
+    manager.write_buffer.flush_function = lambda reminders: batches.append(len(reminders)) or flush(reminders)
+    try:
+        later = datetime.now().replace(microsecond=0) + timedelta(hours=1)
+        ids = []
+        threads = [threading.Thread(target=lambda i=i: ids.append(manager.add_reminder(make_reminder(f'Group {i}', later)))) for i in range(40)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(ids) == list(range(1, 41))
+        assert len(manager.get_upcoming_reminders()) == 40
+
+        # Write-behind submits are held until the batch fills up or group_commit_ms passes
+        batches.clear()
+        futures = [manager.submit_reminder(make_reminder(f'Queued {i}', later)) for i in range(120)]
+        assert [future.result(5) for future in futures] == list(range(41, 161))
+        assert batches == [50, 50, 20]
+        assert len(manager.get_upcoming_reminders()) == 160
+    finally:
+        manager.close()
+    with pytest.raises(ValueError):
+        ReminderManager(str(tmp_path / 'other.db'), durability='eventually')
+
+def test_group_commit_flushes_due_reminders_immediately(tmp_path):
+    # A long flush delay must not hold back a reminder that is already due
+    manager = ReminderManager(str(tmp_path / 'group.db'), durability='group', group_commit_ms=60000)
+    notifier = RecordingNotifier()
+    scheduler = Scheduler(manager, notifier)
+    scheduler.start()
+    try:
+        later = manager.submit_reminder(make_reminder('Later', datetime.now() + timedelta(hours=1)))
+        due = manager.submit_reminder(make_reminder('Now', datetime.now().replace(microsecond=0)))
+        assert due.result(5) is not None and later.result(0) is not None
+        assert wait_for(lambda: notifier.messages == ['Now'])
+    finally:
+        scheduler.stop()
+        manager.close()
+
+def test_rule_based_recurrence_reschedules(reminder_manager):
+    notifier = RecordingNotifier()
+    scheduler = Scheduler(reminder_manager, notifier)
+    # Friday 9:00, five seconds overdue: the next weekday at 9 is Monday
+    now = datetime.now()
+    friday = (now - timedelta(days=(now.weekday() - 4) % 7 or 7)).replace(hour=9, minute=0, second=0, microsecond=0)
+    reminder = make_reminder('Standup', friday, recurrence='every weekday at 9')
+    reminder.misfire_policy = 'skip'
+    reminder_manager.add_reminder(reminder)
+    scheduler.check_reminders()
+    [rescheduled] = reminder_manager.get_upcoming_reminders()
+    assert rescheduled.datetime.weekday() < 5 and rescheduled.datetime.hour == 9
+    assert rescheduled.datetime > now
+    assert notifier.messages == []
+    assert scheduler.calculate_next_occurrence(make_reminder('Bad', friday, recurrence='every blursday')) is None
+
+def test_fired_reminders_move_to_history(reminder_manager):
+    past = datetime.now().replace(microsecond=0) - timedelta(minutes=1)
+    once = make_reminder('Call mum', past)
+    ended = make_reminder('Standup', past, recurrence='daily', recurrence_end=past.strftime('%Y-%m-%d %H:%M:%S'))
+    daily = make_reminder('Stretch', past, recurrence='daily')
+    cancelled = make_reminder('Cancelled', past + timedelta(days=1))
+    overslept = make_reminder('Overslept', past - timedelta(days=1))
+    overslept.misfire_policy = 'skip'
+    for reminder in (once, ended, daily, cancelled, overslept):
+        reminder_manager.add_reminder(reminder)
+    reminder_manager.delete_reminder(cancelled.id)
+    notifier = RecordingNotifier()
+
+    Scheduler(reminder_manager, notifier).check_reminders()
+
+    assert sorted(notifier.messages) == ['Call mum', 'Standup', 'Stretch']
+    assert [r.text for r in reminder_manager.get_upcoming_reminders()] == ['Stretch']
+    history = {reminder.text: (reminder.id, reason) for reminder, archived_at, reason in reminder_manager.get_history()}
+    assert history == {'Call mum': (once.id, 'fired'), 'Standup': (ended.id, 'expired'), 'Overslept': (overslept.id, 'missed')}
+    [(reminder, archived_at, reason)] = reminder_manager.get_history(reminder_id=once.id)
+    assert reminder.datetime == past and abs((archived_at - datetime.now()).total_seconds()) < 5
+    assert reminder_manager.get_history(end=datetime.now() - timedelta(days=1)) == []
+
+def test_purge_history_drops_expired_months(reminder_manager):
+    now = time.time()
+    old, recent = int(now - 90 * 86400), int(now - 86400)
+    with reminder_manager.pool.write() as cursor:
+        for archived_at in (old, recent):
+            table = create_history_partition(cursor, history_month(archived_at))
+            cursor.executemany(
+                f"INSERT INTO {table} (reminder_id, text, datetime, fire_at, archived_at, reason) VALUES (?, 'Old', '2000-01-01 00:00:00', 0, ?, 'fired')",
+                [(i, archived_at) for i in range(200)]
+            )
+
+    assert len(reminder_manager.get_history(limit=1000)) == 400
+    assert len(reminder_manager.get_history(start=datetime.fromtimestamp(now - 7 * 86400), limit=1000)) == 200
+    assert reminder_manager.purge_history() == 0  # no retention configured
+    assert reminder_manager.purge_history(retention_days=30) == 200
+
+    assert [archived_at for _, archived_at, _ in reminder_manager.get_history(limit=1000)] == [datetime.fromtimestamp(recent)] * 200
+    with reminder_manager.pool.read() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = ?", (history_table(history_month(old)),))
+        assert cursor.fetchone() is None
+        cursor.execute('PRAGMA auto_vacuum')
+        assert cursor.fetchone()[0] == 2
+        cursor.execute('PRAGMA freelist_count')
+        assert cursor.fetchone()[0] == 0
+
+def test_legacy_database_is_only_rebuilt_on_request(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    legacy = sqlite3.connect(path)
+    legacy.execute('PRAGMA journal_mode=WAL')
+    legacy.execute('CREATE TABLE placeholder (x)')
+    legacy.close()
+
+    manager = ReminderManager(path)
+    try:
+        assert not manager.incremental_vacuum_enabled()
+        assert manager.purge_history(retention_days=30, vacuum_pages=100) == 0
+        assert not manager.incremental_vacuum_enabled()
+        assert manager.enable_incremental_vacuum() is True
+        assert manager.incremental_vacuum_enabled()
+        assert manager.enable_incremental_vacuum() is False
+    finally:
+        manager.close()
+
+def test_outbox_delivers_fired_reminders(reminder_manager):
+    notifier = FlakyNotifier()
+    scheduler = Scheduler(reminder_manager, notifier, guarantee='at-least-once')
+    scheduler.start()
+    try:
+        due = datetime.now().replace(microsecond=0)
+        reminder_manager.add_reminder(make_reminder('Outbox', due))
+        reminder_manager.add_reminder(make_reminder('Repeats', due, recurrence='daily'))
+        assert wait_for(lambda: sorted(notifier.messages) == ['Outbox', 'Repeats'])
+        assert wait_for(lambda: reminder_manager.get_outbox() == [])
+        assert [r.text for r in reminder_manager.get_upcoming_reminders()] == ['Repeats']
+    finally:
+        scheduler.stop()
+
+def test_outbox_retries_with_backoff_then_gives_up(reminder_manager):
+    past = datetime.now().replace(microsecond=0) - timedelta(seconds=5)
+    for text in ('Flaky', 'Broken', 'Fine'):
+        reminder_manager.add_reminder(make_reminder(text, past))
+    notifier = FlakyNotifier(failures=['Flaky'] + ['Broken'] * 10)
+    scheduler = Scheduler(reminder_manager, notifier, guarantee='at-least-once')
+    scheduler.check_reminders()
+    # Notifications are only queued; the reminders are already gone
+    assert notifier.attempts == [] and reminder_manager.get_schedule_entries() == []
+
+    relay = OutboxRelay(reminder_manager, notifier.deliver, max_retries=2, retry_delay=0)
+    try:
+        for _ in range(4):
+            relay.relay_once()
+    finally:
+        relay.stop()
+    assert sorted(notifier.messages) == ['Fine', 'Flaky']
+    assert notifier.attempts.count('Broken') == 3
+    [(entry_id, reminder_id, message, fire_at, attempts, error)] = reminder_manager.get_outbox(failed=True)
+    assert (message, attempts, error) == ('Broken', 3, 'could not deliver Broken')
+    assert reminder_manager.get_outbox() == []
+
+def test_outbox_redelivers_after_crash_before_settling(reminder_manager):
+    past = datetime.now().replace(microsecond=0) - timedelta(seconds=5)
+    reminder_manager.add_reminder(make_reminder('Survives crash', past))
+    Scheduler(reminder_manager, FlakyNotifier(), guarantee='at-least-once').check_reminders()
+    # A relay that claimed the entry and died before settling it
+    assert len(reminder_manager.claim_outbox('crashed', 10, lease_seconds=-1)) == 1
+    notifier = FlakyNotifier()
+    relay = OutboxRelay(reminder_manager, notifier.deliver)
+    try:
+        assert relay.relay_once() == 1
+    finally:
+        relay.stop()
+    assert notifier.messages == ['Survives crash']
+
+def test_outbox_at_most_once_never_resends(reminder_manager):
+    past = datetime.now().replace(microsecond=0) - timedelta(seconds=5)
+    reminder_manager.add_reminder(make_reminder('Once at most', past))
+    notifier = FlakyNotifier(failures=['Once at most'])
+    Scheduler(reminder_manager, notifier, guarantee='at-most-once').check_reminders()
+    relay = OutboxRelay(reminder_manager, notifier.deliver, guarantee='at-most-once', retry_delay=0)
+    try:
+        assert relay.relay_once() == 1
+        assert relay.relay_once() == 0
+    finally:
+        relay.stop()
+    assert notifier.attempts == ['Once at most'] and notifier.messages == []
+    assert reminder_manager.get_outbox() == [] and reminder_manager.get_outbox(failed=True) == []
+
+class DigestRecorder:
+    def __init__(self):
+        self.sent = []
+
+    def deliver(self, message, title='Reminder'):
+        self.sent.append((title, message))
+
+def test_outbox_coalesces_bursts_per_tenant(tmp_path):
+    clock = SimulatedClock(datetime(2024, 1, 1, 9))
+    manager = ReminderManager(str(tmp_path / 'reminders.db'), clock=clock)
+    for n in range(5):
+        reminder = make_reminder(f'Alice {n}', clock.now())
+        reminder.tenant = 'alice'
+        manager.add_reminder(reminder)
+    reminder = make_reminder('Bob 0', clock.now())
+    reminder.tenant = 'bob'
+    manager.add_reminder(reminder)
+    notifier = DigestRecorder()
+    coalescer = Coalescer(window=2, max_items=3, rate_limit=1, rate_period=60, clock=clock)
+    scheduler = Scheduler(manager, notifier, guarantee='at-least-once', coalescer=coalescer)
+    relay = scheduler.relay
+    try:
+        scheduler.check_reminders()
+        # Nothing is claimed until the window has passed, then each tenant gets one notification
+        assert relay.relay_once() == 0
+        clock.advance(2)
+        assert relay.relay_once() == 6
+        assert sorted(notifier.sent) == [
+            ('5 reminders', '- Alice 0\n- Alice 1\n- Alice 2\n...and 2 more'),
+            ('Reminder', 'Bob 0')
+        ]
+
+        # alice has used her one notification per minute, so her next burst waits without losing an attempt
+        reminder = make_reminder('Alice later', clock.now())
+        reminder.tenant = 'alice'
+        manager.add_reminder(reminder)
+        scheduler.check_reminders()
+        clock.advance(2)
+        assert relay.relay_once() == 1
+        assert len(notifier.sent) == 2
+        [(_, _, message, _, attempts, _)] = manager.get_outbox()
+        assert (message, attempts) == ('Alice later', 0)
+        clock.advance(60)
+        assert relay.relay_once() == 1
+        assert notifier.sent[-1] == ('Reminder', 'Alice later') and manager.get_outbox() == []
+    finally:
+        relay.stop()
+        manager.close()
+
+def test_outbox_skips_reminders_whose_lease_was_lost(reminder_manager):
+    past = datetime.now().replace(microsecond=0) - timedelta(seconds=5)
+    reminder_manager.add_reminder(make_reminder('Contested', past))
+    reminder_manager.add_reminder(make_reminder('Contested daily', past, recurrence='daily'))
+    reminder, daily = reminder_manager.claim_due_reminders('worker-a', 10)
+    events = []
+    reminder_manager.add_listener(lambda event, reminder_id, fire_time: events.append((event, reminder_id)))
+    daily.datetime = past + timedelta(days=1)
+    # worker-b never held the lease, so it must not queue a notification, touch the rows or report changes
+    assert reminder_manager.process_due_batch([daily], [reminder.id], owner='worker-b', outbox=[(reminder.id, reminder.text, reminder.fire_at)])
+    assert reminder_manager.get_outbox() == [] and events == []
+    assert len(reminder_manager.get_due_reminders()) == 2
+    assert reminder_manager.process_due_batch([daily], [reminder.id], owner='worker-a', outbox=[(reminder.id, reminder.text, reminder.fire_at)])
+    assert [entry[2] for entry in reminder_manager.get_outbox()] == ['Contested']
+    assert events == [('updated', daily.id), ('deleted', reminder.id)]
+
+def test_expired_leases_are_reclaimed(reminder_manager):
+    past = datetime.now().replace(microsecond=0) - timedelta(seconds=5)
+    for i in range(3):
+        reminder_manager.add_reminder(make_reminder(f'Due {i}', past))
+    assert len(reminder_manager.claim_due_reminders('worker-a', 10, lease_seconds=60)) == 3
+    assert reminder_manager.claim_due_reminders('worker-b', 10) == []
+
+    # worker-c's lease has already expired, as if it crashed before finishing
+    reminder_manager.add_reminder(make_reminder('Orphaned', past))
+    [orphan] = reminder_manager.claim_due_reminders('worker-c', 10, lease_seconds=-1)
+    [reclaimed] = reminder_manager.claim_due_reminders('worker-b', 10)
+    assert reclaimed.id == orphan.id
+    assert reminder_manager.process_due_batch([], [orphan.id], owner='worker-c')
+    assert reminder_manager.get_reminder(orphan.id) is not None
+
+class QueueNotifier:
+    def __init__(self, results):
+        self.results = results
+
+    def send_notification(self, message):
+        self.results.put(message)
+
+def run_scheduler_worker(database, worker_id, results):
+    manager = ReminderManager(database)
+    try:
+        scheduler = Scheduler(manager, QueueNotifier(results), worker_id=worker_id, max_batch_size=20)
+        deadline = time.monotonic() + 30
+        while manager.get_due_reminders(limit=1) and time.monotonic() < deadline:
+            scheduler.check_reminders()
+    finally:
+        manager.close()
+
+def test_worker_processes_fire_each_reminder_exactly_once(tmp_path):
+    database = str(tmp_path / 'shared.db')
+    manager = ReminderManager(database)
+    past = datetime.now().replace(microsecond=0) - timedelta(seconds=5)
+    for i in range(400):
+        manager.add_reminder(make_reminder(f'Reminder {i}', past))
+    manager.close()
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [context.Process(target=run_scheduler_worker, args=(database, f'worker-{n}', results)) for n in range(4)]
+    for worker in workers:
+        worker.start()
+    fired = [results.get(timeout=30) for _ in range(400)]
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+
+    assert sorted(fired) == sorted(f'Reminder {i}' for i in range(400))
+    assert results.empty()
+
+def test_memory_storage_snapshots_and_recovers(tmp_path):
+    path = str(tmp_path / 'reminders.db')
+    future = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    manager = ReminderManager(path, storage='memory', snapshot_interval=3600, snapshot_changes=10**6)
+    try:
+        ids = [manager.add_reminder(make_reminder(f'Memory {n}', future + timedelta(minutes=n))) for n in range(5)]
+        manager.delete_reminder(ids[0])
+        edited = manager.get_reminder(ids[1])
+        edited.text = 'Edited in memory'
+        manager.update_reminder(edited)
+        expected = ['Edited in memory', 'Memory 2', 'Memory 3', 'Memory 4']
+
+        # A crash before any snapshot: the file was never written, the change log has everything
+        recovered = ReminderManager(path, storage='memory')
+        try:
+            assert [r.text for r in recovered.get_upcoming_reminders()] == expected
+            assert [r.id for r in recovered.search_reminders('edited')] == [ids[1]]
+        finally:
+            recovered.close()  # `manager` is left as it is, like a process that died, until the end
+
+        # Closing wrote a snapshot that the file backend can read, and emptied the log
+        assert (tmp_path / 'reminders.db.changes').stat().st_size == 0
+        on_disk = ReminderManager(path)
+        try:
+            assert [r.text for r in on_disk.get_upcoming_reminders()] == expected
+        finally:
+            on_disk.close()
+    finally:
+        manager.close()
+
+def test_memory_storage_snapshots_after_changes_and_ignores_torn_log(tmp_path):
+    path = str(tmp_path / 'reminders.db')
+    log = tmp_path / 'reminders.db.changes'
+    future = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    ReminderManager(path, storage='memory').close()  # migrations are logged changes too
+    manager = ReminderManager(path, storage='memory', snapshot_interval=3600, snapshot_changes=5)
+    recovered = None
+    try:
+        for n in range(5):
+            manager.add_reminder(make_reminder(f'Batch {n}', future))
+        assert wait_for(lambda: manager.pool.snapshot_seq == manager.pool.seq and log.stat().st_size == 0)
+        manager.add_reminder(make_reminder('Logged only', future))
+        # A crash in the middle of appending a record leaves a torn last line
+        with open(log, 'ab') as f:
+            f.write(b'{"seq":999,"ops":[["x","DELETE FROM rem')
+
+        # Neither `manager` nor `recovered` is closed before the next one opens, as if each had died
+        recovered = ReminderManager(path, storage='memory')
+        assert len(recovered.get_upcoming_reminders()) == 6
+        recovered.add_reminder(make_reminder('After recovery', future))
+        again = ReminderManager(path, storage='memory', snapshot_interval=3600)
+        try:
+            assert [r.text for r in again.get_upcoming_reminders()][-2:] == ['Logged only', 'After recovery']
+        finally:
+            again.close()
+    finally:
+        if recovered is not None:
+            recovered.close()
+        manager.close()
+
+def test_scheduler_runs_on_memory_storage(tmp_path):
+    path = str(tmp_path / 'reminders.db')
+    manager = ReminderManager(path, storage='memory')
+    try:
+        past = datetime.now().replace(microsecond=0) - timedelta(seconds=5)
+        manager.add_reminder(make_reminder('Fires from memory', past))
+        manager.add_reminder(make_reminder('Repeats from memory', past, recurrence='daily'))
+        notifier = RecordingNotifier()
+        Scheduler(manager, notifier).check_reminders()
+        assert sorted(notifier.messages) == ['Fires from memory', 'Repeats from memory']
+    finally:
+        manager.close()
+
+    reopened = ReminderManager(path, storage='memory')
+    try:
+        assert [r.text for r in reopened.get_upcoming_reminders()] == ['Repeats from memory']
+        assert [reminder.text for reminder, _, _ in reopened.get_history()] == ['Fires from memory']
+    finally:
+        reopened.close()
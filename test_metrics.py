@@ -0,0 +1,60 @@
+import urllib.request
+
+from metrics import MetricsRegistry, REGISTRY, start_metrics_server
+
+def test_histogram_snapshot_and_prometheus_format():
+    registry = MetricsRegistry()
+    latency = registry.histogram('query_seconds', 'Query time.', buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 2):
+        latency.labels(operation='get').observe(value)
+    registry.counter('fired_total', 'Fired.').inc(3)
+
+    stats = registry.snapshot()
+    assert stats['query_seconds']['{operation="get"}']['count'] == 4
+    assert stats['query_seconds']['{operation="get"}']['p50'] == 1
+    assert stats['fired_total'][''] == {'value': 3}
+
+    text = registry.render_prometheus()
+    assert '# TYPE query_seconds histogram' in text
+    assert 'query_seconds_bucket{operation="get",le="0.1"} 1' in text
+    assert 'query_seconds_bucket{operation="get",le="1"} 3' in text
+    assert 'query_seconds_bucket{operation="get",le="+Inf"} 4' in text
+    assert 'query_seconds_count{operation="get"} 4' in text
+    assert 'fired_total 3' in text
+
+def test_metrics_endpoint_serves_registry():
+    registry = MetricsRegistry()
+    registry.gauge('queue_depth', 'Depth.').set_function(lambda: 7)
+    server = start_metrics_server(port=0, registry=registry)
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert 'queue_depth 7' in response.read().decode('utf-8')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_managers_record_query_and_firing_metrics(tmp_path):
+    from datetime import datetime, timedelta
+    from managers import ReminderManager, Scheduler
+    from models import Reminder
+
+    class NullNotifier:
+        def send_notification(self, message):
+            pass
+
+    REGISTRY.reset()
+    manager = ReminderManager(str(tmp_path / 'reminders.db'))
+    try:
+        due = (datetime.now() - timedelta(seconds=2)).strftime('%Y-%m-%d %H:%M:%S')
+        manager.add_reminder(Reminder(None, 'Measured', due))
+        Scheduler(manager, NullNotifier()).check_reminders()
+    finally:
+        manager.close()
+
+    stats = REGISTRY.snapshot()
+    assert stats['reminder_db_query_seconds']['{operation="add_reminder"}']['count'] == 1
+    assert stats['reminder_fire_lag_seconds']['']['count'] == 1
+    assert stats['reminder_fire_lag_seconds']['']['p50'] >= 1
+    assert stats['scheduler_check_duration_seconds']['']['count'] == 1
+    assert stats['reminders_fired_total'][''] == {'value': 1}
@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from models import Reminder
+
+def test_datetime_is_parsed_lazily_from_epoch():
+    fire_time = datetime(2030, 5, 6, 7, 8, 9)
+    reminder = Reminder(1, 'Water plants', 'not parsed', fire_at=int(fire_time.timestamp()))
+    assert reminder._datetime is None
+    assert reminder.datetime == fire_time
+    assert not hasattr(reminder, '__dict__')
+
+def test_setting_datetime_keeps_string_and_epoch_in_sync():
+    reminder = Reminder(1, 'Water plants', '2030-05-06 07:08:09')
+    assert reminder.datetime == datetime(2030, 5, 6, 7, 8, 9)
+    reminder.datetime = datetime(2031, 1, 2, 3, 4, 5)
+    assert reminder.datetime_str == '2031-01-02 03:04:05'
+    assert reminder.fire_at == int(datetime(2031, 1, 2, 3, 4, 5).timestamp())
+    reminder.datetime_str = '2032-01-01 00:00:00'
+    assert reminder.datetime == datetime(2032, 1, 1)
@@ -0,0 +1,65 @@
+import pytest
+from datetime import datetime
+
+from recurrence import compile_rule, IntervalRule, CalendarRule
+
+START = datetime(2024, 1, 1, 8, 0)  # a Monday
+
+@pytest.mark.parametrize('recurrence, expected', [
+    ('every weekday at 9', ['2024-01-01 09:00', '2024-01-02 09:00', '2024-01-03 09:00', '2024-01-04 09:00', '2024-01-05 09:00', '2024-01-08 09:00']),
+    ('first monday of the month', ['2024-02-05 08:00', '2024-03-04 08:00', '2024-04-01 08:00']),
+    ('last friday of every month at 5 pm', ['2024-01-26 17:00', '2024-02-23 17:00', '2024-03-29 17:00']),
+    ('last day of the month', ['2024-01-31 08:00', '2024-02-29 08:00', '2024-03-31 08:00']),
+    ('every month on the 31st', ['2024-01-31 08:00', '2024-03-31 08:00', '2024-05-31 08:00']),
+    ('every mon, wed and fri at 7:30 pm', ['2024-01-01 19:30', '2024-01-03 19:30', '2024-01-05 19:30', '2024-01-08 19:30']),
+    ('every other week', ['2024-01-15 08:00', '2024-01-29 08:00']),
+    ('30 9 * * 1-5', ['2024-01-01 09:30', '2024-01-02 09:30']),
+    ('*/20 8 * * *', ['2024-01-01 08:20', '2024-01-01 08:40', '2024-01-02 08:00']),
+    # cron matches day-of-month OR day-of-week when both are restricted
+    ('0 0 13 * fri', ['2024-01-05 00:00', '2024-01-12 00:00', '2024-01-13 00:00', '2024-01-19 00:00']),
+    ('@monthly', ['2024-02-01 00:00', '2024-03-01 00:00']),
+    ('FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;BYHOUR=9;BYMINUTE=0;BYSECOND=0', ['2024-01-01 09:00', '2024-01-03 09:00', '2024-01-15 09:00']),
+    ('RRULE:FREQ=MONTHLY;BYDAY=-1SU', ['2024-01-28 08:00', '2024-02-25 08:00']),
+    ('FREQ=YEARLY;BYMONTH=2', ['2024-02-01 08:00', '2025-02-01 08:00'])
+])
+def test_next_occurrences(recurrence, expected):
+    rule = compile_rule(recurrence)
+    found = rule.next_n(START, START, len(expected))
+    assert [when.strftime('%Y-%m-%d %H:%M') for when in found] == expected
+
+def test_frequency_words_stay_closed_form():
+    rule = compile_rule('monthly', 2)
+    assert isinstance(rule, IntervalRule)
+    assert rule.next_after(datetime(2024, 1, 31, 9), datetime(2024, 1, 31, 9)) == datetime(2024, 3, 31, 9)
+    assert rule.to_rrule() == 'FREQ=MONTHLY;INTERVAL=2'
+
+def test_rules_are_compiled_once():
+    assert compile_rule('every weekday at 9') is compile_rule('every weekday at 9')
+
+def test_count_and_window_queries():
+    rule = compile_rule('every weekday at 9')
+    start = datetime(2024, 1, 1, 9)
+    # Start plus every weekday at 9 through Jan 31 (23 weekdays in January)
+    assert rule.count_through(start, datetime(2024, 1, 31, 12)) == (23, datetime(2024, 2, 1, 9))
+    assert rule.count_through(start, datetime(2023, 12, 1)) == (0, start)
+    window = rule.between(start, datetime(2024, 1, 6), datetime(2024, 1, 9, 9))
+    assert window == [datetime(2024, 1, 8, 9)]
+    every_minute = compile_rule('* * * * *')
+    assert every_minute.count_through(datetime(2024, 1, 1), datetime(2025, 1, 1))[0] == 366 * 24 * 60 + 1
+
+def test_impossible_rule_never_fires():
+    assert compile_rule('0 0 30 2 *').next_after(START, START) is None
+
+def test_to_rrule():
+    assert compile_rule('every weekend at noon').to_rrule() == 'FREQ=WEEKLY;BYDAY=SA,SU;BYHOUR=12;BYMINUTE=0;BYSECOND=0'
+    assert compile_rule('first monday of the month').to_rrule() == 'FREQ=MONTHLY;BYDAY=1MO'
+    assert compile_rule('0 0 13 * 5').to_rrule() is None
+    assert isinstance(compile_rule('0 9 * * 1'), CalendarRule)
+
+@pytest.mark.parametrize('recurrence', [
+    'hourly', 'every blursday', 'every day at 25', 'FREQ=HOURLY', 'FREQ=DAILY;COUNT=3',
+    'FREQ=WEEKLY;BYDAY=1MO', 'FREQ=MONTHLY;BYFOO=1', '61 * * * *', '0 9 * * 1-9', '0 9 * *'
+])
+def test_invalid_rules(recurrence):
+    with pytest.raises(ValueError):
+        compile_rule(recurrence)
@@ -0,0 +1,128 @@
+import threading
+import pytest
+from datetime import datetime, timedelta
+
+from models import Reminder
+from sharding import ShardedReminderStore, ShardedScheduler, TenantRequiredError, rendezvous_shard
+
+class RecordingNotifier:
+    def __init__(self):
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def send_notification(self, message, channel=None):
+        with self.lock:
+            self.messages.append(message)
+
+@pytest.fixture
+def store(tmp_path):
+    store = ShardedReminderStore(str(tmp_path / 'shards'), shards=3)
+    yield store
+    store.close()
+
+def make_reminder(text, when, tenant):
+    return Reminder(None, text, when.strftime('%Y-%m-%d %H:%M:%S'), tenant=tenant)
+
+def populate(store, tenants, per_tenant, base):
+    for t, tenant in enumerate(tenants):
+        for i in range(per_tenant):
+            store.add_reminder(make_reminder(f'{tenant} {i}', base + timedelta(minutes=t, seconds=i), tenant))
+
+def test_tenants_are_isolated_on_their_shards(store):
+    base = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    tenants = [f'user{n}' for n in range(12)]
+    populate(store, tenants, 3, base)
+
+    loads = store.shard_loads()
+    assert sum(len(counts) for counts in loads) == 12
+    for tenant in tenants:
+        assert loads[store.shard_for(tenant)].get(tenant) == 3
+        page, cursor = store.get_upcoming_page(tenant=tenant)
+        assert [r.text for r in page] == [f'{tenant} {i}' for i in range(3)] and cursor is None
+        assert [r.tenant for r in store.search_reminders(tenant, tenant=tenant)] == [tenant] * 3
+    reminder = store.get_upcoming_page(tenant='user0')[0][0]
+    assert store.get_reminder(reminder.id, tenant='user0').text == 'user0 0'
+    assert not store.delete_reminder(reminder.id, tenant=next(t for t in tenants if store.shard_for(t) == store.shard_for('user0') and t != 'user0'))
+    with pytest.raises(TenantRequiredError):
+        store.add_reminder(Reminder(None, 'Nobody', base.strftime('%Y-%m-%d %H:%M:%S')))
+
+def test_merged_pages_follow_fire_order_across_shards(store):
+    base = datetime.now().replace(microsecond=0) + timedelta(hours=1)
+    for i in range(30):
+        # Several reminders per fire time, spread over all shards
+        store.add_reminder(make_reminder(f'R{i:02d}', base + timedelta(minutes=i // 3), f'tenant{i % 7}'))
+    seen = []
+    page, cursor = store.get_upcoming_page(page_size=4)
+    seen += page
+    while cursor is not None:
+        page, cursor = store.get_upcoming_page(after=cursor, page_size=4)
+        seen += page
+    assert len(seen) == 30 and len({(r.tenant, r.id) for r in seen}) == 30
+    assert [r.fire_at for r in seen] == sorted(r.fire_at for r in seen)
+    assert [r.fire_at for r in store.next_due(5)] == [r.fire_at for r in seen[:5]]
+
+def test_search_without_tenant_merges_by_rank(store):
+    base = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    tenants = [next(f'tenant{n}' for n in range(100) if store.shard_for(f'tenant{n}') == shard) for shard in range(3)]
+    for shard, tenant in enumerate(tenants):
+        # Padding gives each shard the same index statistics, so ranks compare exactly across shards
+        for i in range(5):
+            store.add_reminder(make_reminder(f'filler {shard} {i}', base, tenant))
+    store.add_reminder(make_reminder('invoice for the quarterly office supplies order', base, tenants[0]))
+    store.add_reminder(make_reminder('invoice and more invoice talk', base + timedelta(hours=1), tenants[1]))
+    store.add_reminder(make_reminder('send invoice', base + timedelta(hours=2), tenants[2]))
+    assert [r.text for r in store.search_reminders('invoice')] == ['invoice and more invoice talk', 'send invoice', 'invoice for the quarterly office supplies order']
+    assert [r.text for r in store.search_reminders('invoice', limit=1)] == ['invoice and more invoice talk']
+
+def test_move_tenant_and_placement_survive_reopen(tmp_path):
+    directory = str(tmp_path / 'shards')
+    store = ShardedReminderStore(directory, shards=2)
+    base = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    populate(store, ['alice'], 5, base)
+    source = store.shard_for('alice')
+    target = 1 - source
+    assert store.move_tenant('alice', target) == 5
+    assert store.shard_for('alice') == target
+    assert store.shard_loads()[source] == {} and store.shard_loads()[target] == {'alice': 5}
+    assert [r.text for r in store.search_reminders('alice', tenant='alice')] == [f'alice {i}' for i in range(5)]
+    store.close()
+
+    store = ShardedReminderStore(directory, shards=8)  # the existing shard list wins
+    try:
+        assert len(store.names) == 2 and store.shard_for('alice') == target
+        assert store.move_tenant('alice', source) == 5
+        assert 'alice' not in store.placements or rendezvous_shard('alice', store.names) != store.names[source]
+    finally:
+        store.close()
+
+def test_add_shard_then_rebalance(store):
+    base = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    tenants = [f'user{n}' for n in range(40)]
+    populate(store, tenants, 2, base)
+    before = {tenant: store.shard_for(tenant) for tenant in tenants}
+
+    new_shard = store.add_shard()
+    # Nobody moves until the rebalance, and everyone is still reachable
+    assert {tenant: store.shard_for(tenant) for tenant in tenants} == before
+    assert store.shard_loads()[new_shard] == {}
+
+    planned = store.rebalance(max_skew=0.1, dry_run=True)
+    assert planned and store.shard_loads()[new_shard] == {}
+    moves = store.rebalance(max_skew=0.1)
+    assert moves == planned
+    totals = [sum(counts.values()) for counts in store.shard_loads()]
+    assert sum(totals) == 80 and max(totals) <= 80 / 4 * 1.1
+    for tenant in tenants:
+        page, _ = store.get_upcoming_page(tenant=tenant)
+        assert len(page) == 2
+    assert store.rebalance(max_skew=0.1) == []
+
+def test_sharded_scheduler_fires_every_shard(store):
+    past = datetime.now().replace(microsecond=0) - timedelta(minutes=1)
+    for n in range(9):
+        store.add_reminder(make_reminder(f'Due {n}', past, f'user{n}'))
+    notifier = RecordingNotifier()
+    ShardedScheduler(store, notifier).check_reminders()
+    assert sorted(notifier.messages) == [f'Due {n}' for n in range(9)]
+    assert store.get_due_reminders() == []
+    assert len(store.get_history()) == 9
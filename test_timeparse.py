@@ -0,0 +1,50 @@
+import pytest
+from datetime import datetime
+
+import parsedatetime
+from timeparse import TimeParser
+
+NOW = datetime(2024, 10, 18, 3, 52, 23, 512000)
+
+@pytest.mark.parametrize('phrase', [
+    'in 15 minutes', 'in an hour', 'in 2 days', 'in 3 weeks', 'in 10 mins',
+    'tomorrow at 5 pm', 'tomorrow 9am', 'today at 17:30', 'at 9am', 'tomorrow at 12 am',
+    '2024-10-20', '2024-10-20 09:30', 'next friday at noon'
+])
+def test_matches_parsedatetime(phrase):
+    time_struct, parse_status = parsedatetime.Calendar().parse(phrase, NOW.timetuple())
+    assert parse_status
+    assert TimeParser().parse(phrase, NOW) == datetime(*time_struct[:6])
+
+@pytest.mark.parametrize('phrase, expected', [
+    ('2027-01-05T09:30', datetime(2027, 1, 5, 9, 30)),
+    ('2027-01-05T09:30:15', datetime(2027, 1, 5, 9, 30, 15)),
+    ('2027-01-05t09:30', datetime(2027, 1, 5, 9, 30))
+])
+def test_iso_t_separator_takes_fast_path(phrase, expected):
+    parser = TimeParser()
+    assert parser.parse(phrase, NOW) == expected
+    assert parser.stats()['fast_path'] == 1
+
+def test_unparseable_phrase_returns_none():
+    assert TimeParser().parse('invalid time', NOW) is None
+
+def test_stats_track_fast_path_and_cache_hits():
+    parser = TimeParser()
+    parser.parse('In 15   Minutes', NOW)
+    parser.parse('in 15 minutes', NOW)
+    parser.parse('next friday at noon', NOW)
+    parser.parse('next friday at noon', NOW)
+    stats = parser.stats()
+    assert stats['calls'] == 4
+    assert stats['fast_path'] == 2
+    assert stats['fallback'] == 2
+    assert stats['hit_rate'] == 0.5
+    assert stats['fast_path_ratio'] == 0.5
+
+def test_fallback_cache_is_keyed_on_reference_bucket():
+    parser = TimeParser(bucket_seconds=60)
+    first = parser.parse('next friday at noon', NOW)
+    later = parser.parse('next friday at noon', NOW.replace(day=25, hour=13))
+    assert first == datetime(2024, 10, 25, 12, 0)
+    assert later == datetime(2024, 11, 1, 12, 0)
@@ -0,0 +1,154 @@
+#This file will contain the natural-language time parser used by the user interface.
+
+#timeparse.py:
+# Contains the TimeParser class.
+# Handles common phrases with precompiled regexes and falls back to parsedatetime for everything else.
+
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+UNIT_SECONDS = {
+    'second': 1, 'sec': 1,
+    'minute': 60, 'min': 60,
+    'hour': 3600, 'hr': 3600,
+    'day': 86400,
+    'week': 604800
+}
+
+# "in 15 minutes", "in an hour", "in 2 days"
+RELATIVE_RE = re.compile(r'^in\s+(\d+|an?)\s+(second|sec|minute|min|hour|hr|day|week)s?$')
+# "tomorrow at 5 pm", "today 17:30", "at 9am"
+DAY_TIME_RE = re.compile(r'^(?:(today|tomorrow)\s+)?(?:at\s+)?(\d{1,2})(?::(\d{2}))?\s*(am|pm)?$')
+# "2024-10-18", "2024-10-18 09:30", "2024-10-18T09:30:00" (matched after lowercasing, hence re.I for the T)
+ISO_RE = re.compile(r'^\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2})?)?$', re.I)
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+
+    def get(self, key):
+        value = self.data.get(key)
+        if value is not None:
+            self.data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def __len__(self):
+        return len(self.data)
+
+class TimeParser:
+    def __init__(self, cache_size=1024, bucket_seconds=1):
+        # Fast-path phrases are normalized once into a rule and cached by phrase alone; parsedatetime
+        # results depend on the reference time, so they are cached per (phrase, reference bucket).
+        self.bucket_seconds = bucket_seconds
+        self.rules = LRUCache(cache_size)
+        self.fallback_results = LRUCache(cache_size)
+        self.calendar = None
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.calls = 0
+        self.fast_path = 0
+        self.fallback = 0
+        self.cache_hits = 0
+        self.failures = 0
+
+    def parse(self, text, now=None):
+        # Returns the parsed datetime (to the second), or None if the phrase is not understood
+        if now is None:
+            now = datetime.now()
+        phrase = ' '.join(text.lower().split())
+        with self.lock:
+            self.calls += 1
+            rule = self.rules.get(phrase)
+            if rule is None:
+                rule = self._normalize(phrase)
+                self.rules.put(phrase, rule)
+            elif rule[0] != 'fallback':
+                self.cache_hits += 1
+            if rule[0] != 'fallback':
+                self.fast_path += 1
+                return self._apply_rule(rule, now)
+            self.fallback += 1
+            result = self._parse_fallback(phrase, now)
+            if result is None:
+                self.failures += 1
+            return result
+
+    def stats(self):
+        with self.lock:
+            calls = self.calls
+            return {
+                'calls': calls,
+                'fast_path': self.fast_path,
+                'fallback': self.fallback,
+                'cache_hits': self.cache_hits,
+                'failures': self.failures,
+                'hit_rate': self.cache_hits / calls if calls else 0.0,
+                'fast_path_ratio': self.fast_path / calls if calls else 0.0
+            }
+
+    def _normalize(self, phrase):
+        match = RELATIVE_RE.match(phrase)
+        if match:
+            amount = 1 if match.group(1) in ('a', 'an') else int(match.group(1))
+            return ('offset', amount * UNIT_SECONDS[match.group(2)])
+
+        match = DAY_TIME_RE.match(phrase)
+        if match and (match.group(1) or match.group(4) or match.group(3) or phrase.startswith('at ')):
+            day, hour, minute, meridiem = match.groups()
+            hour = int(hour)
+            minute = int(minute or 0)
+            if meridiem:
+                if not 1 <= hour <= 12:
+                    return ('fallback',)
+                hour = hour % 12 + (12 if meridiem == 'pm' else 0)
+            if hour > 23 or minute > 59:
+                return ('fallback',)
+            return ('day_time', 1 if day == 'tomorrow' else 0, hour, minute)
+
+        if ISO_RE.match(phrase):
+            try:
+                value = datetime.fromisoformat(phrase)
+            except ValueError:
+                return ('fallback',)
+            # Like parsedatetime, a bare date keeps the current time of day
+            return ('date', value) if len(phrase) == 10 else ('absolute', value)
+        return ('fallback',)
+
+    def _apply_rule(self, rule, now):
+        kind = rule[0]
+        if kind == 'offset':
+            return (now + timedelta(seconds=rule[1])).replace(microsecond=0)
+        if kind == 'day_time':
+            day = now + timedelta(days=rule[1])
+            return day.replace(hour=rule[2], minute=rule[3], second=0, microsecond=0)
+        if kind == 'date':
+            return now.replace(year=rule[1].year, month=rule[1].month, day=rule[1].day, microsecond=0)
+        return rule[1]
+
+    def _parse_fallback(self, phrase, now):
+        bucket = int(now.timestamp()) // self.bucket_seconds
+        key = (phrase, bucket)
+        cached = self.fallback_results.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached[0]
+        if self.calendar is None:
+            # parsedatetime takes longer to import than the rest of the CLI, so only phrases that need it load it
+            import parsedatetime
+            self.calendar = parsedatetime.Calendar()
+        reference = datetime.fromtimestamp(bucket * self.bucket_seconds)
+        time_struct, parse_status = self.calendar.parse(phrase, reference.timetuple())
+        result = datetime(*time_struct[:6]) if parse_status else None
+        self.fallback_results.put(key, (result,))
+        return result